@@ -1,11 +1,17 @@
-from flask import Flask, request, jsonify, render_template, redirect, url_for, flash, session
+from flask import Flask, request, jsonify, render_template, redirect, url_for, flash, session, g
 from flask_cors import CORS
 from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
 import sqlite3
+import queue
 import re
 import os
 
+from config import Config
+from compiled_catalog import SYMPTOMS_CATALOG_PATH, SYMPTOMS_SOURCE, CompiledCatalogLoader
+from diagnosis_engine import DiagnosisEngine, SQLiteSymptomsLoader
+from result_cache import ResultCache
+
 
 
 app = Flask(__name__)
@@ -18,6 +24,10 @@ login_manager.login_view = 'login'
 
 # Database Configuration
 DATABASE = 'medicino.db'
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 8))
+
+# Same SQLite performance profile as the enhanced app, applied to every new connection
+SQLITE_PRAGMAS = Config.SQLITE_PRAGMAS
 
 class User(UserMixin):
     def __init__(self, id, username, email):
@@ -29,17 +39,67 @@ class User(UserMixin):
 def load_user(user_id):
     conn = get_db_connection()
     user = conn.execute('SELECT * FROM users WHERE id = ?', (user_id,)).fetchone()
-    conn.close()
     if user:
         return User(user['id'], user['username'], user['email'])
     return None
 
-def get_db_connection():
-    """Get a database connection."""
-    conn = sqlite3.connect(DATABASE)
+def connect_db():
+    """Open a new, tuned database connection."""
+    conn = sqlite3.connect(DATABASE, check_same_thread=False)
     conn.row_factory = sqlite3.Row
+    for pragma, value in SQLITE_PRAGMAS.items():
+        conn.execute(f'PRAGMA {pragma} = {value}')
     return conn
 
+class ConnectionPool:
+    """Reuses SQLite connections across requests instead of reconnecting each time."""
+
+    def __init__(self, size):
+        self.size = size
+        self._pid = os.getpid()
+        self._idle = queue.LifoQueue(maxsize=size)
+
+    def acquire(self):
+        """Borrow an idle connection, opening a new one if none is available."""
+        self._reset_after_fork()
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return connect_db()
+
+    def release(self, conn):
+        """Return a connection to the pool, closing it if the pool is full."""
+        if conn.in_transaction:
+            conn.rollback()
+        if os.getpid() != self._pid:
+            conn.close()
+            return
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def _reset_after_fork(self):
+        # Connections must not be shared with a parent process (gunicorn --preload)
+        if os.getpid() != self._pid:
+            self._pid = os.getpid()
+            self._idle = queue.LifoQueue(maxsize=self.size)
+
+db_pool = ConnectionPool(DB_POOL_SIZE)
+
+def get_db_connection():
+    """Get this request's database connection, borrowed from the pool on first use."""
+    if 'db_conn' not in g:
+        g.db_conn = db_pool.acquire()
+    return g.db_conn
+
+@app.teardown_appcontext
+def release_db_connection(exception):
+    """Give the request's connection back to the pool."""
+    conn = g.pop('db_conn', None)
+    if conn is not None:
+        db_pool.release(conn)
+
 def init_db():
     """
     Initializes the database with the correct, complete schema.
@@ -49,7 +109,7 @@ def init_db():
         return  # Assume database is already set up
 
     print("Database not found. Creating and populating with minimal data...")
-    conn = get_db_connection()
+    conn = connect_db()
     cursor = conn.cursor()
 
     # Users table for authentication
@@ -112,128 +172,17 @@ def init_db():
     print("Database created. Run 'python database_setup.py' for comprehensive data.")
 
 
+# Same diagnosis engine as the enhanced app, loading conditions from symptoms_database,
+# or from the compiled catalog the seeding scripts write while it is current
+symptom_engine = DiagnosisEngine(
+    CompiledCatalogLoader(SYMPTOMS_CATALOG_PATH, SYMPTOMS_SOURCE, SQLiteSymptomsLoader(get_db_connection)),
+    scorer=Config.DIAGNOSIS_SCORER,
+    result_cache=ResultCache(Config.DIAGNOSIS_CACHE_SIZE, Config.DIAGNOSIS_CACHE_TTL)
+)
+
 def diagnose_symptoms(symptoms_text):
     """Enhanced symptom diagnosis logic that returns all possible diseases for minimal symptoms."""
-    conn = get_db_connection()
-    conditions = conn.execute("SELECT * FROM symptoms_database").fetchall()
-    conn.close()
-
-    # Simple symptom processing - just split by commas and clean
-    input_symptoms = [s.strip().lower() for s in symptoms_text.split(',') if s.strip()]
-    
-    # If no symptoms provided, return early
-    if not input_symptoms:
-        return {
-            'disease': 'No symptoms provided',
-            'ayurvedic': 'Please enter your symptoms to get a diagnosis.',
-            'medicine': 'Please enter your symptoms to get medicine suggestions.',
-            'confidence': 0,
-            'severity': 'unknown',
-            'description': 'Please describe your symptoms in simple terms like: fever, headache, cough, stomach pain, etc.',
-            'precautions': 'Always seek professional medical advice for an accurate diagnosis.'
-        }
-    
-    # Find all conditions that match ANY of the input symptoms
-    all_matches = []
-    best_match = None
-    best_score = 0
-
-    for condition in conditions:
-        condition_symptoms = [s.strip().lower() for s in condition['symptoms'].split(',')]
-        
-        # Count how many input symptoms match condition symptoms
-        matches = 0
-        matched_symptoms = []
-        
-        for input_symptom in input_symptoms:
-            for condition_symptom in condition_symptoms:
-                # Simple contains check
-                if input_symptom in condition_symptom or condition_symptom in input_symptom:
-                    matches += 1
-                    matched_symptoms.append(condition_symptom)
-                    break
-        
-        # Calculate score: percentage of input symptoms that matched
-        if input_symptoms:
-            score = matches / len(input_symptoms)
-        else:
-            score = 0
-        
-        # Include ALL conditions that have at least one matching symptom
-        if matches > 0:
-            all_matches.append({
-                'condition': condition['condition_name'],
-                'score': score,
-                'matches': matches,
-                'matched_symptoms': matched_symptoms,
-                'severity': condition['severity_level'],
-                'ayurvedic': condition['ayurvedic_remedy'],
-                'medicine': condition['medicine_suggestion'],
-                'description': condition['description'],
-                'precautions': condition['precautions']
-            })
-            
-            if score > best_score:
-                best_score = score
-                best_match = condition
-    
-    # Sort matches by score (highest first)
-    all_matches.sort(key=lambda x: x['score'], reverse=True)
-    
-    # If we have a very strong match (80% or more symptoms match), show it as primary
-    if best_match and best_score >= 0.8:
-        return {
-            'disease': best_match['condition_name'],
-            'ayurvedic': best_match['ayurvedic_remedy'],
-            'medicine': best_match['medicine_suggestion'],
-            'confidence': round(best_score * 100, 0),
-            'severity': best_match['severity_level'],
-            'description': best_match['description'],
-            'precautions': best_match['precautions']
-        }
-    else:
-        # Return ALL possible conditions that match the symptoms
-        if all_matches:
-            # Create a comprehensive list of all matching conditions
-            condition_list = []
-            for match in all_matches:
-                severity_emoji = {
-                    'mild': '🟢',
-                    'moderate': '🟡', 
-                    'severe': '🔴',
-                    'unknown': '❓'
-                }.get(match['severity'], '❓')
-                
-                confidence_text = f" ({round(match['score'] * 100, 0)}% match)"
-                condition_list.append(f"{severity_emoji} {match['condition']}{confidence_text}")
-            
-            # Limit to top 10 to avoid overwhelming the user
-            top_conditions = condition_list[:10]
-            condition_text = "\n• " + "\n• ".join(top_conditions)
-            
-            # If there are more than 10 matches, add a note
-            if len(all_matches) > 10:
-                condition_text += f"\n\n... and {len(all_matches) - 10} more possible conditions"
-            
-            return {
-                'disease': f'Found {len(all_matches)} possible conditions',
-                'ayurvedic': 'Please consult an Ayurvedic practitioner for personalized treatment.',
-                'medicine': 'Please consult a healthcare professional for proper diagnosis.',
-                'confidence': round(best_score * 100, 0) if best_score > 0 else 0,
-                'severity': 'unknown',
-                'description': f'Your symptoms could indicate these conditions:\n{condition_text}\n\nAdd more symptoms for more accurate results.',
-                'precautions': 'Always seek professional medical advice for an accurate diagnosis. This is not a substitute for medical consultation.'
-            }
-        else:
-            return {
-                'disease': 'No matching conditions found',
-                'ayurvedic': 'Please consult an Ayurvedic practitioner for personalized treatment.',
-                'medicine': 'Please consult a healthcare professional for proper diagnosis.',
-                'confidence': 0,
-                'severity': 'unknown',
-                'description': 'Try describing your symptoms in simple terms like: fever, headache, cough, stomach pain, etc.',
-                'precautions': 'Always seek professional medical advice for an accurate diagnosis.'
-            }
+    return symptom_engine.diagnose(symptoms_text)
 
 @app.route('/')
 def index():
@@ -272,7 +221,6 @@ def register():
                                    (username, email)).fetchone()
         if existing_user:
             flash('Username or email already exists!', 'error')
-            conn.close()
             return render_template('register.html')
         
         # Create new user
@@ -280,7 +228,6 @@ def register():
         conn.execute('INSERT INTO users (username, email, password_hash) VALUES (?, ?, ?)',
                     (username, email, password_hash))
         conn.commit()
-        conn.close()
         
         flash('Registration successful! Please log in.', 'success')
         return redirect(url_for('login'))
@@ -295,7 +242,6 @@ def login():
         
         conn = get_db_connection()
         user = conn.execute('SELECT * FROM users WHERE username = ?', (username,)).fetchone()
-        conn.close()
         
         if user and check_password_hash(user['password_hash'], password):
             user_obj = User(user['id'], user['username'], user['email'])
@@ -332,7 +278,6 @@ def diagnose_api():
         VALUES (?, ?, ?, ?, ?, ?)
     ''', (current_user.id, symptoms, diagnosis_result['disease'], diagnosis_result['ayurvedic'], diagnosis_result['medicine'], diagnosis_result['confidence']))
     conn.commit()
-    conn.close()
 
     return jsonify({'success': True, 'data': diagnosis_result})
 
@@ -341,7 +286,6 @@ def get_medicine_info_api(medicine_name):
     """Get medicine information API endpoint."""
     conn = get_db_connection()
     medicine = conn.execute('SELECT * FROM medicines WHERE name LIKE ?', (f'%{medicine_name}%',)).fetchone()
-    conn.close()
     
     if medicine:
         return jsonify({'success': True, 'data': dict(medicine)})
@@ -353,7 +297,6 @@ def list_medicines_api():
     """List all medicines API endpoint."""
     conn = get_db_connection()
     medicines = conn.execute('SELECT * FROM medicines ORDER BY name').fetchall()
-    conn.close()
     return jsonify({'success': True, 'data': [dict(row) for row in medicines]})
 
 @app.route('/api/history')
@@ -363,7 +306,6 @@ def get_diagnosis_history_api():
     conn = get_db_connection()
     history = conn.execute('SELECT * FROM diagnosis_history WHERE user_id = ? ORDER BY created_at DESC LIMIT 50', 
                           (current_user.id,)).fetchall()
-    conn.close()
     return jsonify({'success': True, 'data': [dict(row) for row in history]})
 
 if __name__ == '__main__':
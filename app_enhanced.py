@@ -4,7 +4,10 @@ A comprehensive medical assistant with improved architecture, security, and feat
 """
 
 import os
+import atexit
+import sys
 import logging
+import click
 from datetime import datetime
 from flask import Flask, request, jsonify, render_template, redirect, url_for, flash, session, abort
 from flask_cors import CORS
@@ -13,9 +16,15 @@ from werkzeug.exceptions import HTTPException
 from werkzeug.security import generate_password_hash, check_password_hash
 
 # Import our modules
-from config import config
-from models import db, User, Medicine, Condition, DiagnosisHistory
+from config import config, apply_sqlite_pragmas
+from models import db, ensure_indexes, User, Medicine, Condition, DiagnosisHistory
 from services import UserService, MedicineService, ConditionService, DiagnosisService, ValidationService
+from search_index import ensure_search_indexes
+from history_writer import HistoryWriter
+from result_cache import ResultCache
+from diagnosis_pool import DiagnosisPool
+from request_metrics import count_fetched_rows, init_request_metrics
+from prometheus_metrics import init_prometheus_metrics, time_pool_checkouts
 
 # Initialize Flask extensions
 login_manager = LoginManager()
@@ -29,12 +38,53 @@ def create_app(config_name='default'):
     config[config_name].init_app(app)
     
     # Initialize extensions
+    if app.config.get('REQUEST_METRICS_ENABLED'):
+        count_fetched_rows(app)
+    if app.config.get('METRICS_ENABLED'):
+        time_pool_checkouts(app)
     db.init_app(app)
+    with app.app_context():
+        apply_sqlite_pragmas(db.engine, app.config.get('SQLITE_PRAGMAS'))
+        # Registered before the other request handlers so the timing covers them
+        if app.config.get('REQUEST_METRICS_ENABLED'):
+            init_request_metrics(app, db.engine)
+        if app.config.get('METRICS_ENABLED'):
+            init_prometheus_metrics(app, db.engine)
     login_manager.init_app(app)
     login_manager.login_view = 'auth.login'
     login_manager.login_message = 'Please log in to access this page.'
     login_manager.login_message_category = 'info'
     
+    # Optional write-behind persistence for diagnosis history
+    if app.config.get('HISTORY_WRITE_BEHIND'):
+        with app.app_context():
+            app.extensions['history_writer'] = HistoryWriter(
+                db.engine,
+                max_queue_size=app.config['HISTORY_QUEUE_SIZE'],
+                batch_size=app.config['HISTORY_BATCH_SIZE'],
+                flush_interval=app.config['HISTORY_FLUSH_INTERVAL'],
+                enqueue_timeout=app.config['HISTORY_ENQUEUE_TIMEOUT'],
+                id_block_size=app.config['HISTORY_ID_BLOCK_SIZE'],
+                max_retries=app.config['HISTORY_MAX_RETRIES']
+            ).start()
+    
+    # Diagnosis result cache, shared by every request in this process
+    if app.config.get('DIAGNOSIS_CACHE_SIZE', 0) > 0:
+        app.extensions['diagnosis_cache'] = ResultCache(
+            max_size=app.config['DIAGNOSIS_CACHE_SIZE'],
+            ttl=app.config['DIAGNOSIS_CACHE_TTL']
+        )
+    
+    # Worker processes for large diagnosis batches, started on first use
+    if app.config.get('DIAGNOSIS_POOL_WORKERS', 0) > 0:
+        pool = DiagnosisPool(
+            max_workers=app.config['DIAGNOSIS_POOL_WORKERS'],
+            shard_size=app.config['DIAGNOSIS_POOL_SHARD_SIZE'],
+            start_method=app.config['DIAGNOSIS_POOL_START_METHOD']
+        )
+        atexit.register(pool.shutdown)
+        app.extensions['diagnosis_pool'] = pool
+    
     # Setup CORS
     CORS(app, origins=app.config['CORS_ORIGINS'])
     
@@ -118,6 +168,8 @@ app = create_app(os.getenv('FLASK_CONFIG') or 'default')
 def init_db_command():
     """Initialize the database."""
     db.create_all()
+    ensure_indexes(db.engine)
+    ensure_search_indexes(db.engine)
     print('Database initialized.')
 
 @app.cli.command('create-admin')
@@ -139,6 +191,68 @@ def seed_data_command():
     from database_setup import seed_database
     seed_database()
     print('Database seeded with initial data.')
+    # Workers map this file instead of each loading the catalog
+    output = app.config.get('COMPILED_CATALOG_PATH')
+    if output:
+        ConditionService.compile_catalog(output)
+        print(f'Catalog compiled to {output}.')
+
+@app.cli.command('export-history')
+@click.option('--format', 'export_format', type=click.Choice(['ndjson', 'csv']), default='ndjson',
+              help='Output format.')
+@click.option('--output', type=click.Path(dir_okay=False, writable=True), default=None,
+              help='File to write to (defaults to stdout).')
+@click.option('--batch-size', type=int, default=1000, help='Rows fetched per query.')
+def export_history_command(export_format, output, batch_size):
+    """Stream the full diagnosis history as NDJSON or CSV."""
+    chunks = DiagnosisService.export_diagnosis_history(export_format, batch_size=batch_size)
+    if output:
+        with open(output, 'w', newline='', encoding='utf-8') as f:
+            for chunk in chunks:
+                f.write(chunk)
+        print(f'Diagnosis history exported to {output}.')
+    else:
+        for chunk in chunks:
+            sys.stdout.write(chunk)
+
+@app.cli.command('compile-catalog')
+@click.option('--output', type=click.Path(dir_okay=False, writable=True), default=None,
+              help='File to write (defaults to COMPILED_CATALOG_PATH).')
+def compile_catalog_command(output):
+    """Compile the condition and medicine catalogs into a memory-mapped catalog file."""
+    output = output or app.config['COMPILED_CATALOG_PATH']
+    if not output:
+        raise click.BadParameter('set COMPILED_CATALOG_PATH or pass a file', param_hint='--output')
+    ConditionService.compile_catalog(output)
+    print(f'Catalog compiled to {output}.')
+
+@app.cli.command('replay-history')
+@click.option('--scorer', default=None, help='Scorer to replay with (defaults to DIAGNOSIS_SCORER).')
+@click.option('--batch-size', type=int, default=1000, help='Diagnoses scored per batch.')
+def replay_history_command(scorer, batch_size):
+    """Re-diagnose every stored history row and report how many diagnoses change."""
+    scorer = scorer or DiagnosisService.get_default_scorer()
+    if scorer not in DiagnosisService.get_scorer_names():
+        raise click.BadParameter(f"choose from {', '.join(DiagnosisService.get_scorer_names())}", param_hint='--scorer')
+    
+    total = changed = 0
+    batch = []
+    
+    def replay(batch):
+        results = DiagnosisService.diagnose_batch([row['symptoms'] for row in batch], scorer=scorer)
+        return sum(1 for row, result in zip(batch, results) if result['disease'] != row['diagnosed_condition'])
+    
+    for row in DiagnosisService.iter_diagnosis_history(batch_size=batch_size):
+        batch.append(row)
+        if len(batch) == batch_size:
+            changed += replay(batch)
+            total += len(batch)
+            batch = []
+    if batch:
+        changed += replay(batch)
+        total += len(batch)
+    
+    print(f'Replayed {total} diagnoses with the {scorer} scorer: {changed} would change.')
 
 if __name__ == '__main__':
     # Create uploads directory if it doesn't exist
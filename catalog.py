@@ -0,0 +1,171 @@
+"""
+Condition catalog snapshots for Medicino.
+Immutable, process-wide copies of the reference catalog, reloaded only when the
+catalog version stamp stored in the database changes.
+"""
+
+import threading
+import time
+import uuid
+from datetime import datetime
+from collections.abc import MutableSequence, Sequence
+from typing import Any, Callable, Iterable, NamedTuple, Optional, Tuple
+
+from incidence_matrix import NUMPY_AVAILABLE, IncidenceMatrix
+from symptom_index import SymptomIndex, split_condition_symptoms
+
+CONDITIONS_CATALOG = 'conditions'
+MEDICINES_CATALOG = 'medicines'
+
+CATALOG_VERSIONS_DDL = '''
+    CREATE TABLE IF NOT EXISTS catalog_versions (
+        name VARCHAR(50) PRIMARY KEY,
+        version VARCHAR(32) NOT NULL,
+        updated_at TIMESTAMP
+    )
+'''
+
+
+def new_catalog_version() -> str:
+    """Generate a fresh catalog version stamp."""
+    return uuid.uuid4().hex
+
+
+def stamp_catalog_version(conn, name: str, placeholder: str = '?') -> str:
+    """Stamp a catalog with a new version using a raw DB-API connection or cursor.
+
+    Used by the seeding scripts, which write the catalog tables directly, and
+    by the Django app, which passes a cursor and ``placeholder='%s'``. The
+    upsert works on SQLite (3.24+) and PostgreSQL.
+    """
+    version = new_catalog_version()
+    conn.execute(CATALOG_VERSIONS_DDL)
+    conn.execute(
+        f'INSERT INTO catalog_versions (name, version, updated_at) '
+        f'VALUES ({placeholder}, {placeholder}, {placeholder}) '
+        f'ON CONFLICT (name) DO UPDATE SET version = excluded.version, updated_at = excluded.updated_at',
+        (name, version, datetime.utcnow().isoformat(sep=' '))
+    )
+    return version
+
+
+class ConditionRecord(NamedTuple):
+    """Read-only copy of an active condition row."""
+    id: int
+    name: str
+    description: Optional[str]
+    symptoms: str
+    ayurvedic_remedy: Optional[str]
+    modern_treatment: Optional[str]
+    severity_level: Optional[str]
+    category: Optional[str]
+    created_at: Optional[datetime]
+    # Only the legacy symptoms_database catalog stores per-condition precautions
+    precautions: Optional[str] = None
+
+    @property
+    def is_active(self) -> bool:
+        """Snapshots only ever contain active conditions."""
+        return True
+
+    def to_dict(self):
+        """Convert condition to dictionary, matching Condition.to_dict."""
+        return {
+            'id': self.id,
+            'name': self.name,
+            'description': self.description,
+            'symptoms': self.symptoms,
+            'ayurvedic_remedy': self.ayurvedic_remedy,
+            'modern_treatment': self.modern_treatment,
+            'severity_level': self.severity_level,
+            'category': self.category,
+            'is_active': self.is_active,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+
+class CatalogSnapshot:
+    """Immutable view of the active condition catalog and its symptom index.
+
+    Conditions are ordered by name; positions in ``conditions`` are the
+    positions used by ``symptom_index``. Immutable sequences such as the
+    records of a compiled catalog file are kept as given rather than copied,
+    and a prebuilt ``symptom_index`` over them (e.g. one mapped from the same
+    file) is used instead of indexing the records again.
+    """
+
+    __slots__ = ('version', 'conditions', 'symptom_index', 'symptoms', '_incidence_matrix')
+
+    def __init__(self, version: Optional[str], conditions: Tuple[ConditionRecord, ...],
+                 symptom_index: Optional[SymptomIndex] = None):
+        if not isinstance(conditions, Sequence) or isinstance(conditions, MutableSequence):
+            conditions = tuple(conditions)
+        if symptom_index is None:
+            symptom_index = SymptomIndex(split_condition_symptoms(condition.symptoms) for condition in conditions)
+        object.__setattr__(self, 'version', version)
+        object.__setattr__(self, 'conditions', conditions)
+        object.__setattr__(self, 'symptom_index', symptom_index)
+        object.__setattr__(self, 'symptoms', tuple(
+            sorted(symptom for symptom in self.symptom_index.vocabulary if symptom)
+        ))
+        object.__setattr__(self, '_incidence_matrix', None)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('CatalogSnapshot is immutable')
+
+    def __len__(self) -> int:
+        return len(self.conditions)
+
+    @property
+    def incidence_matrix(self) -> Optional[IncidenceMatrix]:
+        """Incidence matrix over ``symptom_index``, built on first use; None without NumPy."""
+        if self._incidence_matrix is None and NUMPY_AVAILABLE:
+            object.__setattr__(self, '_incidence_matrix', IncidenceMatrix(self.symptom_index))
+        return self._incidence_matrix
+
+
+class CatalogCache:
+    """Process-wide catalog snapshot, reloaded when the stored version changes.
+
+    ``read_version`` returns the current version stamp (``None`` when the
+    catalog has never been stamped) and ``load`` builds a snapshot - any
+    object with a ``version`` attribute - for a given version. Unstamped
+    catalogs are reloaded on every call, since there is no way to tell
+    whether they changed.
+    """
+
+    def __init__(self, read_version: Callable[[], Optional[str]],
+                 load: Callable[[Optional[str]], Any]):
+        self.read_version = read_version
+        self.load = load
+        self._snapshot = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self, max_age: float = 0):
+        """Get the snapshot for the current catalog version.
+
+        With ``max_age`` set, a snapshot whose version was confirmed less than
+        ``max_age`` seconds ago is returned without reading the version again.
+        """
+        snapshot = self._snapshot
+        if (max_age and snapshot is not None and snapshot.version is not None
+                and time.monotonic() - self._checked_at < max_age):
+            return snapshot
+
+        version = self.read_version()
+        if snapshot is not None and version is not None and snapshot.version == version:
+            self._checked_at = time.monotonic()
+            return snapshot
+
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is None or version is None or snapshot.version != version:
+                snapshot = self.load(version)
+                self._snapshot = snapshot
+            self._checked_at = time.monotonic()
+        return snapshot
+
+    def invalidate(self):
+        """Drop the cached snapshot so the next call reloads it."""
+        self._snapshot = None
@@ -0,0 +1,374 @@
+"""
+Compiled catalog files for Medicino.
+Read-only binary snapshot of the condition and medicine catalogs (interned
+strings, offset tables and the symptom index's postings) that every worker
+process maps into memory instead of querying and copying the catalog itself.
+"""
+
+import mmap
+import os
+import sqlite3
+import struct
+from collections.abc import Mapping, Sequence
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from catalog import MEDICINES_CATALOG, CatalogSnapshot, ConditionRecord
+from diagnosis_engine import CatalogLoader, SQLiteSymptomsLoader
+from symptom_index import SymptomIndex, split_condition_symptoms
+
+# Written by the seeding scripts for the legacy app
+SYMPTOMS_CATALOG_PATH = os.environ.get('SYMPTOMS_CATALOG_PATH', 'symptoms.catalog')
+
+# Condition table a file was compiled from; both stamp the same catalog version name
+SYMPTOMS_SOURCE = 'symptoms_database'
+CONDITIONS_SOURCE = 'conditions'
+
+MAGIC = b'MEDCAT03'
+# magic, source table, conditions version, medicines version,
+# counts: strings, conditions, vocabulary, medicines,
+# section offsets: string index, string data, conditions, symptom list index,
+# symptom lists, vocabulary, postings index, postings, medicines
+HEADER = struct.Struct('<8s32s32s32s4I9Q')
+# id, then string ids of name, description, symptoms, ayurvedic_remedy,
+# modern_treatment, severity_level, category, created_at, precautions
+CONDITION = struct.Struct('<q9I')
+NONE = 0xFFFFFFFF
+
+
+class _StringTable:
+    """Interns strings while a catalog file is being written."""
+
+    def __init__(self):
+        self.ids: Dict[str, int] = {}
+        self.strings: List[bytes] = []
+
+    def add(self, value: Optional[str]) -> int:
+        if value is None:
+            return NONE
+        string_id = self.ids.get(value)
+        if string_id is None:
+            string_id = self.ids[value] = len(self.strings)
+            self.strings.append(value.encode('utf-8'))
+        return string_id
+
+
+def write_compiled_catalog(path: str, source: str, conditions_version: Optional[str],
+                           conditions: Iterable[ConditionRecord], medicines_version: Optional[str] = None,
+                           medicine_names: Iterable[str] = ()) -> str:
+    """Compile a catalog file; it is replaced atomically so open readers keep the old copy."""
+    conditions = tuple(conditions)
+    index = SymptomIndex(split_condition_symptoms(condition.symptoms) for condition in conditions)
+    strings = _StringTable()
+
+    records = bytearray()
+    for condition in conditions:
+        created_at = condition.created_at.isoformat() if condition.created_at else None
+        records += CONDITION.pack(condition.id, *(strings.add(value) for value in (
+            condition.name, condition.description, condition.symptoms, condition.ayurvedic_remedy,
+            condition.modern_treatment, condition.severity_level, condition.category, created_at,
+            condition.precautions
+        )))
+
+    vocabulary = [strings.add(symptom) for symptom in index.vocabulary]
+    list_offsets, symptom_ids = [0], []
+    for symptoms in index.condition_symptoms:
+        symptom_ids.extend(index.symptom_ids[symptom] for symptom in symptoms)
+        list_offsets.append(len(symptom_ids))
+    posting_offsets, postings = [0], []
+    for symptom in index.vocabulary:
+        for position, offset in index.postings[symptom]:
+            postings += (position, offset)
+        posting_offsets.append(len(postings) // 2)
+    medicines = [strings.add(name) for name in medicine_names]
+
+    string_offsets = [0]
+    for value in strings.strings:
+        string_offsets.append(string_offsets[-1] + len(value))
+
+    sections = [
+        struct.pack(f'<{len(string_offsets)}I', *string_offsets),
+        b''.join(strings.strings),
+        bytes(records),
+        struct.pack(f'<{len(list_offsets)}I', *list_offsets),
+        struct.pack(f'<{len(symptom_ids)}I', *symptom_ids),
+        struct.pack(f'<{len(vocabulary)}I', *vocabulary),
+        struct.pack(f'<{len(posting_offsets)}I', *posting_offsets),
+        struct.pack(f'<{len(postings)}I', *postings),
+        struct.pack(f'<{len(medicines)}I', *medicines),
+    ]
+    offsets = []
+    position = HEADER.size
+    for section in sections:
+        offsets.append(position)
+        position += len(section)
+
+    header = HEADER.pack(
+        MAGIC, source.encode('ascii'), (conditions_version or '').encode('ascii'), (medicines_version or '').encode('ascii'),
+        len(strings.strings), len(conditions), len(vocabulary), len(medicines), *offsets
+    )
+    temporary = f'{path}.{os.getpid()}.tmp'
+    with open(temporary, 'wb') as f:
+        f.write(header)
+        for section in sections:
+            f.write(section)
+    os.replace(temporary, path)
+    return path
+
+
+def compile_catalog(path: str, source: str, loader: CatalogLoader,
+                    read_medicines_version: Callable[[], Optional[str]],
+                    load_medicine_names: Callable[[], Iterable[str]]) -> str:
+    """Compile a catalog file from a condition loader and a source of medicine names."""
+    # Versions are read before the rows, so a concurrent update leaves the
+    # file looking stale rather than current
+    conditions_version = loader.read_version()
+    medicines_version = read_medicines_version()
+    return write_compiled_catalog(
+        path, source, conditions_version, loader.load_conditions(), medicines_version, load_medicine_names()
+    )
+
+
+def compile_symptoms_catalog(database: str, path: str = SYMPTOMS_CATALOG_PATH) -> str:
+    """Compile the legacy ``symptoms_database`` catalog of a seeded database."""
+    conn = sqlite3.connect(database)
+    conn.row_factory = sqlite3.Row
+
+    def read_medicines_version():
+        try:
+            row = conn.execute('SELECT version FROM catalog_versions WHERE name = ?', (MEDICINES_CATALOG,)).fetchone()
+        except sqlite3.OperationalError:
+            return None
+        return row[0] if row else None
+
+    try:
+        return compile_catalog(
+            path, SYMPTOMS_SOURCE, SQLiteSymptomsLoader(lambda: conn), read_medicines_version,
+            lambda: [name for (name,) in conn.execute('SELECT name FROM medicines ORDER BY name')]
+        )
+    finally:
+        conn.close()
+
+
+class CompiledConditions(Sequence):
+    """Read-only sequence of ``ConditionRecord`` decoded from the mapped file on access."""
+
+    def __init__(self, catalog: 'CompiledCatalog'):
+        self._catalog = catalog
+
+    @property
+    def path(self) -> str:
+        return self._catalog.path
+
+    def __len__(self) -> int:
+        return self._catalog.condition_count
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return tuple(self[i] for i in range(*position.indices(len(self))))
+        if position < 0:
+            position += len(self)
+        if not 0 <= position < len(self):
+            raise IndexError('condition index out of range')
+        return self._catalog.condition(position)
+
+
+class CompiledCatalog:
+    """Memory-mapped view of a compiled catalog file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as f:
+            self.stat = os.fstat(f.fileno())
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        (magic, source, conditions_version, medicines_version, self.string_count, self.condition_count,
+         self.vocabulary_size, self.medicine_count, *offsets) = HEADER.unpack_from(self._map)
+        if magic != MAGIC:
+            raise ValueError(f'{path} is not a compiled Medicino catalog')
+        self.source = source.rstrip(b'\0').decode('ascii')
+        self.conditions_version = conditions_version.rstrip(b'\0').decode('ascii') or None
+        self.medicines_version = medicines_version.rstrip(b'\0').decode('ascii') or None
+        (self._string_index, self._string_data, self._conditions, self._list_index, self._lists,
+         self._vocabulary, self._posting_index, self._postings, self._medicines) = offsets
+
+    def has_conditions(self, source: str, version: Optional[str]) -> bool:
+        """Whether the file holds this version of ``source``'s conditions."""
+        return version is not None and self.source == source and self.conditions_version == version
+
+    def has_medicines(self, source: str, version: Optional[str]) -> bool:
+        """Whether the file holds this version of the medicine names."""
+        return version is not None and self.source == source and self.medicines_version == version
+
+    def _uints(self, offset: int, count: int) -> Tuple[int, ...]:
+        return struct.unpack_from(f'<{count}I', self._map, offset)
+
+    def string(self, string_id: int) -> Optional[str]:
+        """Decode an interned string."""
+        if string_id == NONE:
+            return None
+        start, end = self._uints(self._string_index + 4 * string_id, 2)
+        return self._map[self._string_data + start:self._string_data + end].decode('utf-8')
+
+    def condition(self, position: int) -> ConditionRecord:
+        """Decode one condition record."""
+        condition_id, *string_ids = CONDITION.unpack_from(self._map, self._conditions + CONDITION.size * position)
+        values = [self.string(string_id) for string_id in string_ids]
+        if values[7] is not None:
+            values[7] = datetime.fromisoformat(values[7])
+        return ConditionRecord(condition_id, *values)
+
+    def vocabulary(self) -> List[str]:
+        """Symptom vocabulary; positions are the symptom ids used by the other sections."""
+        return [self.string(string_id) for string_id in self._uints(self._vocabulary, self.vocabulary_size)]
+
+    def condition_symptom_ids(self, position: int) -> Tuple[int, ...]:
+        """Ids of a condition's normalized symptoms, in listed order."""
+        start, end = self._uints(self._list_index + 4 * position, 2)
+        return self._uints(self._lists + 4 * start, end - start)
+
+    def postings(self, symptom_id: int) -> List[Tuple[int, int]]:
+        """``(condition position, first offset)`` pairs of the conditions listing a symptom."""
+        start, end = self._uints(self._posting_index + 4 * symptom_id, 2)
+        flat = self._uints(self._postings + 8 * start, 2 * (end - start))
+        return list(zip(flat[0::2], flat[1::2]))
+
+    def medicine_names(self) -> List[str]:
+        """Active medicine names."""
+        return [self.string(string_id) for string_id in self._uints(self._medicines, self.medicine_count)]
+
+    def snapshot(self) -> CatalogSnapshot:
+        """Catalog snapshot whose condition records and symptom index stay in the mapped file."""
+        return CatalogSnapshot(
+            self.conditions_version, CompiledConditions(self), symptom_index=CompiledSymptomIndex(self)
+        )
+
+    def is_current(self) -> bool:
+        """Whether the file on disk is still the one mapped here."""
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return False
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size) == (
+            self.stat.st_ino, self.stat.st_mtime_ns, self.stat.st_size
+        )
+
+
+class _ConditionSymptoms(Sequence):
+    """Each condition's normalized symptoms, decoded from the mapped file on access."""
+
+    def __init__(self, catalog: CompiledCatalog, vocabulary: Tuple[str, ...]):
+        self._catalog = catalog
+        self._vocabulary = vocabulary
+
+    def __len__(self) -> int:
+        return self._catalog.condition_count
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return tuple(self[i] for i in range(*position.indices(len(self))))
+        return tuple(self._vocabulary[symptom_id] for symptom_id in self._catalog.condition_symptom_ids(position))
+
+
+class _Postings(Mapping):
+    """Symptom -> postings list, decoded from the mapped file on access."""
+
+    def __init__(self, catalog: CompiledCatalog, symptom_ids: Dict[str, int]):
+        self._catalog = catalog
+        self._symptom_ids = symptom_ids
+
+    def __len__(self) -> int:
+        return len(self._symptom_ids)
+
+    def __iter__(self):
+        return iter(self._symptom_ids)
+
+    def __getitem__(self, symptom: str) -> List[Tuple[int, int]]:
+        return self._catalog.postings(self._symptom_ids[symptom])
+
+
+class _ConditionMasks(Sequence):
+    """Each condition's symptom bitmask, built from its mapped symptom ids on access."""
+
+    def __init__(self, catalog: CompiledCatalog):
+        self._catalog = catalog
+
+    def __len__(self) -> int:
+        return self._catalog.condition_count
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return tuple(self[i] for i in range(*position.indices(len(self))))
+        mask = 0
+        for symptom_id in self._catalog.condition_symptom_ids(position):
+            mask |= 1 << symptom_id
+        return mask
+
+
+class CompiledSymptomIndex(SymptomIndex):
+    """``SymptomIndex`` whose postings and symptom lists stay in a compiled catalog file.
+
+    Only the vocabulary, which substring matching scans, and its ids are
+    decoded into the process; postings, symptom lists and the condition
+    bitmasks derived from them are read from the mapping as inputs are
+    matched, so workers share one copy of the index.
+    """
+
+    def __init__(self, catalog: CompiledCatalog):
+        self.vocabulary = tuple(catalog.vocabulary())
+        self.symptom_ids = {symptom: symptom_id for symptom_id, symptom in enumerate(self.vocabulary)}
+        self.condition_symptoms = _ConditionSymptoms(catalog, self.vocabulary)
+        self.postings = _Postings(catalog, self.symptom_ids)
+        self.condition_masks = _ConditionMasks(catalog)
+        self._resolved = {}
+        self._resolved_masks = {}
+        self._corrector = None
+        self._extractor = None
+
+
+_open_catalogs: Dict[str, CompiledCatalog] = {}
+
+
+def open_compiled_catalog(path: str) -> Optional[CompiledCatalog]:
+    """Map a compiled catalog, remapping it when the file is replaced.
+
+    Returns None if the file is missing or was written in an older format.
+    """
+    catalog = _open_catalogs.get(path)
+    if catalog is None or not catalog.is_current():
+        _open_catalogs.pop(path, None)
+        if not os.path.exists(path):
+            return None
+        try:
+            catalog = CompiledCatalog(path)
+        except ValueError:
+            # Not a catalog this version can read; load from the database until it is recompiled
+            return None
+        _open_catalogs[path] = catalog
+    return catalog
+
+
+class CompiledCatalogLoader(CatalogLoader):
+    """Loader serving snapshots from a compiled catalog file.
+
+    The database stays authoritative: versions are read through ``fallback``
+    and the file is used only while it holds that version of ``source``, so
+    a stale or missing file just means loading from the database.
+    """
+
+    def __init__(self, path: str, source: str, fallback: CatalogLoader):
+        self.path = path
+        self.source = source
+        self.fallback = fallback
+
+    def read_version(self) -> Optional[str]:
+        return self.fallback.read_version()
+
+    def load_conditions(self) -> Iterable[ConditionRecord]:
+        return self.fallback.load_conditions()
+
+    def load_snapshot(self, version: Optional[str] = None) -> CatalogSnapshot:
+        compiled = open_compiled_catalog(self.path)
+        if compiled is not None and compiled.has_conditions(self.source, version):
+            return compiled.snapshot()
+        return self.fallback.load_snapshot(version)
@@ -6,6 +6,7 @@ Centralized configuration management with environment variable support.
 import os
 from datetime import timedelta
 from dotenv import load_dotenv
+from sqlalchemy import event, text
 
 # Load environment variables from .env file
 load_dotenv()
@@ -22,6 +23,17 @@ class Config:
     SQLALCHEMY_DATABASE_URI = f"sqlite:///{DATABASE}"
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
+    # SQLite performance profile, applied to every new connection. WAL lets
+    # readers keep going while a writer commits; NORMAL sync is durable in WAL mode.
+    SQLITE_PRAGMAS = {
+        'journal_mode': os.environ.get('SQLITE_JOURNAL_MODE', 'WAL'),
+        'synchronous': os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL'),
+        'mmap_size': int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+        'cache_size': int(os.environ.get('SQLITE_CACHE_SIZE', -64000)),  # negative = KiB
+        'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT', 5000)),  # milliseconds
+        'temp_store': os.environ.get('SQLITE_TEMP_STORE', 'MEMORY'),
+    }
+    
     # Security Configuration
     SESSION_COOKIE_SECURE = os.environ.get('SESSION_COOKIE_SECURE', 'False').lower() == 'true'
     SESSION_COOKIE_HTTPONLY = True
@@ -64,9 +76,57 @@ class Config:
     RATELIMIT_ENABLED = os.environ.get('RATELIMIT_ENABLED', 'True').lower() == 'true'
     RATELIMIT_STORAGE_URL = os.environ.get('RATELIMIT_STORAGE_URL', 'memory://')
     
+    # Catalog Configuration
+    # Hot in-memory lookups (e.g. typeahead) re-check the catalog version at most this often
+    CATALOG_RECHECK_SECONDS = float(os.environ.get('CATALOG_RECHECK_SECONDS', 5))
+    SUGGEST_DEFAULT_LIMIT = 10
+    
     # Diagnosis Configuration
     DIAGNOSIS_CONFIDENCE_THRESHOLD = float(os.environ.get('DIAGNOSIS_CONFIDENCE_THRESHOLD', 0.8))
     MAX_DIAGNOSIS_RESULTS = int(os.environ.get('MAX_DIAGNOSIS_RESULTS', 10))
+    MAX_BATCH_DIAGNOSIS_SIZE = int(os.environ.get('MAX_BATCH_DIAGNOSIS_SIZE', 5000))
+    
+    # Default diagnosis scorer (see scorers.SCORERS): 'substring', 'jaccard',
+    # 'idf' or 'matrix' (NumPy; same scores as 'substring', which it falls back to)
+    DIAGNOSIS_SCORER = os.environ.get('DIAGNOSIS_SCORER', 'substring')
+    
+    # Memoized diagnoses per (catalog version, symptom set); size 0 disables
+    DIAGNOSIS_CACHE_SIZE = int(os.environ.get('DIAGNOSIS_CACHE_SIZE', 4096))
+    DIAGNOSIS_CACHE_TTL = float(os.environ.get('DIAGNOSIS_CACHE_TTL', 300))
+    
+    # Compiled catalog file mapped by every worker (flask compile-catalog); the
+    # database is used instead whenever the file is missing or out of date
+    COMPILED_CATALOG_PATH = os.environ.get('COMPILED_CATALOG_PATH', 'medicino.catalog')
+    
+    # Process pool for large diagnosis batches; 0 workers keeps scoring in-process
+    DIAGNOSIS_POOL_WORKERS = int(os.environ.get('DIAGNOSIS_POOL_WORKERS', 0))
+    DIAGNOSIS_POOL_MIN_BATCH = int(os.environ.get('DIAGNOSIS_POOL_MIN_BATCH', 500))
+    DIAGNOSIS_POOL_SHARD_SIZE = int(os.environ.get('DIAGNOSIS_POOL_SHARD_SIZE', 250))
+    DIAGNOSIS_POOL_START_METHOD = os.environ.get('DIAGNOSIS_POOL_START_METHOD', 'spawn')
+    
+    # Write-behind diagnosis history: requests get an ID immediately and rows
+    # are inserted in batches by a background thread
+    HISTORY_WRITE_BEHIND = os.environ.get('HISTORY_WRITE_BEHIND', 'False').lower() == 'true'
+    HISTORY_QUEUE_SIZE = int(os.environ.get('HISTORY_QUEUE_SIZE', 10000))
+    HISTORY_BATCH_SIZE = int(os.environ.get('HISTORY_BATCH_SIZE', 500))
+    HISTORY_FLUSH_INTERVAL = float(os.environ.get('HISTORY_FLUSH_INTERVAL', 0.5))
+    HISTORY_ENQUEUE_TIMEOUT = float(os.environ.get('HISTORY_ENQUEUE_TIMEOUT', 1.0))
+    HISTORY_ID_BLOCK_SIZE = int(os.environ.get('HISTORY_ID_BLOCK_SIZE', 1000))
+    # Retries for a failed batch before it is written row by row
+    HISTORY_MAX_RETRIES = int(os.environ.get('HISTORY_MAX_RETRIES', 3))
+    
+    # Per-request wall time, DB time, query and row counts, aggregated per
+    # endpoint; the Server-Timing header shows them to the client as well.
+    # Both are opt-in: the header reveals database timings to every client
+    REQUEST_METRICS_ENABLED = os.environ.get('REQUEST_METRICS_ENABLED', 'False').lower() == 'true'
+    SERVER_TIMING_HEADER = os.environ.get('SERVER_TIMING_HEADER', 'False').lower() == 'true'
+    
+    # Prometheus metrics at /metrics. Under a multi-process server (gunicorn)
+    # point METRICS_DIR at a directory shared by the workers and empty it on
+    # every restart; without it each worker only reports itself. Opt-in, as
+    # it writes per-process files and times every connection checkout
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'False').lower() == 'true'
+    METRICS_DIR = os.environ.get('METRICS_DIR')
     
     @staticmethod
     def init_app(app):
@@ -77,6 +137,9 @@ class DevelopmentConfig(Config):
     """Development configuration."""
     DEBUG = True
     SQLALCHEMY_TRACK_MODIFICATIONS = True
+    REQUEST_METRICS_ENABLED = os.environ.get('REQUEST_METRICS_ENABLED', 'True').lower() == 'true'
+    SERVER_TIMING_HEADER = os.environ.get('SERVER_TIMING_HEADER', 'True').lower() == 'true'
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'True').lower() == 'true'
 
 class TestingConfig(Config):
     """Testing configuration."""
@@ -84,6 +147,11 @@ class TestingConfig(Config):
     DATABASE = 'test_medicino.db'
     SQLALCHEMY_DATABASE_URI = f"sqlite:///{DATABASE}"
     WTF_CSRF_ENABLED = False
+    CATALOG_RECHECK_SECONDS = 0
+    COMPILED_CATALOG_PATH = None
+    REQUEST_METRICS_ENABLED = True
+    SERVER_TIMING_HEADER = True
+    METRICS_ENABLED = True
 
 class ProductionConfig(Config):
     """Production configuration."""
@@ -114,6 +182,22 @@ class ProductionConfig(Config):
             app.logger.setLevel(logging.INFO)
             app.logger.info('Medicino startup')
 
+def apply_sqlite_pragmas(engine, pragmas):
+    """Run the SQLite pragmas on every connection the engine opens."""
+    if engine.dialect.name != 'sqlite' or not pragmas:
+        return
+    
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+        cursor.close()
+
+def read_sqlite_pragmas(connection, names):
+    """Read the effective value of each pragma on a live connection."""
+    return {name: connection.execute(text(f'PRAGMA {name}')).scalar() for name in names}
+
 # Configuration dictionary
 config = {
     'development': DevelopmentConfig,
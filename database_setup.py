@@ -11,6 +11,9 @@ import sqlite3
 import os
 from datetime import datetime
 
+from catalog import CONDITIONS_CATALOG, MEDICINES_CATALOG, stamp_catalog_version
+from compiled_catalog import SYMPTOMS_CATALOG_PATH, compile_symptoms_catalog
+
 DATABASE = 'medicino.db'
 
 def create_database():
@@ -1996,10 +1999,18 @@ def create_database():
     
     print(f"Added {len(medicines_data)} medicines to database")
     
+    # New version stamps tell running workers to reload their catalog snapshots
+    stamp_catalog_version(conn, CONDITIONS_CATALOG)
+    stamp_catalog_version(conn, MEDICINES_CATALOG)
+    
     # Commit changes and close connection
     conn.commit()
     conn.close()
     
+    # Workers map this file instead of each loading the catalog
+    compile_symptoms_catalog(DATABASE)
+    print(f"Compiled catalog written to {SYMPTOMS_CATALOG_PATH}")
+    
     print("\n🎉 Database setup completed successfully!")
     print(f"📊 Database contains:")
     print(f"   • {len(symptoms_data)} medical conditions with symptoms")
@@ -0,0 +1,249 @@
+"""
+Shared diagnosis engine for Medicino.
+Framework-independent symptom matching and scoring used by the legacy Flask
+app, the enhanced Flask app and the Django app. Each backend plugs in a
+``CatalogLoader`` that reads its own condition table.
+"""
+
+import sqlite3
+import time
+from typing import Callable, Dict, Iterable, List, Optional
+
+from catalog import CONDITIONS_CATALOG, CatalogCache, CatalogSnapshot, ConditionRecord
+from result_cache import ResultCache
+from scorers import DEFAULT_SCORER, get_scorer
+from symptom_index import parse_input_symptoms
+
+DEFAULT_PRECAUTIONS = 'Always seek professional medical advice for an accurate diagnosis.'
+# Conditions listed in a diagnosis when there is no single strong match
+MAX_LISTED_CONDITIONS = 10
+# Share of input symptoms a condition must match to be reported on its own
+STRONG_MATCH_SCORE = 0.8
+
+SEVERITY_EMOJI = {
+    'mild': '🟢',
+    'moderate': '🟡',
+    'severe': '🔴',
+    'unknown': '❓'
+}
+
+NO_SYMPTOMS_RESULT = {
+    'disease': 'No symptoms provided',
+    'ayurvedic': 'Please enter your symptoms to get a diagnosis.',
+    'medicine': 'Please enter your symptoms to get medicine suggestions.',
+    'confidence': 0,
+    'severity': 'unknown',
+    'description': 'Please describe your symptoms in simple terms like: fever, headache, cough, stomach pain, etc.',
+    'precautions': DEFAULT_PRECAUTIONS
+}
+
+NO_MATCH_RESULT = {
+    'disease': 'No matching conditions found',
+    'ayurvedic': 'Please consult an Ayurvedic practitioner for personalized treatment.',
+    'medicine': 'Please consult a healthcare professional for proper diagnosis.',
+    'confidence': 0,
+    'severity': 'unknown',
+    'description': 'Try describing your symptoms in simple terms like: fever, headache, cough, stomach pain, etc.',
+    'precautions': DEFAULT_PRECAUTIONS
+}
+
+
+def result_cache_key(version: str, scorer: str, parsed_symptoms: List[str]) -> tuple:
+    """Result cache key; the same symptoms in any order or casing give the same diagnosis."""
+    return (version, scorer, tuple(sorted(parsed_symptoms)))
+
+
+class CatalogLoader:
+    """Reads one backend's condition catalog.
+
+    ``read_version`` returns the catalog's version stamp, or ``None`` when it
+    cannot tell (the catalog is then reloaded on every diagnosis), and
+    ``load_conditions`` returns the conditions in the order ties are ranked.
+    Loaders with a faster source for a known version override
+    ``load_snapshot``.
+    """
+
+    def read_version(self) -> Optional[str]:
+        raise NotImplementedError
+
+    def load_conditions(self) -> Iterable[ConditionRecord]:
+        raise NotImplementedError
+
+    def load_snapshot(self, version: Optional[str] = None) -> CatalogSnapshot:
+        return CatalogSnapshot(version, self.load_conditions())
+
+
+class SQLiteSymptomsLoader(CatalogLoader):
+    """Loader for the legacy ``symptoms_database`` table over raw sqlite3.
+
+    ``connect`` returns an open connection with ``sqlite3.Row`` rows; it is
+    not closed here, so pooled or per-request connections can be passed in.
+    """
+
+    def __init__(self, connect: Callable[[], sqlite3.Connection]):
+        self.connect = connect
+
+    def read_version(self) -> Optional[str]:
+        try:
+            row = self.connect().execute(
+                'SELECT version FROM catalog_versions WHERE name = ?', (CONDITIONS_CATALOG,)
+            ).fetchone()
+        except sqlite3.OperationalError:
+            return None
+        return row[0] if row else None
+
+    def load_conditions(self) -> Iterable[ConditionRecord]:
+        rows = self.connect().execute('SELECT * FROM symptoms_database ORDER BY id').fetchall()
+        return [
+            ConditionRecord(
+                id=row['id'],
+                name=row['condition_name'],
+                description=row['description'],
+                symptoms=row['symptoms'],
+                ayurvedic_remedy=row['ayurvedic_remedy'],
+                modern_treatment=row['medicine_suggestion'],
+                severity_level=row['severity_level'],
+                category=None,
+                created_at=None,
+                precautions=row['precautions']
+            )
+            for row in rows
+        ]
+
+
+class StaticCatalogLoader(CatalogLoader):
+    """Loader over conditions already in memory, e.g. shipped to a worker process."""
+
+    def __init__(self, version: Optional[str], conditions: Iterable[ConditionRecord]):
+        self.version = version
+        self.conditions = tuple(conditions)
+
+    def read_version(self) -> Optional[str]:
+        return self.version
+
+    def load_conditions(self) -> Iterable[ConditionRecord]:
+        return self.conditions
+
+
+class DiagnosisEngine:
+    """Diagnoses symptom text against a cached catalog snapshot.
+
+    ``scorer`` names the default strategy from ``scorers.SCORERS``,
+    ``result_cache`` memoizes results per catalog version, scorer and symptom
+    set and ``observe_score`` is called with the scorer name and seconds spent
+    each time symptoms are actually scored; all can also be given per call.
+    """
+
+    def __init__(self, loader: CatalogLoader, scorer: str = DEFAULT_SCORER,
+                 result_cache: Optional[ResultCache] = None,
+                 observe_score: Optional[Callable[[str, float], None]] = None):
+        get_scorer(scorer)
+        self.loader = loader
+        self.scorer = scorer
+        self.result_cache = result_cache
+        self.observe_score = observe_score
+        self.catalog = CatalogCache(loader.read_version, self.load_snapshot)
+
+    def load_snapshot(self, version: Optional[str] = None) -> CatalogSnapshot:
+        """Build a snapshot of the loader's current conditions."""
+        return self.loader.load_snapshot(version)
+
+    def get_snapshot(self, max_age: float = 0) -> CatalogSnapshot:
+        """Get the shared snapshot, reloading it only if the catalog changed."""
+        return self.catalog.get(max_age=max_age)
+
+    def diagnose(self, symptoms_text: str, catalog: Optional[CatalogSnapshot] = None,
+                 scorer: Optional[str] = None, result_cache: Optional[ResultCache] = None,
+                 observe_score: Optional[Callable[[str, float], None]] = None) -> Dict:
+        """Diagnose comma-separated or free-text symptoms.
+
+        Raises ValueError for an unknown scorer name.
+        """
+        scorer = scorer or self.scorer
+        get_scorer(scorer)
+        parsed_symptoms = parse_input_symptoms(symptoms_text or '')
+        if not parsed_symptoms:
+            return dict(NO_SYMPTOMS_RESULT)
+
+        if catalog is None:
+            catalog = self.get_snapshot()
+        cache = result_cache if result_cache is not None else self.result_cache
+        observe = observe_score or self.observe_score
+
+        # Unstamped catalogs are never cached
+        if cache is None or catalog.version is None:
+            return self.timed_score(parsed_symptoms, catalog, scorer, observe)
+
+        key = result_cache_key(catalog.version, scorer, parsed_symptoms)
+        result = cache.get(key)
+        if result is None:
+            result = self.timed_score(parsed_symptoms, catalog, scorer, observe)
+            cache.put(key, result)
+        return result
+
+    def diagnose_batch(self, symptom_texts: List[str], **options) -> List[Dict]:
+        """Diagnose many symptom lists against a single catalog snapshot."""
+        catalog = self.get_snapshot()
+        return [self.diagnose(text, catalog, **options) for text in symptom_texts]
+
+    def timed_score(self, parsed_symptoms: List[str], catalog: CatalogSnapshot, scorer: str,
+                    observe: Optional[Callable[[str, float], None]] = None) -> Dict:
+        """Score, reporting the scorer name and elapsed seconds to ``observe``."""
+        if observe is None:
+            return self.score(parsed_symptoms, catalog, scorer)
+        started = time.perf_counter()
+        result = self.score(parsed_symptoms, catalog, scorer)
+        observe(scorer, time.perf_counter() - started)
+        return result
+
+    def score(self, parsed_symptoms: List[str], catalog: CatalogSnapshot,
+              scorer: Optional[str] = None) -> Dict:
+        """Score parsed input symptoms against a catalog snapshot."""
+        conditions = catalog.conditions
+
+        # Split free text into the symptoms it mentions
+        input_symptoms = catalog.symptom_index.expand(parsed_symptoms)
+
+        # Only the conditions shown to the user are materialized, highest score first
+        ranked, total_matches = get_scorer(scorer or self.scorer).rank(
+            catalog, input_symptoms, MAX_LISTED_CONDITIONS
+        )
+        if not ranked:
+            return dict(NO_MATCH_RESULT)
+
+        # Highest score first; ties keep catalog order
+        best_position, best_score = ranked[0]
+        best_match = conditions[best_position]
+
+        # A very strong match (80% or more symptoms) is shown on its own
+        if best_score >= STRONG_MATCH_SCORE:
+            return {
+                'disease': best_match.name,
+                'ayurvedic': best_match.ayurvedic_remedy,
+                'medicine': best_match.modern_treatment,
+                'confidence': round(best_score * 100, 0),
+                'severity': best_match.severity_level,
+                'description': best_match.description,
+                'precautions': best_match.precautions or DEFAULT_PRECAUTIONS
+            }
+
+        condition_list = []
+        for position, score in ranked:
+            condition = conditions[position]
+            severity_emoji = SEVERITY_EMOJI.get(condition.severity_level, '❓')
+            confidence_text = f" ({round(score * 100, 0)}% match)"
+            condition_list.append(f"{severity_emoji} {condition.name}{confidence_text}")
+
+        condition_text = "\n• " + "\n• ".join(condition_list)
+        if total_matches > MAX_LISTED_CONDITIONS:
+            condition_text += f"\n\n... and {total_matches - MAX_LISTED_CONDITIONS} more possible conditions"
+
+        return {
+            'disease': f'Found {total_matches} possible conditions',
+            'ayurvedic': 'Please consult an Ayurvedic practitioner for personalized treatment.',
+            'medicine': 'Please consult a healthcare professional for proper diagnosis.',
+            'confidence': round(best_score * 100, 0),
+            'severity': 'unknown',
+            'description': f'Your symptoms could indicate these conditions:\n{condition_text}\n\nAdd more symptoms for more accurate results.',
+            'precautions': 'Always seek professional medical advice for an accurate diagnosis. This is not a substitute for medical consultation.'
+        }
@@ -0,0 +1,185 @@
+"""
+Multiprocess diagnosis for Medicino.
+Process pool whose workers each hold a preloaded catalog snapshot, so large
+batches are scored on every core instead of serializing on the GIL.
+"""
+
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+from catalog import CatalogSnapshot
+from compiled_catalog import CompiledConditions, open_compiled_catalog
+from diagnosis_engine import (
+    NO_SYMPTOMS_RESULT, DiagnosisEngine, StaticCatalogLoader, result_cache_key
+)
+from result_cache import ResultCache
+from scorers import get_scorer
+from symptom_index import parse_input_symptoms
+
+logger = logging.getLogger(__name__)
+
+# Per worker process: the engine and the snapshot it was started with
+_worker_engine: Optional[DiagnosisEngine] = None
+_worker_catalog: Optional[CatalogSnapshot] = None
+
+
+def _init_worker(version: str, conditions):
+    """Build the worker's snapshot once; only the condition records cross the process boundary.
+
+    ``conditions`` may instead be the path of a compiled catalog file, which
+    the worker maps itself.
+    """
+    global _worker_engine, _worker_catalog
+    if isinstance(conditions, str):
+        compiled = open_compiled_catalog(conditions)
+        if compiled is None or compiled.conditions_version != version:
+            raise RuntimeError(f'Compiled catalog {conditions} no longer holds catalog version {version}')
+        snapshot = compiled.snapshot()
+    else:
+        snapshot = CatalogSnapshot(version, conditions)
+    _worker_engine = DiagnosisEngine(StaticCatalogLoader(version, ()))
+    _worker_catalog = snapshot
+
+
+def _score_shard(version: str, parsed_symptoms: List[List[str]], scorer: str) -> List[Tuple[Dict, float]]:
+    """Score parsed symptom lists, returning each result with the seconds it took."""
+    if _worker_catalog is None or _worker_catalog.version != version:
+        raise RuntimeError('Diagnosis worker holds a different catalog version')
+    results = []
+    for parsed in parsed_symptoms:
+        started = time.perf_counter()
+        result = _worker_engine.score(parsed, _worker_catalog, scorer)
+        results.append((result, time.perf_counter() - started))
+    return results
+
+
+class DiagnosisPool:
+    """Shards diagnosis batches across worker processes.
+
+    Workers receive the catalog once, through the pool initializer; calls only
+    send parsed symptoms and receive result dicts. When the catalog version
+    changes the pool is replaced on the next batch; the old workers are
+    stopped once the batches still using them finish. The executor is
+    created lazily, and again after a fork, so it is safe to build in the app
+    factory of a preloading server.
+    """
+
+    def __init__(self, max_workers: int = None, shard_size: int = 250, start_method: str = 'spawn'):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.shard_size = shard_size
+        self.start_method = start_method
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._version: Optional[str] = None
+        # Batches in flight per executor; replaced executors shut down when theirs reaches 0
+        self._in_use: Dict[ProcessPoolExecutor, int] = {}
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+
+    def _acquire_executor(self, catalog: CatalogSnapshot) -> ProcessPoolExecutor:
+        """The executor for ``catalog``'s version, held until ``_release_executor``."""
+        with self._lock:
+            if os.getpid() != self._pid:
+                # Executors cannot be shared with a parent process
+                self._pid = os.getpid()
+                self._executor = None
+                self._in_use = {}
+            if self._executor is None or self._version != catalog.version:
+                if self._executor is not None and self._executor not in self._in_use:
+                    self._executor.shutdown(wait=False)
+                logger.info('Starting %d diagnosis workers for catalog %s', self.max_workers, catalog.version)
+                conditions = catalog.conditions
+                if isinstance(conditions, CompiledConditions):
+                    # Workers map the same file instead of receiving a copy of every record
+                    conditions = conditions.path
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context(self.start_method),
+                    initializer=_init_worker,
+                    initargs=(catalog.version, conditions)
+                )
+                self._version = catalog.version
+            self._in_use[self._executor] = self._in_use.get(self._executor, 0) + 1
+            return self._executor
+
+    def _release_executor(self, executor: ProcessPoolExecutor):
+        with self._lock:
+            if executor not in self._in_use:
+                return
+            self._in_use[executor] -= 1
+            if not self._in_use[executor]:
+                del self._in_use[executor]
+                if executor is not self._executor:
+                    executor.shutdown(wait=False)
+
+    def diagnose_batch(self, symptom_texts: List[str], catalog: CatalogSnapshot, scorer: str,
+                       result_cache: Optional[ResultCache] = None,
+                       observe_score: Optional[Callable[[str, float], None]] = None) -> List[Dict]:
+        """Diagnose ``symptom_texts`` in shards across the workers, keeping input order.
+
+        Like ``DiagnosisEngine.diagnose``, results are looked up in and added
+        to ``result_cache`` and each scoring time is reported to
+        ``observe_score``; only cache misses are sent to the workers, once per
+        distinct symptom set. The catalog must be stamped with a version; the
+        workers use it to confirm they hold the same snapshot as the caller.
+        Raises ValueError for an unknown scorer name.
+        """
+        if catalog.version is None:
+            raise ValueError('Only versioned catalogs can be shared with worker processes')
+        get_scorer(scorer)
+
+        results: List[Optional[Dict]] = [None] * len(symptom_texts)
+        # cache key -> (parsed symptoms to score, positions waiting for the result)
+        misses: Dict[tuple, Tuple[List[str], List[int]]] = {}
+        for position, text in enumerate(symptom_texts):
+            parsed = parse_input_symptoms(text or '')
+            if not parsed:
+                results[position] = dict(NO_SYMPTOMS_RESULT)
+                continue
+            key = result_cache_key(catalog.version, scorer, parsed)
+            if key in misses:
+                misses[key][1].append(position)
+                continue
+            cached = result_cache.get(key) if result_cache is not None else None
+            if cached is not None:
+                results[position] = cached
+            else:
+                misses[key] = (parsed, [position])
+        if not misses:
+            return results
+
+        keys = list(misses)
+        parsed_symptoms = [misses[key][0] for key in keys]
+        executor = self._acquire_executor(catalog)
+        try:
+            futures = [
+                executor.submit(_score_shard, catalog.version, parsed_symptoms[start:start + self.shard_size], scorer)
+                for start in range(0, len(parsed_symptoms), self.shard_size)
+            ]
+            scored = []
+            for future in futures:
+                scored.extend(future.result())
+        finally:
+            self._release_executor(executor)
+
+        for key, (result, seconds) in zip(keys, scored):
+            if observe_score is not None:
+                observe_score(scorer, seconds)
+            if result_cache is not None:
+                result_cache.put(key, result)
+            first, *repeats = misses[key][1]
+            results[first] = result
+            for position in repeats:
+                results[position] = dict(result)
+        return results
+
+    def shutdown(self):
+        """Stop the worker processes."""
+        with self._lock:
+            if self._executor is not None and os.getpid() == self._pid:
+                self._executor.shutdown(wait=True)
+            self._executor = None
@@ -143,6 +143,62 @@ class DiagnosisHistory(models.Model):
         ordering = ['-created_at']
         verbose_name_plural = "Diagnosis Histories"
 
+# ===== diagnosis.py =====
+# Shared diagnosis engine (diagnosis_engine.py from the Flask project on the
+# Python path) with a loader for the SymptomDatabase model
+from django.db import connection
+from django.db.utils import OperationalError, ProgrammingError
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from catalog import CONDITIONS_CATALOG, ConditionRecord, stamp_catalog_version
+from diagnosis_engine import CatalogLoader, DiagnosisEngine
+from result_cache import ResultCache
+from .models import SymptomDatabase
+
+class DjangoSymptomLoader(CatalogLoader):
+    """Diagnosis engine loader for the SymptomDatabase model."""
+
+    def read_version(self):
+        with connection.cursor() as cursor:
+            try:
+                cursor.execute('SELECT version FROM catalog_versions WHERE name = %s', [CONDITIONS_CATALOG])
+            except (OperationalError, ProgrammingError):
+                # Only a catalog that was never stamped is unversioned; other errors propagate
+                if 'catalog_versions' in connection.introspection.table_names():
+                    raise
+                return None
+            row = cursor.fetchone()
+        return row[0] if row else None
+
+    def load_conditions(self):
+        return [
+            ConditionRecord(
+                id=condition.id,
+                name=condition.condition_name,
+                description=condition.description,
+                symptoms=condition.symptoms,
+                ayurvedic_remedy=condition.ayurvedic_remedy,
+                modern_treatment=condition.medicine_suggestion,
+                severity_level=condition.severity_level,
+                category=None,
+                created_at=condition.created_at,
+                precautions=condition.precautions
+            )
+            for condition in SymptomDatabase.objects.order_by('condition_name')
+        ]
+
+symptom_engine = DiagnosisEngine(DjangoSymptomLoader(), result_cache=ResultCache())
+
+@receiver([post_save, post_delete], sender=SymptomDatabase)
+def stamp_symptom_catalog(sender, **kwargs):
+    """Give the catalog a new version so every process reloads it.
+
+    Bulk queryset updates bypass these signals; call stamp_catalog_version
+    after them.
+    """
+    with connection.cursor() as cursor:
+        stamp_catalog_version(cursor, CONDITIONS_CATALOG, placeholder='%s')
+
 # ===== serializers.py =====
 from rest_framework import serializers
 from .models import Medicine, SymptomDatabase, DiagnosisHistory
@@ -176,8 +232,8 @@ from rest_framework.response import Response
 from rest_framework.decorators import api_view
 from .models import Medicine, SymptomDatabase, DiagnosisHistory
 from .serializers import MedicineSerializer, DiagnosisRequestSerializer, DiagnosisHistorySerializer
+from .diagnosis import symptom_engine
 import json
-import re
 
 def get_client_ip(request):
     x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
@@ -188,42 +244,8 @@ def get_client_ip(request):
     return ip
 
 def diagnose_symptoms_ai(symptoms_text):
-    """AI-like symptom diagnosis logic using Django ORM"""
-    conditions = SymptomDatabase.objects.all()
-    input_symptoms = [s.strip().lower() for s in re.split(r'[,\s]+', symptoms_text.lower()) if s.strip()]
-
-    best_match = None
-    best_score = 0
-
-    for condition in conditions:
-        condition_symptoms = [s.strip().lower() for s in condition.symptoms.split(',')]
-        matches = sum(1 for symptom in input_symptoms if any(symptom in cs or cs in symptom for cs in condition_symptoms))
-        score = matches / len(condition_symptoms) if condition_symptoms else 0
-
-        if score > best_score and score > 0.3:
-            best_score = score
-            best_match = condition
-
-    if best_match:
-        return {
-            'disease': best_match.condition_name,
-            'ayurvedic': best_match.ayurvedic_remedy,
-            'medicine': best_match.medicine_suggestion,
-            'confidence': round(best_score * 100, 2),
-            'severity': best_match.severity_level,
-            'description': best_match.description,
-            'precautions': best_match.precautions
-        }
-    else:
-        return {
-            'disease': 'Unable to determine condition',
-            'ayurvedic': 'Please consult an Ayurvedic practitioner for personalized treatment.',
-            'medicine': 'Please consult a healthcare professional for proper diagnosis.',
-            'confidence': 0,
-            'severity': 'unknown',
-            'description': 'Symptoms do not match any known conditions in our database.',
-            'precautions': 'Seek professional medical advice for proper diagnosis.'
-        }
+    """Symptom diagnosis using the engine shared with the Flask apps"""
+    return symptom_engine.diagnose(symptoms_text)
 
 def index(request):
     """Main page view"""
@@ -0,0 +1,398 @@
+#!/usr/bin/env python3
+"""
+Synthetic data generator for Medicino scale testing.
+Bulk-loads a deterministic, seedable catalog, user population and diagnosis
+history into the current schema with chunked executemany in large
+transactions, so data sets of any size can be produced in minutes.
+
+    python generate_data.py --database medicino_scale.db
+    python generate_data.py --database small.db --conditions 1000 --users 1000 --history 100000 --force
+"""
+
+import argparse
+import itertools
+import os
+import random
+import sqlite3
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Iterator, List, Sequence, Tuple
+
+from werkzeug.security import generate_password_hash
+
+from catalog import CONDITIONS_CATALOG, MEDICINES_CATALOG, stamp_catalog_version
+
+# Every generated user can log in with this password
+DEFAULT_PASSWORD = 'password123'
+CHUNK_SIZE = 50_000
+COMMIT_EVERY = 1_000_000
+# Generated timestamps are fixed rather than relative to today, so runs are reproducible
+HISTORY_END = datetime(2025, 1, 1)
+
+# Symptoms shared by conditions of every body system, most common first
+GENERAL_SYMPTOMS = ['fatigue', 'fever', 'headache', 'nausea', 'dizziness', 'loss of appetite', 'chills',
+                    'weakness', 'body ache', 'weight loss', 'night sweats', 'insomnia', 'vomiting', 'malaise']
+QUALIFIERS = ['', 'mild', 'severe', 'chronic', 'sudden', 'recurring', 'persistent', 'sharp', 'dull',
+              'burning', 'throbbing', 'intermittent', 'nocturnal']
+# Body system (condition category) -> (sites, findings)
+BODY_SYSTEMS = {
+    'Respiratory': (['chest', 'throat', 'nose', 'lung', 'sinus', 'airway'],
+                    ['cough', 'congestion', 'wheezing', 'pain', 'tightness', 'irritation', 'discharge']),
+    'Digestive': (['stomach', 'abdomen', 'bowel', 'rectum', 'liver', 'esophagus'],
+                  ['pain', 'bloating', 'cramps', 'burning', 'discomfort', 'bleeding', 'swelling']),
+    'Skin': (['skin', 'scalp', 'face', 'hand', 'foot', 'nail', 'lip'],
+             ['rash', 'itching', 'redness', 'dryness', 'blisters', 'peeling', 'swelling', 'lesions']),
+    'Musculoskeletal': (['back', 'neck', 'knee', 'shoulder', 'hip', 'ankle', 'wrist', 'joint', 'muscle'],
+                        ['pain', 'stiffness', 'swelling', 'weakness', 'tenderness', 'spasms', 'cramps']),
+    'Neurological': (['head', 'face', 'arm', 'leg', 'hand', 'foot'],
+                     ['numbness', 'tingling', 'pain', 'tremor', 'weakness', 'twitching']),
+    'Cardiovascular': (['chest', 'heart', 'arm', 'leg', 'ankle'],
+                       ['pain', 'palpitations', 'pressure', 'swelling', 'discomfort', 'coldness']),
+    'Urinary': (['bladder', 'kidney', 'groin', 'pelvis', 'flank'],
+                ['pain', 'burning', 'pressure', 'discomfort', 'frequency', 'urgency']),
+    'Eye & ENT': (['eye', 'ear', 'nose', 'throat', 'jaw', 'tooth', 'gum'],
+                  ['pain', 'redness', 'itching', 'discharge', 'swelling', 'ringing', 'sensitivity']),
+}
+# Share of conditions per body system
+SYSTEM_WEIGHTS = [16, 14, 14, 16, 10, 10, 8, 12]
+CONDITION_SUFFIXES = ['syndrome', 'disorder', 'disease', 'infection', 'inflammation', 'dysfunction']
+SEVERITIES = ['mild', 'moderate', 'severe']
+SEVERITY_WEIGHTS = [50, 35, 15]
+REMEDIES = ['Tulsi tea', 'Ginger and honey', 'Turmeric milk', 'Ashwagandha', 'Triphala', 'Neem paste',
+            'Aloe vera gel', 'Brahmi', 'Licorice root', 'Amla juice', 'Shatavari', 'Guduchi']
+TREATMENTS = ['Rest and fluids', 'Over-the-counter pain relief', 'Antibiotics if bacterial', 'Antihistamines',
+              'Physiotherapy', 'Topical corticosteroids', 'Anti-inflammatory medication', 'Specialist referral']
+MEDICINE_CATEGORIES = ['Pain Relief', 'Antibiotic', 'Antihistamine', 'Antacid', 'Antiviral', 'Supplement',
+                       'Cardiovascular', 'Dermatological', 'Respiratory', 'Herbal']
+NAME_PREFIXES = ['Ace', 'Bro', 'Cal', 'Dex', 'Eno', 'Flu', 'Gab', 'Hyd', 'Ibu', 'Lor', 'Met', 'Nap',
+                 'Oxa', 'Pra', 'Ran', 'Sal', 'Ter', 'Val', 'Xyl', 'Zol']
+NAME_ROOTS = ['mo', 'ri', 'ta', 'xo', 'ce', 'la', 'vi', 'do', 'pe', 'su', 'ni', 'ko']
+NAME_SUFFIXES = ['lin', 'zole', 'pril', 'mab', 'vir', 'cet', 'fen', 'done', 'sartan', 'statin', 'mide']
+FIRST_NAMES = ['Aarav', 'Priya', 'Rohan', 'Ananya', 'Vikram', 'Meera', 'Arjun', 'Kavya', 'Sam', 'Alex',
+               'Maria', 'John', 'Fatima', 'Chen', 'Olivia', 'Noah', 'Aisha', 'Lucas', 'Sofia', 'Ravi']
+LAST_NAMES = ['Sharma', 'Patel', 'Iyer', 'Khan', 'Reddy', 'Singh', 'Gupta', 'Nair', 'Smith', 'Garcia',
+              'Chen', 'Okafor', 'Müller', 'Silva', 'Kim', 'Das', 'Mehta', 'Joshi', 'Brown', 'Ali']
+FEEDBACK = [None] * 17 + ['helpful', 'not helpful', 'partially helpful']
+
+
+def _rng(seed: int, stream: str) -> random.Random:
+    """Independent stream per table, so changing one table's size leaves the others unchanged."""
+    return random.Random(f'{seed}:{stream}')
+
+
+def _zipf_cum_weights(count: int, exponent: float = 1.0) -> List[float]:
+    """Cumulative Zipf weights for ``random.choices`` over ``count`` ranks."""
+    return list(itertools.accumulate(1 / (rank + 1) ** exponent for rank in range(count)))
+
+
+def _unique(name: str, seen: Dict[str, int]) -> str:
+    count = seen.get(name, 0) + 1
+    seen[name] = count
+    return name if count == 1 else f'{name} {count}'
+
+
+def _timestamp(moment: datetime) -> str:
+    # Same text form SQLAlchemy stores DateTime columns in, so rows sort and parse alike
+    return moment.strftime('%Y-%m-%d %H:%M:%S.%f')
+
+
+def system_vocabulary(seed: int) -> Dict[str, List[str]]:
+    """Symptom phrases per body system, in a seeded popularity order."""
+    rng = _rng(seed, 'vocabulary')
+    vocabulary = {}
+    for system, (sites, findings) in BODY_SYSTEMS.items():
+        phrases = [' '.join(filter(None, (qualifier, site, finding)))
+                   for qualifier in QUALIFIERS for site in sites for finding in findings]
+        rng.shuffle(phrases)
+        vocabulary[system] = phrases
+    return vocabulary
+
+
+def condition_rows(count: int, seed: int) -> Iterator[Tuple]:
+    """``conditions`` rows.
+
+    Each condition belongs to one body system and lists three to ten
+    symptoms: usually one or two general ones (fever, fatigue...) and the rest
+    from its system. Symptom popularity within a pool is Zipf-distributed,
+    so a few symptoms are listed by many conditions and most by only a few.
+    """
+    rng = _rng(seed, 'conditions')
+    vocabulary = system_vocabulary(seed)
+    systems = list(BODY_SYSTEMS)
+    system_weights = {system: _zipf_cum_weights(len(phrases), 1.1) for system, phrases in vocabulary.items()}
+    general_weights = _zipf_cum_weights(len(GENERAL_SYMPTOMS))
+    seen: Dict[str, int] = {}
+    created_at = _timestamp(HISTORY_END - timedelta(days=2 * 365))
+
+    for _ in range(count):
+        system = rng.choices(systems, SYSTEM_WEIGHTS)[0]
+        total = round(rng.triangular(3, 10, 5))
+        general = min(total - 1, rng.choices((0, 1, 2), (25, 50, 25))[0])
+        symptoms = rng.choices(GENERAL_SYMPTOMS, cum_weights=general_weights, k=general)
+        symptoms += rng.choices(vocabulary[system], cum_weights=system_weights[system], k=total - general)
+        symptoms = list(dict.fromkeys(symptoms))
+        rng.shuffle(symptoms)
+
+        sites, findings = BODY_SYSTEMS[system]
+        name = _unique(f'{rng.choice(sites).title()} {rng.choice(findings)} {rng.choice(CONDITION_SUFFIXES)}', seen)
+        yield (
+            name,
+            f'A {system.lower()} condition typically presenting with {" and ".join(symptoms[:2])}.',
+            ', '.join(symptoms),
+            f'{rng.choice(REMEDIES)}, {rng.choice(REMEDIES).lower()}',
+            rng.choice(TREATMENTS),
+            rng.choices(SEVERITIES, SEVERITY_WEIGHTS)[0],
+            system,
+            1,
+            created_at
+        )
+
+
+def medicine_rows(count: int, seed: int) -> Iterator[Tuple]:
+    """``medicines`` rows with generated brand names and log-normal prices."""
+    rng = _rng(seed, 'medicines')
+    seen: Dict[str, int] = {}
+    created_at = _timestamp(HISTORY_END - timedelta(days=2 * 365))
+    for _ in range(count):
+        system = rng.choices(list(BODY_SYSTEMS), SYSTEM_WEIGHTS)[0]
+        sites, findings = BODY_SYSTEMS[system]
+        name = _unique(rng.choice(NAME_PREFIXES) + rng.choice(NAME_ROOTS) + rng.choice(NAME_SUFFIXES), seen)
+        yield (
+            name,
+            f'Relieves {rng.choice(sites)} {rng.choice(findings)} and related {system.lower()} symptoms',
+            f'{rng.choice((1, 2))} tablet(s) {rng.choice(("once", "twice", "three times"))} daily',
+            rng.choice(('Nausea', 'Drowsiness', 'Headache', 'Dry mouth', 'Stomach upset')),
+            rng.choice(('Pregnancy', 'Liver disease', 'Kidney disease', 'Allergy to ingredients')),
+            round(min(500.0, rng.lognormvariate(2.3, 0.8)), 2),
+            rng.choice(MEDICINE_CATEGORIES),
+            1,
+            created_at
+        )
+
+
+def user_rows(count: int, seed: int, start: int = 1) -> Iterator[Tuple]:
+    """``users`` rows; all share one password hash, for ``DEFAULT_PASSWORD``."""
+    rng = _rng(seed, 'users')
+    password_hash = generate_password_hash(DEFAULT_PASSWORD)
+    joined = HISTORY_END - timedelta(days=2 * 365)
+    for i in range(start, start + count):
+        created_at = _timestamp(joined + timedelta(seconds=rng.randrange(2 * 365 * 86400)))
+        yield (
+            f'user{i:07d}',
+            f'user{i:07d}@example.com',
+            password_hash,
+            rng.choice(FIRST_NAMES),
+            rng.choice(LAST_NAMES),
+            rng.choice(('male', 'female', 'other')),
+            1,
+            0,
+            created_at,
+            created_at
+        )
+
+
+def history_rows(count: int, conditions: Sequence[Tuple], users: int, seed: int,
+                 days: int = 365) -> Iterator[Tuple]:
+    """``diagnosis_history`` rows, oldest first, spread evenly over the ``days`` days before ``HISTORY_END``.
+
+    ``conditions`` are ``(id, name, symptoms, ayurvedic_remedy,
+    modern_treatment, severity_level)`` tuples. Condition popularity is
+    Zipf-distributed and a minority of users account for most diagnoses;
+    each row reports two to four of its condition's symptoms.
+    """
+    rng = _rng(seed, 'history')
+    # Popularity is independent of catalog order
+    popular = list(conditions)
+    rng.shuffle(popular)
+    cum_weights = _zipf_cum_weights(len(popular))
+    # A few symptom subsets per condition, built on first use, keep rows cheap to generate
+    variants: Dict[int, List[str]] = {}
+
+    start = HISTORY_END - timedelta(days=days)
+    step = days * 86400 / max(count, 1)
+    formatted_second, formatted = -1, ''
+    for offset in range(0, count, CHUNK_SIZE):
+        size = min(CHUNK_SIZE, count - offset)
+        # Drawn a chunk at a time, which is much cheaper than per row
+        picks = rng.choices(popular, cum_weights=cum_weights, k=size)
+        # Squaring skews activity towards the lower user ids
+        user_ids = [int(users * rng.random() ** 2) + 1 for _ in range(size)]
+        confidences = [round(40 + 60 * rng.random(), 1) for _ in range(size)]
+        feedback = rng.choices(FEEDBACK, k=size)
+        for i, condition, user_id, confidence, user_feedback in zip(
+                range(offset, offset + size), picks, user_ids, confidences, feedback):
+            condition_id, name, symptoms, remedy, treatment, severity = condition
+            choices = variants.get(condition_id)
+            if choices is None:
+                listed = symptoms.split(', ')
+                choices = variants[condition_id] = [
+                    ', '.join(rng.sample(listed, min(len(listed), rng.randint(2, 4)))) for _ in range(4)
+                ]
+            second = int(i * step)
+            if second != formatted_second:
+                formatted_second, formatted = second, _timestamp(start + timedelta(seconds=second))
+            yield (user_id, condition_id, choices[i & 3], name, remedy, treatment,
+                   confidence, severity, user_feedback, formatted)
+
+
+def insert_rows(conn: sqlite3.Connection, table: str, columns: Sequence[str], rows: Iterable[Tuple],
+                chunk_size: int = CHUNK_SIZE, commit_every: int = COMMIT_EVERY, label: str = None) -> int:
+    """Insert ``rows`` with chunked executemany, committing every ``commit_every`` rows."""
+    statement = f'INSERT INTO {table} ({", ".join(columns)}) VALUES ({", ".join("?" * len(columns))})'
+    rows = iter(rows)
+    inserted = since_commit = 0
+    started = time.monotonic()
+    while True:
+        chunk = list(itertools.islice(rows, chunk_size))
+        if not chunk:
+            break
+        conn.executemany(statement, chunk)
+        inserted += len(chunk)
+        since_commit += len(chunk)
+        if since_commit >= commit_every:
+            conn.commit()
+            since_commit = 0
+            if label:
+                rate = inserted / max(time.monotonic() - started, 1e-9)
+                print(f'   {label}: {inserted:,} rows ({rate:,.0f}/s)', file=sys.stderr)
+    conn.commit()
+    return inserted
+
+
+@contextmanager
+def indexes_dropped(conn: sqlite3.Connection, table: str):
+    """Drop a table's secondary indexes for a bulk load and rebuild them afterwards."""
+    indexes = conn.execute(
+        "SELECT name, sql FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL", (table,)
+    ).fetchall()
+    for name, _sql in indexes:
+        conn.execute(f'DROP INDEX "{name}"')
+    try:
+        yield
+    finally:
+        for _name, sql in indexes:
+            conn.execute(sql)
+        conn.commit()
+
+
+CONDITION_COLUMNS = ('name', 'description', 'symptoms', 'ayurvedic_remedy', 'modern_treatment',
+                     'severity_level', 'category', 'is_active', 'created_at')
+MEDICINE_COLUMNS = ('name', 'description', 'dosage', 'side_effects', 'contraindications', 'price',
+                    'category', 'is_active', 'created_at')
+USER_COLUMNS = ('username', 'email', 'password_hash', 'first_name', 'last_name', 'gender', 'is_active',
+                'is_admin', 'created_at', 'updated_at')
+HISTORY_COLUMNS = ('user_id', 'condition_id', 'symptoms', 'diagnosed_condition', 'ayurvedic_remedy',
+                   'medicine_suggestion', 'confidence_score', 'severity_level', 'user_feedback', 'created_at')
+
+
+def generate_catalog(conn: sqlite3.Connection, conditions: int, medicines: int, seed: int = 42,
+                     label: bool = False) -> int:
+    """Load synthetic conditions and medicines and stamp new catalog versions; returns rows inserted."""
+    inserted = 0
+    for table, columns, rows in (('conditions', CONDITION_COLUMNS, condition_rows(conditions, seed)),
+                                 ('medicines', MEDICINE_COLUMNS, medicine_rows(medicines, seed))):
+        with indexes_dropped(conn, table):
+            inserted += insert_rows(conn, table, columns, rows, label=table if label else None)
+    # Bulk inserts bypass the ORM hook that stamps catalog versions
+    stamp_catalog_version(conn, CONDITIONS_CATALOG)
+    stamp_catalog_version(conn, MEDICINES_CATALOG)
+    conn.commit()
+    return inserted
+
+
+def generate_history(conn: sqlite3.Connection, users: int, history: int, seed: int = 42,
+                     days: int = 365, label: bool = False) -> int:
+    """Load synthetic users and their diagnosis history over the existing conditions."""
+    first_user = (conn.execute('SELECT MAX(id) FROM users').fetchone()[0] or 0) + 1
+    with indexes_dropped(conn, 'users'):
+        insert_rows(conn, 'users', USER_COLUMNS, user_rows(users, seed, first_user),
+                    label='users' if label else None)
+    if not history:
+        return 0
+
+    conditions = conn.execute(
+        'SELECT id, name, symptoms, ayurvedic_remedy, modern_treatment, severity_level '
+        'FROM conditions WHERE is_active = 1 ORDER BY id'
+    ).fetchall()
+    total_users = conn.execute('SELECT MAX(id) FROM users').fetchone()[0] or 0
+    if not conditions or not total_users:
+        raise ValueError('Diagnosis history needs conditions and users to refer to')
+    with indexes_dropped(conn, 'diagnosis_history'):
+        inserted = insert_rows(conn, 'diagnosis_history', HISTORY_COLUMNS,
+                               history_rows(history, conditions, total_users, seed, days),
+                               label='diagnosis_history' if label else None)
+    # Write-behind history reserves ids in blocks; keep its next block past the new rows
+    conn.execute(
+        'UPDATE id_blocks SET next_value = (SELECT MAX(id) + 1 FROM diagnosis_history) '
+        'WHERE name = ? AND next_value <= (SELECT MAX(id) FROM diagnosis_history)', ('diagnosis_history',)
+    )
+    conn.commit()
+    return inserted
+
+
+def create_schema(database: str):
+    """Create the application's tables, indexes and search indexes."""
+    from sqlalchemy import create_engine
+    from models import db, ensure_indexes
+    from search_index import ensure_search_indexes
+    engine = create_engine(f'sqlite:///{database}')
+    try:
+        db.metadata.create_all(engine)
+        ensure_indexes(engine)
+        ensure_search_indexes(engine)
+    finally:
+        engine.dispose()
+
+
+def connect_for_bulk_load(database: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(database)
+    conn.execute('PRAGMA journal_mode = WAL')
+    # A crash mid-load means regenerating anyway, so skip fsyncs
+    conn.execute('PRAGMA synchronous = OFF')
+    conn.execute('PRAGMA cache_size = -262144')
+    conn.execute('PRAGMA temp_store = MEMORY')
+    return conn
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Generate a synthetic Medicino data set for scale testing.')
+    parser.add_argument('--database', default='medicino_scale.db', help='SQLite database to create.')
+    parser.add_argument('--force', action='store_true', help='Replace the database if it already exists.')
+    parser.add_argument('--seed', type=int, default=42, help='Seed; the same seed and sizes give the same data.')
+    parser.add_argument('--conditions', type=int, default=100_000)
+    parser.add_argument('--medicines', type=int, default=50_000)
+    parser.add_argument('--users', type=int, default=1_000_000)
+    parser.add_argument('--history', type=int, default=100_000_000)
+    parser.add_argument('--history-days', type=int, default=365, help='Days of history, ending at 2025-01-01, to spread rows over.')
+    args = parser.parse_args(argv)
+
+    if os.path.exists(args.database):
+        if not args.force:
+            raise SystemExit(f'{args.database} already exists; pass --force to replace it')
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(args.database + suffix):
+                os.remove(args.database + suffix)
+
+    started = time.monotonic()
+    print(f'Creating {args.database}...')
+    create_schema(args.database)
+    conn = connect_for_bulk_load(args.database)
+    try:
+        generate_catalog(conn, args.conditions, args.medicines, args.seed, label=True)
+        generate_history(conn, args.users, args.history, args.seed, args.history_days, label=True)
+        conn.execute('PRAGMA optimize')
+    finally:
+        conn.close()
+
+    print(f'\n🎉 Generated in {time.monotonic() - started:,.0f}s:')
+    print(f'   • {args.conditions:,} conditions and {args.medicines:,} medicines')
+    print(f'   • {args.users:,} users (password: {DEFAULT_PASSWORD})')
+    print(f'   • {args.history:,} diagnosis history rows')
+    # Relative SQLite paths are resolved under the app's instance folder, so give an absolute one
+    print(f'\nRun the app against it with DATABASE_URL={os.path.abspath(args.database)}')
+
+
+if __name__ == '__main__':
+    main()
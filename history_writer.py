@@ -0,0 +1,252 @@
+"""
+Write-behind persistence for Medicino diagnosis history.
+Diagnoses get their ID immediately and are inserted in batches by a background
+thread, so requests no longer wait on a commit per diagnosis.
+"""
+
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+from models import DiagnosisHistory, IdBlock
+
+logger = logging.getLogger(__name__)
+
+HISTORY_SEQUENCE = 'diagnosis_history'
+
+
+class IdAllocator:
+    """Hands out primary keys from blocks reserved in the ``id_blocks`` table.
+
+    Each process reserves ``block_size`` IDs at a time with a conditional
+    UPDATE, so gunicorn workers never hand out the same ID; a forked child
+    drops the block it inherited and reserves its own. While write-behind is
+    enabled every history insert must take its ID from here; rows inserted
+    without an explicit ID could land inside a reserved block.
+    """
+
+    def __init__(self, engine, sequence: str = HISTORY_SEQUENCE, block_size: int = 1000):
+        self.engine = engine
+        self.sequence = sequence
+        self.block_size = block_size
+        self._next = 0
+        self._limit = 0
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+
+    def allocate(self, count: int = 1) -> List[int]:
+        """Return ``count`` unused IDs."""
+        if self._pid != os.getpid():
+            # The parent keeps handing out the rest of its block
+            self._pid = os.getpid()
+            self._next = self._limit = 0
+            self._lock = threading.Lock()
+        ids = []
+        with self._lock:
+            while len(ids) < count:
+                if self._next >= self._limit:
+                    self._next, self._limit = self._reserve(max(self.block_size, count - len(ids)))
+                take = min(count - len(ids), self._limit - self._next)
+                ids.extend(range(self._next, self._next + take))
+                self._next += take
+        return ids
+
+    def _reserve(self, size: int):
+        table = IdBlock.__table__
+        while True:
+            try:
+                with self.engine.begin() as conn:
+                    start = conn.execute(
+                        select(table.c.next_value).where(table.c.name == self.sequence)
+                    ).scalar()
+                    if start is None:
+                        start = (conn.execute(select(func.max(DiagnosisHistory.id))).scalar() or 0) + 1
+                        conn.execute(insert(table).values(name=self.sequence, next_value=start + size))
+                        return start, start + size
+
+                    claimed = conn.execute(
+                        update(table)
+                        .where(table.c.name == self.sequence, table.c.next_value == start)
+                        .values(next_value=start + size)
+                    ).rowcount
+                    if claimed:
+                        return start, start + size
+            except IntegrityError:
+                # Another process created the sequence row first; claim from it instead
+                continue
+            # Another process took this block first; read the new high-water mark
+
+
+class HistoryWriter:
+    """Background thread batching diagnosis history inserts.
+
+    The queue is bounded: when it is full, ``submit`` waits up to
+    ``enqueue_timeout`` seconds and then writes the rows itself, which both
+    slows producers down and guarantees nothing is dropped. A failed batch is
+    retried up to ``max_retries`` times (integrity errors are not retried),
+    then written row by row; rows the database still rejects are logged and
+    kept in ``dead_letters`` so one bad row cannot stall the queue.
+    ``shutdown`` (also run at interpreter exit) drains whatever is still queued;
+    rows submitted after it are written synchronously. A forked child (e.g. a
+    worker of a preloading server) inherits the queue but not the thread, so
+    ``submit`` starts a fresh queue and thread in the new process.
+    """
+
+    def __init__(self, engine, max_queue_size: int = 10000, batch_size: int = 500,
+                 flush_interval: float = 0.5, enqueue_timeout: float = 1.0,
+                 id_block_size: int = 1000, max_retries: int = 3,
+                 dead_letter_size: int = 1000):
+        self.engine = engine
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.enqueue_timeout = enqueue_timeout
+        self.max_retries = max_retries
+        self.ids = IdAllocator(engine, block_size=id_block_size)
+
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue_size)
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self._start_lock = threading.Lock()
+        self.written = 0
+        self.failures = 0
+        self.rejected = 0
+        # Most recent (row, error) pairs the database refused
+        self.dead_letters: deque = deque(maxlen=dead_letter_size)
+
+    def start(self):
+        """Start the writer thread and arrange for a final flush at exit."""
+        if self._thread is None:
+            if self._pid is None:
+                atexit.register(self.shutdown)
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='history-writer', daemon=True)
+            self._thread.start()
+        return self
+
+    def _restart_after_fork(self):
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            logger.info('Restarting the history writer in forked process %d', os.getpid())
+            # Rows queued before the fork are the parent's to write
+            self._queue = queue.Queue(maxsize=self._queue.maxsize)
+            self._stopping = threading.Event()
+            self._thread = None
+            self.start()
+
+    @property
+    def depth(self) -> int:
+        """Number of rows waiting to be written."""
+        return self._queue.qsize()
+
+    def submit(self, rows: List[Dict]):
+        """Queue history rows (with IDs already assigned) for insertion."""
+        if self._pid is not None and self._pid != os.getpid():
+            self._restart_after_fork()
+        if self._stopping.is_set():
+            # Nothing drains the queue any more
+            self._write_batch(rows)
+            return
+        for position, row in enumerate(rows):
+            try:
+                self._queue.put(row, timeout=self.enqueue_timeout)
+            except queue.Full:
+                logger.warning('History write queue full; writing %d rows synchronously',
+                               len(rows) - position)
+                self._write(rows[position:])
+                return
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until every queued row has been written. Returns False on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.005)
+        return True
+
+    def shutdown(self, timeout: float = 30.0):
+        """Stop accepting work and write everything still queued."""
+        if self._stopping.is_set():
+            return
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        # Anything left (no thread, or it timed out) is written here
+        remaining = []
+        while True:
+            batch = self._drain(block=False)
+            if not batch:
+                break
+            remaining.extend(batch)
+        if remaining:
+            try:
+                self._write_batch(remaining)
+            finally:
+                for _ in remaining:
+                    self._queue.task_done()
+
+    def _run(self):
+        while not self._stopping.is_set() or not self._queue.empty():
+            batch = self._drain(block=True)
+            if not batch:
+                continue
+            try:
+                self._write_batch(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _write_batch(self, batch: List[Dict]):
+        """Write a batch, retrying transient errors, then fall back to single rows."""
+        for attempt in range(self.max_retries + 1):
+            try:
+                self._write(batch)
+                return
+            except IntegrityError:
+                # A constraint failure will not go away on retry
+                self.failures += 1
+                logger.warning('Diagnosis history batch of %d rows violates a constraint; '
+                               'writing rows one at a time', len(batch))
+                break
+            except Exception:
+                self.failures += 1
+                if attempt == self.max_retries:
+                    logger.exception('Diagnosis history batch of %d rows failed %d times; '
+                                     'writing rows one at a time', len(batch), attempt + 1)
+                    break
+                logger.exception('Diagnosis history batch of %d rows failed; retrying', len(batch))
+                time.sleep(min(5.0, 0.1 * (attempt + 1)))
+
+        for row in batch:
+            try:
+                self._write([row])
+            except Exception as e:
+                self.rejected += 1
+                self.dead_letters.append((row, str(e)))
+                logger.error('Rejected diagnosis history row %s: %s; row: %r', row.get('id'), e, row)
+
+    def _drain(self, block: bool) -> List[Dict]:
+        batch = []
+        try:
+            if block:
+                batch.append(self._queue.get(timeout=self.flush_interval))
+            while len(batch) < self.batch_size:
+                batch.append(self._queue.get_nowait())
+        except queue.Empty:
+            pass
+        return batch
+
+    def _write(self, rows: List[Dict]):
+        with self.engine.begin() as conn:
+            conn.execute(insert(DiagnosisHistory.__table__), rows)
+        self.written += len(rows)
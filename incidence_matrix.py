@@ -0,0 +1,122 @@
+"""
+Vectorized diagnosis scoring for Medicino.
+Sparse condition x symptom incidence matrix scored with NumPy. NumPy is
+optional: without it ``NUMPY_AVAILABLE`` is False and callers keep using the
+pure-Python ``SymptomIndex``.
+"""
+
+from typing import Dict, List, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - depends on the environment
+    np = None
+
+from symptom_index import SymptomIndex
+
+NUMPY_AVAILABLE = np is not None
+
+
+class IncidenceMatrix:
+    """Condition x symptom incidence matrix built from a ``SymptomIndex``.
+
+    Stored column-wise (CSC): the conditions listing vocabulary symptom ``j``
+    are ``positions[indptr[j]:indptr[j + 1]]``, with the first offset of that
+    symptom in each condition alongside in ``offsets``. ``match`` returns
+    exactly what ``SymptomIndex.match`` returns for the same inputs.
+    """
+
+    def __init__(self, symptom_index: SymptomIndex):
+        if np is None:
+            raise RuntimeError('NumPy is required for the incidence matrix engine')
+
+        self.symptom_index = symptom_index
+        self.shape = (len(symptom_index), len(symptom_index.vocabulary))
+        self.columns: Dict[str, int] = {
+            symptom: column for column, symptom in enumerate(symptom_index.vocabulary)
+        }
+
+        lengths = [len(symptom_index.postings[symptom]) for symptom in symptom_index.vocabulary]
+        self.indptr = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=self.indptr[1:])
+
+        postings = [
+            entry for symptom in symptom_index.vocabulary for entry in symptom_index.postings[symptom]
+        ]
+        entries = np.array(postings, dtype=np.int32).reshape(-1, 2)
+        self.positions = entries[:, 0].copy()
+        self.offsets = entries[:, 1].copy()
+
+    def _gather(self, columns: Sequence[int]) -> Tuple['np.ndarray', 'np.ndarray']:
+        """Nonzero rows and offsets of the given columns."""
+        if not columns:
+            empty = np.zeros(0, dtype=np.int32)
+            return empty, empty
+        starts = self.indptr[columns]
+        ends = self.indptr[np.asarray(columns) + 1]
+        take = np.concatenate([np.arange(start, end) for start, end in zip(starts, ends)])
+        return self.positions[take], self.offsets[take]
+
+    def _hits(self, input_symptoms: Sequence[str]):
+        """Row (input), position and offset of every input/condition symptom hit."""
+        rows, positions, offsets = [], [], []
+        for row, input_symptom in enumerate(input_symptoms):
+            columns = [self.columns[symptom] for symptom in self.symptom_index.resolve(input_symptom)]
+            hit_positions, hit_offsets = self._gather(columns)
+            rows.append(np.full(len(hit_positions), row, dtype=np.int32))
+            positions.append(hit_positions)
+            offsets.append(hit_offsets)
+
+        return np.concatenate(rows), np.concatenate(positions), np.concatenate(offsets)
+
+    def match_counts(self, input_symptoms: Sequence[str]) -> 'np.ndarray':
+        """Number of input symptoms each condition matches, for every condition."""
+        hits = np.zeros((len(input_symptoms), self.shape[0]), dtype=bool)
+        if input_symptoms:
+            rows, positions, _offsets = self._hits(input_symptoms)
+            hits[rows, positions] = True
+        return hits.sum(axis=0)
+
+    def rank(self, input_symptoms: Sequence[str], limit: int) -> Tuple[List[Tuple[int, int]], int]:
+        """Same contract as ``SymptomIndex.rank``, without visiting matches in Python."""
+        counts = self.match_counts(input_symptoms)
+        matched = np.flatnonzero(counts)
+        if not len(matched) or limit <= 0:
+            return [], len(matched)
+
+        # Most matches first, then catalog order: one integer key per condition
+        keys = (len(input_symptoms) - counts[matched]).astype(np.int64) * self.shape[0] + matched
+        if len(keys) > limit:
+            keys = keys[np.argpartition(keys, limit - 1)[:limit]]
+        keys.sort()
+        top = keys % self.shape[0]
+        return list(zip(top.tolist(), counts[top].tolist())), len(matched)
+
+    def match(self, input_symptoms: Sequence[str]) -> List[Tuple[int, List[str]]]:
+        """Match input symptoms against every condition at once.
+
+        Each input symptom becomes a multi-hot vector over the vocabulary; its
+        product with the matrix marks the conditions it hits and the minimum
+        offset picks the condition symptom reported as matched.
+        """
+        if not input_symptoms or not self.shape[0]:
+            return []
+
+        rows, positions, offsets = self._hits(input_symptoms)
+
+        # inputs x conditions: first offset of a hit symptom, or the sentinel
+        sentinel = np.iinfo(np.int32).max
+        first = np.full((len(input_symptoms), self.shape[0]), sentinel, dtype=np.int32)
+        np.minimum.at(first, (rows, positions), offsets)
+
+        counts = (first != sentinel).sum(axis=0)
+        matched = np.flatnonzero(counts)
+
+        condition_symptoms = self.symptom_index.condition_symptoms
+        results = []
+        for position, row_offsets in zip(matched.tolist(), first[:, matched].T.tolist()):
+            symptoms = condition_symptoms[position]
+            results.append((position, [
+                symptoms[offset] for offset in row_offsets if offset != sentinel
+            ]))
+        return results
@@ -0,0 +1,425 @@
+#!/usr/bin/env python3
+"""
+HTTP load test for Medicino.
+Serves the enhanced app (or the legacy app.py) with a real WSGI server on
+localhost, logs in synthetic users and replays a weighted mix of requests at
+a target rate, then reports throughput, latency percentiles and error rates
+per endpoint as JSON.
+
+    python load_test.py --users 20 --rate 100 --duration 30
+    python load_test.py --target legacy --mix diagnose=60,medicines=20,history=20
+    python load_test.py --server gunicorn --workers 4 --output load.json
+
+The app always runs against a scratch copy of the database, so the load test
+never writes to the real one; an empty enhanced catalog is filled by
+``generate_data``.
+"""
+
+import argparse
+import http.client
+import itertools
+import json
+import os
+import random
+import shutil
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from http.cookies import SimpleCookie
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlencode
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+HOST = '127.0.0.1'
+PASSWORD = 'loadtest123'
+
+# Operations each target serves
+OPERATIONS = {
+    'enhanced': ('diagnose', 'medicines', 'search', 'history'),
+    'legacy': ('diagnose', 'medicines', 'history'),
+}
+# Operations whose endpoint is known to fail; kept out of the default mix and
+# flagged in the report when a --mix asks for them
+KNOWN_FAILURES = {
+    'search': '/search always returns 500 because templates/search.html is missing',
+}
+# Default request mix per target; weights are relative
+DEFAULT_MIX = {
+    'enhanced': {'diagnose': 55, 'medicines': 25, 'history': 20},
+    'legacy': {'diagnose': 60, 'medicines': 20, 'history': 20},
+}
+
+
+def enhanced_app():
+    """WSGI app for the enhanced target, with its tables and search indexes in place."""
+    from app_enhanced import app
+    from models import db, ensure_indexes
+    from search_index import ensure_search_indexes
+    with app.app_context():
+        db.create_all()
+        ensure_indexes(db.engine)
+        ensure_search_indexes(db.engine)
+    return app
+
+
+def legacy_app():
+    """WSGI app for the legacy target."""
+    from app import app
+    return app
+
+
+APPS = {'enhanced': enhanced_app, 'legacy': legacy_app}
+
+
+def prepare_database(target: str, catalog_size: int, seed: int):
+    """Create the scratch database's tables and fill an empty enhanced catalog with synthetic conditions."""
+    if target != 'enhanced':
+        return
+    from generate_data import generate_catalog
+    from models import db, Condition
+    app = enhanced_app()
+    with app.app_context():
+        if catalog_size and not db.session.query(Condition.id).first():
+            conn = db.engine.raw_connection()
+            try:
+                generate_catalog(conn.driver_connection, catalog_size, max(50, catalog_size // 2), seed)
+            finally:
+                conn.close()
+
+
+def read_vocabulary(database: str, target: str) -> List[str]:
+    """Symptoms listed in the scratch database's catalog, to build realistic inputs from."""
+    table = 'conditions' if target == 'enhanced' else 'symptoms_database'
+    conn = sqlite3.connect(database)
+    try:
+        rows = conn.execute(f'SELECT symptoms FROM {table}').fetchall()
+    finally:
+        conn.close()
+    return sorted({s.strip().lower() for (symptoms,) in rows for s in symptoms.split(',') if s.strip()})
+
+
+class Client:
+    """One user's keep-alive connection and session cookies."""
+
+    def __init__(self, port: int, timeout: float):
+        self.connection = http.client.HTTPConnection(HOST, port, timeout=timeout)
+        self.cookies = SimpleCookie()
+
+    def request(self, method: str, path: str, json_body=None, form=None) -> int:
+        """Send a request and read the whole response; returns the status code."""
+        headers, body = {}, None
+        if json_body is not None:
+            body = json.dumps(json_body).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+        elif form is not None:
+            body = urlencode(form).encode('utf-8')
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        if self.cookies:
+            headers['Cookie'] = '; '.join(f'{name}={morsel.value}' for name, morsel in self.cookies.items())
+        try:
+            self.connection.request(method, path, body, headers)
+            response = self.connection.getresponse()
+            response.read()
+        except (http.client.HTTPException, OSError):
+            # The next request reconnects
+            self.connection.close()
+            raise
+        for cookie in response.headers.get_all('Set-Cookie') or ():
+            self.cookies.load(cookie)
+        return response.status
+
+    def close(self):
+        self.connection.close()
+
+
+def log_in(client: Client, target: str, username: str) -> bool:
+    """Register and log in a synthetic user."""
+    email = f'{username}@loadtest.local'
+    if target == 'enhanced':
+        client.request('POST', '/api/register', json_body={'username': username, 'email': email, 'password': PASSWORD})
+        status = client.request('POST', '/api/login', json_body={'username': username, 'password': PASSWORD})
+    else:
+        client.request('POST', '/register', form={'username': username, 'email': email, 'password': PASSWORD,
+                                                  'confirm_password': PASSWORD})
+        # Success redirects to the app, failure renders the form again
+        status = client.request('POST', '/login', form={'username': username, 'password': PASSWORD})
+        status = 200 if status == 302 else 401
+    return status == 200
+
+
+def build_request(target: str, operation: str, rng: random.Random, vocabulary: List[str]) -> Tuple[str, str, Optional[Dict]]:
+    """Method, path and JSON body of one request of the mix."""
+    symptoms = rng.sample(vocabulary, min(len(vocabulary), rng.randint(1, 4)))
+    word = rng.choice(rng.choice(vocabulary).split())
+    if operation == 'diagnose':
+        return 'POST', '/api/diagnose', {'symptoms': ', '.join(symptoms)}
+    if operation == 'medicines':
+        if target == 'legacy':
+            return 'GET', '/api/medicines', None
+        return 'GET', f'/api/medicines?{urlencode({"search": word, "per_page": 20})}', None
+    if operation == 'search':
+        return 'GET', f'/search?{urlencode({"q": word})}', None
+    if operation == 'history':
+        return 'GET', '/api/diagnose/history' if target == 'enhanced' else '/api/history', None
+    raise ValueError(f'Unknown operation: {operation}')
+
+
+class Stats:
+    """Latencies and outcomes per operation, shared by the user threads."""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+        self.statuses: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, operation: str, latency: float, status: Optional[int]):
+        with self._lock:
+            self.latencies.setdefault(operation, []).append(latency)
+            if status is None or status >= 400:
+                self.errors[operation] = self.errors.get(operation, 0) + 1
+            statuses = self.statuses.setdefault(operation, {})
+            key = str(status) if status is not None else 'connection_error'
+            statuses[key] = statuses.get(key, 0) + 1
+
+    def summary(self, elapsed: float) -> Dict:
+        def describe(latencies, errors, statuses=None):
+            latencies = sorted(latencies)
+            percentile = lambda q: round(latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000, 2)
+            result = {
+                'requests': len(latencies),
+                'errors': errors,
+                'error_rate': round(errors / len(latencies), 4),
+                'throughput_rps': round(len(latencies) / elapsed, 2),
+                'p50_ms': percentile(0.50),
+                'p90_ms': percentile(0.90),
+                'p99_ms': percentile(0.99),
+                'max_ms': round(latencies[-1] * 1000, 2)
+            }
+            if statuses is not None:
+                result['statuses'] = statuses
+            return result
+
+        endpoints = {
+            operation: describe(latencies, self.errors.get(operation, 0), self.statuses[operation])
+            for operation, latencies in sorted(self.latencies.items())
+        }
+        everything = [latency for latencies in self.latencies.values() for latency in latencies]
+        total = describe(everything, sum(self.errors.values())) if everything else {'requests': 0}
+        return {'total': total, 'endpoints': endpoints}
+
+
+def run_users(clients: List[Client], target: str, mix: Dict[str, int], vocabulary: List[str],
+              rate: float, duration: float, seed: int) -> Tuple[Stats, float]:
+    """Replay the mix from every user until ``duration`` seconds have passed.
+
+    With a ``rate``, request ``i`` is due at ``start + i / rate`` whichever
+    user sends it, and latency is measured from that due time, so a server
+    falling behind shows up as latency rather than as a lower send rate.
+    Without one, every user sends back to back.
+    """
+    stats = Stats()
+    schedule = itertools.count()
+    operations, weights = list(mix), list(mix.values())
+    start = time.perf_counter()
+
+    def user(index, client):
+        rng = random.Random(seed + index)
+        while True:
+            if rate:
+                due = start + next(schedule) / rate
+                if due - start >= duration:
+                    return
+                delay = due - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            else:
+                due = time.perf_counter()
+                if due - start >= duration:
+                    return
+            operation = rng.choices(operations, weights)[0]
+            method, path, body = build_request(target, operation, rng, vocabulary)
+            try:
+                status = client.request(method, path, json_body=body)
+            except (http.client.HTTPException, OSError):
+                status = None
+            stats.record(operation, time.perf_counter() - due, status)
+
+    threads = [threading.Thread(target=user, args=(i, client), daemon=True) for i, client in enumerate(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return stats, time.perf_counter() - start
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind((HOST, 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_server(process: subprocess.Popen, port: int, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'Server exited with status {process.returncode}')
+        try:
+            with socket.create_connection((HOST, port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f'Server did not start listening on port {port}')
+
+
+def server_command(args, port: int) -> List[str]:
+    if args.server == 'gunicorn':
+        return [sys.executable, '-m', 'gunicorn', '--preload', '--workers', str(args.workers),
+                '--threads', str(args.threads), '--bind', f'{HOST}:{port}', f'load_test:{args.target}_app()']
+    return [sys.executable, os.path.join(REPO_DIR, 'load_test.py'), 'serve', '--target', args.target, '--port', str(port)]
+
+
+def serve(target: str, port: int):
+    """Serve a target with Werkzeug's threaded WSGI server (for when gunicorn is not installed)."""
+    from werkzeug.serving import make_server
+    make_server(HOST, port, APPS[target](), threaded=True).serve_forever()
+
+
+def parse_mix(text: Optional[str], target: str) -> Dict[str, int]:
+    if not text:
+        return DEFAULT_MIX[target]
+    mix = {}
+    for entry in text.split(','):
+        operation, _, weight = entry.partition('=')
+        if operation not in OPERATIONS['enhanced']:
+            raise SystemExit(f'Unknown operation in --mix: {operation}')
+        if operation not in OPERATIONS[target]:
+            raise SystemExit(f'The {target} app has no {operation} endpoint')
+        mix[operation] = int(weight or 1)
+    return mix
+
+
+def run(args) -> Dict:
+    mix = parse_mix(args.mix, args.target)
+    warnings = [f'{operation}: {KNOWN_FAILURES[operation]}' for operation in mix if operation in KNOWN_FAILURES]
+    for warning in warnings:
+        print(f'Warning: {warning}', file=sys.stderr)
+    scratch = tempfile.mkdtemp(prefix='medicino-load-')
+    database = os.path.join(scratch, 'medicino.db')
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [REPO_DIR, os.environ.get('PYTHONPATH')])),
+               DATABASE_URL=database, FLASK_CONFIG=args.config,
+               METRICS_DIR=os.path.join(scratch, 'metrics'))
+    source = args.database or (os.path.join(REPO_DIR, 'medicino.db') if args.target == 'legacy' else None)
+    server = None
+    clients = []
+    try:
+        if source:
+            shutil.copyfile(source, database)
+        subprocess.run([sys.executable, os.path.join(REPO_DIR, 'load_test.py'), 'prepare', '--target', args.target,
+                        '--catalog-size', str(args.catalog_size), '--seed', str(args.seed)],
+                       cwd=scratch, env=env, check=True)
+        vocabulary = read_vocabulary(database, args.target)
+        if not vocabulary:
+            raise SystemExit('The catalog is empty; pass --database or --catalog-size')
+
+        port = free_port()
+        server = subprocess.Popen(server_command(args, port), cwd=scratch, env=env,
+                                  stdout=subprocess.DEVNULL, stderr=None if args.verbose else subprocess.DEVNULL)
+        wait_for_server(server, port)
+
+        print(f'Logging in {args.users} users...', file=sys.stderr)
+        run_id = datetime.utcnow().strftime('%H%M%S')
+        clients = [Client(port, args.timeout) for _ in range(args.users)]
+        logins = [None] * args.users
+
+        def login(i):
+            logins[i] = log_in(clients[i], args.target, f'load{run_id}u{i}')
+
+        threads = [threading.Thread(target=login, args=(i,)) for i in range(args.users)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if not all(logins):
+            raise SystemExit(f'{logins.count(False)} of {args.users} users could not log in')
+
+        print(f'Replaying {mix} for {args.duration}s...', file=sys.stderr)
+        stats, elapsed = run_users(clients, args.target, mix, vocabulary, args.rate, args.duration, args.seed)
+        report = {
+            'generated_at': datetime.utcnow().isoformat(),
+            'target': args.target,
+            'server': args.server,
+            'workers': args.workers if args.server == 'gunicorn' else 1,
+            'users': args.users,
+            'target_rate_rps': args.rate or None,
+            'duration_s': round(elapsed, 2),
+            'mix': mix,
+            **stats.summary(elapsed)
+        }
+        if warnings:
+            report['warnings'] = warnings
+        return report
+    finally:
+        for client in clients:
+            client.close()
+        if server is not None:
+            server.terminate()
+            try:
+                server.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                server.kill()
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='HTTP load test for Medicino.')
+    subcommands = parser.add_subparsers(dest='command')
+
+    serve_parser = subcommands.add_parser('serve', help='Serve a target (used internally).')
+    serve_parser.add_argument('--target', choices=APPS, default='enhanced')
+    serve_parser.add_argument('--port', type=int, required=True)
+
+    prepare_parser = subcommands.add_parser('prepare', help='Prepare the scratch database (used internally).')
+    prepare_parser.add_argument('--target', choices=APPS, default='enhanced')
+    prepare_parser.add_argument('--catalog-size', type=int, default=1000)
+    prepare_parser.add_argument('--seed', type=int, default=42)
+
+    parser.add_argument('--target', choices=APPS, default='enhanced', help='App to load.')
+    parser.add_argument('--server', choices=['werkzeug', 'gunicorn'], default='werkzeug', help='WSGI server.')
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn worker processes.')
+    parser.add_argument('--threads', type=int, default=4, help='gunicorn threads per worker.')
+    parser.add_argument('--config', default='production', help='Config name for the enhanced app.')
+    parser.add_argument('--database', default=None,
+                        help='Database to copy for the run (legacy default: medicino.db; enhanced default: a synthetic catalog).')
+    parser.add_argument('--catalog-size', type=int, default=1000,
+                        help='Synthetic conditions to load when the enhanced catalog is empty.')
+    parser.add_argument('--users', type=int, default=10, help='Concurrent logged-in users.')
+    parser.add_argument('--rate', type=float, default=50, help='Target requests per second overall (0 = as fast as possible).')
+    parser.add_argument('--duration', type=float, default=30, help='Seconds to replay the mix for.')
+    parser.add_argument('--mix', default=None, help='Weighted mix, e.g. diagnose=55,medicines=25,history=20.')
+    parser.add_argument('--timeout', type=float, default=30, help='Per-request timeout in seconds.')
+    parser.add_argument('--seed', type=int, default=42, help='Seed for the synthetic data and request mix.')
+    parser.add_argument('--output', default=None, help='File to write the JSON report to (defaults to stdout).')
+    parser.add_argument('--verbose', action='store_true', help="Show the server's log output.")
+    args = parser.parse_args(argv)
+
+    if args.command == 'serve':
+        serve(args.target, args.port)
+    elif args.command == 'prepare':
+        prepare_database(args.target, args.catalog_size, args.seed)
+    else:
+        report = json.dumps(run(args), indent=2)
+        if args.output:
+            with open(args.output, 'w') as f:
+                f.write(report + '\n')
+        else:
+            print(report)
+
+
+if __name__ == '__main__':
+    main()
@@ -9,7 +9,7 @@ import os
 import sys
 from datetime import datetime
 from app_enhanced import create_app
-from models import db, User, Medicine, Condition, DiagnosisHistory
+from models import db, ensure_indexes, User, Medicine, Condition, DiagnosisHistory
 
 def backup_old_database():
     """Create a backup of the old database"""
@@ -143,6 +143,7 @@ def run_migration():
     app = create_app()
     with app.app_context():
         db.create_all()
+        ensure_indexes(db.engine)
         print("✅ New database structure created")
         
         # Connect to old database
@@ -4,13 +4,18 @@ SQLAlchemy ORM models with proper relationships and validation.
 """
 
 from datetime import datetime
+from itertools import chain
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy import event
 from sqlalchemy.ext.hybrid import hybrid_property
-from sqlalchemy.orm import validates
+from sqlalchemy.orm import Session, validates
 import re
 
+from catalog import CONDITIONS_CATALOG, MEDICINES_CATALOG, new_catalog_version
+from search_index import attach_search_indexes
+
 db = SQLAlchemy()
 
 class User(UserMixin, db.Model):
@@ -147,10 +152,19 @@ class Condition(db.Model):
     def __repr__(self):
         return f'<Condition {self.name}>'
 
+# Full-text search indexes are created and dropped along with their tables
+attach_search_indexes([Medicine.__table__, Condition.__table__])
+
 class DiagnosisHistory(db.Model):
     """Diagnosis history model for tracking user diagnoses."""
     
     __tablename__ = 'diagnosis_history'
+    __table_args__ = (
+        # Keyset pages of one user's history, newest first
+        db.Index('ix_diagnosis_history_user_created_id', 'user_id', 'created_at', 'id'),
+        # Keyset batches of the full history export
+        db.Index('ix_diagnosis_history_created_at_id', 'created_at', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -181,4 +195,66 @@ class DiagnosisHistory(db.Model):
         }
     
     def __repr__(self):
-        return f'<DiagnosisHistory {self.id} - {self.diagnosed_condition}>' 
\ No newline at end of file
+        return f'<DiagnosisHistory {self.id} - {self.diagnosed_condition}>'
+
+class IdBlock(db.Model):
+    """High-water mark for primary keys handed out in blocks by history_writer.IdAllocator."""
+    
+    __tablename__ = 'id_blocks'
+    
+    name = db.Column(db.String(50), primary_key=True)
+    next_value = db.Column(db.Integer, nullable=False)
+    
+    def __repr__(self):
+        return f'<IdBlock {self.name} {self.next_value}>'
+
+class CatalogVersion(db.Model):
+    """Version stamp for a reference catalog, changed whenever its rows change."""
+    
+    __tablename__ = 'catalog_versions'
+    
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.String(32), nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<CatalogVersion {self.name} {self.version}>'
+
+def ensure_indexes(engine):
+    """Create any model index missing from an existing database.
+    
+    ``create_all`` only adds indexes together with new tables, so databases
+    created before an index was declared get it here.
+    """
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(engine, checkfirst=True)
+
+def bump_catalog_version(session, name):
+    """Give a catalog a new version stamp so cached snapshots are reloaded.
+    
+    Flushes stamp catalog changes automatically; call this directly after bulk
+    statements (``query.update()``/``query.delete()``) that bypass the session.
+    """
+    stamp = session.get(CatalogVersion, name)
+    if stamp is None:
+        session.add(CatalogVersion(name=name, version=new_catalog_version()))
+    else:
+        stamp.version = new_catalog_version()
+
+CATALOG_MODELS = {
+    Condition: CONDITIONS_CATALOG,
+    Medicine: MEDICINES_CATALOG
+}
+
+@event.listens_for(Session, 'before_flush')
+def stamp_changed_catalogs(session, flush_context, instances):
+    """Bump the version of every catalog touched by this flush."""
+    changed = {
+        CATALOG_MODELS[type(obj)]
+        for obj in chain(session.new, session.dirty, session.deleted)
+        if type(obj) in CATALOG_MODELS
+    }
+    with session.no_autoflush:
+        for name in sorted(changed):
+            bump_catalog_version(session, name)
@@ -0,0 +1,131 @@
+"""
+Free-text symptom extraction for Medicino.
+Aho-Corasick automaton over every known symptom phrase and synonym, finding all
+of them in one pass over whatever the user typed.
+"""
+
+from collections import deque
+from typing import Dict, Iterable, List, Tuple
+
+# Everyday wording mapped to the symptom names used in the catalog
+SYMPTOM_SYNONYMS: Dict[str, str] = {
+    'high temperature': 'fever',
+    'temperature': 'fever',
+    'feverish': 'fever',
+    'throwing up': 'vomiting',
+    'threw up': 'vomiting',
+    'puking': 'vomiting',
+    'feeling sick': 'nausea',
+    'queasy': 'nausea',
+    'tummy ache': 'stomach pain',
+    'stomach ache': 'stomach pain',
+    'belly pain': 'stomach pain',
+    'head hurts': 'headache',
+    'head ache': 'headache',
+    'stuffy nose': 'nasal congestion',
+    'blocked nose': 'nasal congestion',
+    'tired': 'fatigue',
+    'exhausted': 'fatigue',
+    'short of breath': 'shortness of breath',
+    'breathless': 'shortness of breath',
+    'loose motions': 'diarrhea',
+    'diarrhoea': 'diarrhea',
+    'cant sleep': 'insomnia',
+    "can't sleep": 'insomnia',
+    'itchy': 'itching',
+    'dizzy': 'dizziness',
+}
+
+
+class AhoCorasick:
+    """Multi-pattern string matcher: every occurrence of every pattern in one scan."""
+
+    def __init__(self, patterns: Iterable[str]):
+        self.patterns: List[str] = []
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.outputs: List[List[int]] = [[]]
+
+        for pattern in patterns:
+            if not pattern:
+                continue
+            node = 0
+            for char in pattern:
+                next_node = self.goto[node].get(char)
+                if next_node is None:
+                    next_node = len(self.goto)
+                    self.goto[node][char] = next_node
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.outputs.append([])
+                node = next_node
+            self.outputs[node].append(len(self.patterns))
+            self.patterns.append(pattern)
+
+        # Breadth-first failure links; each node also reports its suffixes' patterns
+        pending = deque(self.goto[0].values())
+        while pending:
+            node = pending.popleft()
+            for char, child in self.goto[node].items():
+                pending.append(child)
+                fallback = self.fail[node]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                target = self.goto[fallback].get(char, 0)
+                self.fail[child] = target if target != child else 0
+                self.outputs[child] = self.outputs[child] + self.outputs[self.fail[child]]
+
+    def find_all(self, text: str) -> List[Tuple[int, int, int]]:
+        """All ``(start, end, pattern_id)`` occurrences in ``text``, by end position."""
+        found = []
+        node = 0
+        for position, char in enumerate(text):
+            while node and char not in self.goto[node]:
+                node = self.fail[node]
+            node = self.goto[node].get(char, 0)
+            for pattern_id in self.outputs[node]:
+                end = position + 1
+                found.append((end - len(self.patterns[pattern_id]), end, pattern_id))
+        return found
+
+
+class PhraseExtractor:
+    """Finds known symptom phrases in free text and maps them to canonical symptoms.
+
+    Only whole-word occurrences count, and overlapping occurrences resolve to
+    the leftmost, then longest, phrase - "severe headache" is reported once,
+    not also as "headache".
+    """
+
+    def __init__(self, phrases: Dict[str, str]):
+        self.canonical: List[str] = list(phrases.values())
+        self.automaton = AhoCorasick(phrases)
+
+    def extract(self, text: str) -> List[str]:
+        """Distinct canonical symptoms mentioned in ``text``, in order of appearance."""
+        text = ' '.join(text.lower().split())
+        occurrences = [
+            (start, -(end - start), end, pattern_id)
+            for start, end, pattern_id in self.automaton.find_all(text)
+            if (start == 0 or not text[start - 1].isalnum())
+            and (end == len(text) or not text[end].isalnum())
+        ]
+        occurrences.sort()
+
+        symptoms: List[str] = []
+        covered = 0
+        for start, _length, end, pattern_id in occurrences:
+            if start < covered:
+                continue
+            covered = end
+            symptom = self.canonical[pattern_id]
+            if symptom not in symptoms:
+                symptoms.append(symptom)
+        return symptoms
+
+
+def build_phrase_extractor(vocabulary: Iterable[str]) -> PhraseExtractor:
+    """Extractor over a symptom vocabulary plus the built-in synonyms."""
+    phrases = dict(SYMPTOM_SYNONYMS)
+    phrases.update((symptom, symptom) for symptom in vocabulary if symptom)
+    return PhraseExtractor(phrases)
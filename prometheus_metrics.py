@@ -0,0 +1,455 @@
+"""
+Prometheus metrics for Medicino.
+Counters, gauges and histograms in the text exposition format, served at
+``/metrics``. With a metrics directory every worker process writes its values
+to its own memory-mapped file and a scrape of any worker adds them all up.
+"""
+
+import glob
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+from collections import namedtuple
+from typing import Dict, Iterator, Optional, Sequence, Tuple
+
+from flask import Response, g, request
+from sqlalchemy.pool import QueuePool
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+UNMATCHED_ROUTE = '<unmatched>'
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SCORING_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+WAIT_BUCKETS = (0.0001, 0.001, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)
+
+Metric = namedtuple('Metric', 'kind help labels buckets')
+
+# Recorded gauges are per worker: their first label is always the worker's
+# process ID. The cache hit ratio is worked out from the counters instead.
+METRICS = {
+    'medicino_http_requests_total': Metric(
+        'counter', 'HTTP requests by route, method and status.',
+        ('blueprint', 'route', 'method', 'status'), None),
+    'medicino_http_request_duration_seconds': Metric(
+        'histogram', 'HTTP request latency by route and method.',
+        ('blueprint', 'route', 'method'), LATENCY_BUCKETS),
+    'medicino_db_queries_total': Metric(
+        'counter', 'SQL statements executed while handling requests, by route.',
+        ('blueprint', 'route'), None),
+    'medicino_db_rows_fetched_total': Metric(
+        'counter', 'Rows fetched while handling requests, by route.',
+        ('blueprint', 'route'), None),
+    'medicino_db_pool_checkout_wait_seconds': Metric(
+        'histogram', 'Time spent waiting for a database connection from the pool.',
+        (), WAIT_BUCKETS),
+    'medicino_diagnosis_scoring_seconds': Metric(
+        'histogram', 'Time spent scoring symptoms against the catalog (cache misses).',
+        ('scorer',), SCORING_BUCKETS),
+    'medicino_diagnosis_cache_hits_total': Metric(
+        'counter', 'Diagnosis result cache hits.', (), None),
+    'medicino_diagnosis_cache_misses_total': Metric(
+        'counter', 'Diagnosis result cache misses.', (), None),
+    'medicino_diagnosis_cache_evictions_total': Metric(
+        'counter', 'Diagnosis results evicted from the cache.', (), None),
+    'medicino_diagnosis_cache_hit_ratio': Metric(
+        'gauge', 'Diagnosis cache hits over lookups, across all workers.', (), None),
+    'medicino_history_queue_depth': Metric(
+        'gauge', 'Diagnosis history rows waiting in the write-behind queue.', ('worker',), None),
+    'medicino_worker_info': Metric(
+        'gauge', 'Worker process identity; always 1.', ('worker', 'parent', 'server'), None),
+    'medicino_worker_start_time_seconds': Metric(
+        'gauge', 'Unix time the worker started recording metrics.', ('worker',), None),
+}
+
+USED = struct.Struct('<Q')
+KEY_LENGTH = struct.Struct('<I')
+VALUE = struct.Struct('<d')
+
+
+def _align(offset: int) -> int:
+    return (offset + 7) & ~7
+
+
+def _read_entries(data, used: int) -> Iterator[Tuple[str, int, float]]:
+    """Yield ``(key, value offset, value)`` for each entry of a values file."""
+    position = USED.size
+    while position < used:
+        length = KEY_LENGTH.unpack_from(data, position)[0]
+        key = bytes(data[position + KEY_LENGTH.size:position + KEY_LENGTH.size + length]).decode('utf-8')
+        value_position = _align(position + KEY_LENGTH.size + length)
+        if value_position + VALUE.size > used:
+            break
+        yield key, value_position, VALUE.unpack_from(data, value_position)[0]
+        position = value_position + VALUE.size
+
+
+class DictValues:
+    """Values kept in process memory, for a single-process server."""
+
+    def __init__(self):
+        self._values: Dict[str, float] = {}
+
+    def add(self, key: str, amount: float):
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def set(self, key: str, value: float):
+        self._values[key] = value
+
+    def items(self) -> Iterator[Tuple[str, float]]:
+        return iter(list(self._values.items()))
+
+
+class MmapValues:
+    """Values in a memory-mapped file written by one process and read by any.
+
+    The file starts with the number of bytes in use, followed by entries of a
+    key length, the UTF-8 key padded to 8 bytes and a double. Entries are only
+    appended and ``used`` is updated last, so readers never see a partial key.
+    """
+
+    INITIAL_SIZE = 64 * 1024
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        self._size = max(os.fstat(self._fd).st_size, self.INITIAL_SIZE)
+        os.ftruncate(self._fd, self._size)
+        self._map = mmap.mmap(self._fd, self._size)
+        # A file left by an earlier process with the same ID is continued
+        self._used = USED.unpack_from(self._map, 0)[0] or USED.size
+        self._positions = {key: position for key, position, _ in _read_entries(self._map, self._used)}
+
+    def _position(self, key: str) -> int:
+        position = self._positions.get(key)
+        if position is not None:
+            return position
+
+        encoded = key.encode('utf-8')
+        position = _align(self._used + KEY_LENGTH.size + len(encoded))
+        end = position + VALUE.size
+        if end > self._size:
+            while end > self._size:
+                self._size *= 2
+            os.ftruncate(self._fd, self._size)
+            self._map.close()
+            self._map = mmap.mmap(self._fd, self._size)
+
+        KEY_LENGTH.pack_into(self._map, self._used, len(encoded))
+        self._map[self._used + KEY_LENGTH.size:self._used + KEY_LENGTH.size + len(encoded)] = encoded
+        VALUE.pack_into(self._map, position, 0.0)
+        self._used = end
+        USED.pack_into(self._map, 0, self._used)
+        self._positions[key] = position
+        return position
+
+    def add(self, key: str, amount: float):
+        position = self._position(key)
+        VALUE.pack_into(self._map, position, VALUE.unpack_from(self._map, position)[0] + amount)
+
+    def set(self, key: str, value: float):
+        VALUE.pack_into(self._map, self._position(key), value)
+
+    def items(self) -> Iterator[Tuple[str, float]]:
+        return ((key, value) for key, _, value in _read_entries(self._map, self._used))
+
+    @staticmethod
+    def read(path: str) -> Iterator[Tuple[str, float]]:
+        """Read another process's file without mapping it."""
+        with open(path, 'rb') as f:
+            data = f.read()
+        if len(data) < USED.size:
+            return iter(())
+        used = min(USED.unpack_from(data, 0)[0], len(data))
+        return ((key, value) for key, _, value in _read_entries(data, used))
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _sample_key(name: str, label_names: Sequence[str], label_values: Sequence, extra=()) -> str:
+    labels = [[label, str(value)] for label, value in zip(label_names, label_values)]
+    return json.dumps([name, labels + [list(pair) for pair in extra]])
+
+
+class MetricsRegistry:
+    """Records the metrics in ``METRICS`` for this process.
+
+    Without ``directory`` values stay in memory and only this process is
+    reported. With it, each process writes ``counter_<pid>.db`` and
+    ``gauge_<pid>.db`` there; counters and histograms of every file are summed
+    and gauges are reported for workers that are still running. Empty the
+    directory whenever the server is restarted.
+    """
+
+    def __init__(self, directory: Optional[str] = None):
+        self.directory = directory
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._pid = None
+        self._values: Dict[str, object] = {}
+        self.started_at = time.time()
+
+    def _values_for(self, kind: str):
+        """Values of ``kind`` ('counter' or 'gauge') for this process; call with the lock held."""
+        pid = os.getpid()
+        if pid != self._pid:
+            # Forked workers start their own files
+            self._pid = pid
+            self._values = {}
+            self.started_at = time.time()
+        values = self._values.get(kind)
+        if values is None:
+            if self.directory:
+                values = MmapValues(os.path.join(self.directory, f'{kind}_{pid}.db'))
+            else:
+                values = DictValues()
+            self._values[kind] = values
+        return values
+
+    def inc(self, name: str, labels: Sequence = (), amount: float = 1.0):
+        """Add ``amount`` to a counter."""
+        key = _sample_key(name, METRICS[name].labels, labels)
+        with self._lock:
+            self._values_for('counter').add(key, amount)
+
+    def set_total(self, name: str, labels: Sequence = (), value: float = 0.0):
+        """Set this process's running total of a counter kept elsewhere, e.g. by a cache."""
+        key = _sample_key(name, METRICS[name].labels, labels)
+        with self._lock:
+            self._values_for('counter').set(key, value)
+
+    def set_gauge(self, name: str, labels: Sequence = (), value: float = 0.0):
+        """Set this worker's value of a gauge; the worker label is added here."""
+        key = _sample_key(name, METRICS[name].labels, (os.getpid(),) + tuple(labels))
+        with self._lock:
+            self._values_for('gauge').set(key, value)
+
+    def observe(self, name: str, labels: Sequence, value: float):
+        """Count ``value`` in a histogram."""
+        metric = METRICS[name]
+        bound = next((bound for bound in metric.buckets if value <= bound), None)
+        le = '+Inf' if bound is None else repr(bound)
+        bucket = _sample_key(f'{name}_bucket', metric.labels, labels, [('le', le)])
+        total = _sample_key(f'{name}_sum', metric.labels, labels)
+        count = _sample_key(f'{name}_count', metric.labels, labels)
+        with self._lock:
+            values = self._values_for('counter')
+            values.add(bucket, 1.0)
+            values.add(total, value)
+            values.add(count, 1.0)
+
+    def collect(self) -> Dict[str, float]:
+        """Every sample key with its value summed over the processes reporting it."""
+        samples: Dict[str, float] = {}
+        with self._lock:
+            own = {kind: list(self._values_for(kind).items()) for kind in ('counter', 'gauge')}
+            pid = self._pid
+
+        if not self.directory:
+            for entries in own.values():
+                for key, value in entries:
+                    samples[key] = samples.get(key, 0.0) + value
+            return samples
+
+        for path in glob.glob(os.path.join(self.directory, '*_*.db')):
+            kind, _, file_pid = os.path.basename(path)[:-3].partition('_')
+            if kind not in ('counter', 'gauge') or not file_pid.isdigit():
+                continue
+            if int(file_pid) == pid:
+                entries = own[kind]
+            elif kind == 'gauge' and not _pid_alive(int(file_pid)):
+                continue
+            else:
+                entries = MmapValues.read(path)
+            for key, value in entries:
+                samples[key] = samples.get(key, 0.0) + value
+        return samples
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        by_metric: Dict[str, list] = {}
+        for key, value in self.collect().items():
+            sample, labels = json.loads(key)
+            name = sample
+            for suffix in ('_bucket', '_sum', '_count'):
+                if sample.endswith(suffix) and sample[:-len(suffix)] in METRICS:
+                    name = sample[:-len(suffix)]
+            by_metric.setdefault(name, []).append((sample, labels, value))
+
+        hits = sum(value for _, _, value in by_metric.get('medicino_diagnosis_cache_hits_total', []))
+        misses = sum(value for _, _, value in by_metric.get('medicino_diagnosis_cache_misses_total', []))
+        if hits + misses:
+            by_metric['medicino_diagnosis_cache_hit_ratio'] = [
+                ('medicino_diagnosis_cache_hit_ratio', [], hits / (hits + misses))
+            ]
+
+        lines = []
+        for name, metric in METRICS.items():
+            samples = by_metric.get(name)
+            if not samples:
+                continue
+            lines.append(f'# HELP {name} {metric.help}')
+            lines.append(f'# TYPE {name} {metric.kind}')
+            if metric.kind == 'histogram':
+                lines.extend(_histogram_lines(name, metric, samples))
+            else:
+                for sample, labels, value in sorted(samples, key=lambda item: item[1]):
+                    lines.append(_sample_line(sample, labels, value))
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value))
+
+
+def _sample_line(sample: str, labels, value: float) -> str:
+    if not labels:
+        return f'{sample} {_format_value(value)}'
+    label_text = ','.join(f'{label}="{_escape(str(text))}"' for label, text in labels)
+    return f'{sample}{{{label_text}}} {_format_value(value)}'
+
+
+def _histogram_lines(name: str, metric: Metric, samples) -> Iterator[str]:
+    """Cumulative buckets, sum and count for each label set of a histogram."""
+    series: Dict[tuple, Dict] = {}
+    for sample, labels, value in samples:
+        le = next((text for label, text in labels if label == 'le'), None)
+        key = tuple(tuple(pair) for pair in labels if pair[0] != 'le')
+        entry = series.setdefault(key, {'buckets': {}, 'sum': 0.0, 'count': 0.0})
+        if sample.endswith('_bucket'):
+            entry['buckets'][le] = entry['buckets'].get(le, 0.0) + value
+        elif sample.endswith('_sum'):
+            entry['sum'] += value
+        else:
+            entry['count'] += value
+
+    for key in sorted(series):
+        entry = series[key]
+        labels = [list(pair) for pair in key]
+        cumulative = 0.0
+        for bound in [repr(bound) for bound in metric.buckets] + ['+Inf']:
+            cumulative += entry['buckets'].get(bound, 0.0)
+            yield _sample_line(f'{name}_bucket', labels + [['le', bound]], cumulative)
+        yield _sample_line(f'{name}_sum', labels, entry['sum'])
+        yield _sample_line(f'{name}_count', labels, entry['count'])
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that reports how long each checkout waited for a connection."""
+
+    observe_wait = None
+
+    def _do_get(self):
+        if self.observe_wait is None:
+            return super()._do_get()
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            self.observe_wait(time.perf_counter() - started)
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.observe_wait = self.observe_wait
+        return pool
+
+
+_registries: Dict[str, MetricsRegistry] = {}
+_registries_lock = threading.Lock()
+
+
+def get_registry(directory: Optional[str] = None) -> MetricsRegistry:
+    """Get the registry for ``directory``, shared so a process has one writer per file."""
+    if not directory:
+        return MetricsRegistry()
+    directory = os.path.abspath(directory)
+    with _registries_lock:
+        registry = _registries.get(directory)
+        if registry is None:
+            registry = _registries[directory] = MetricsRegistry(directory)
+        return registry
+
+
+def time_pool_checkouts(app):
+    """Use a pool that times checkouts for the app's engine; call before ``db.init_app``.
+
+    In-memory SQLite keeps its single static connection and reports no waits.
+    """
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', {}).setdefault('poolclass', TimedQueuePool)
+
+
+def publish_worker_metrics(app, registry: MetricsRegistry, server: str):
+    """Copy this worker's identity, cache counters and write-queue depth into the registry."""
+    registry.set_gauge('medicino_worker_info', (os.getppid(), server), 1)
+    registry.set_gauge('medicino_worker_start_time_seconds', (), registry.started_at)
+
+    cache = app.extensions.get('diagnosis_cache')
+    if cache is not None:
+        registry.set_total('medicino_diagnosis_cache_hits_total', (), cache.hits)
+        registry.set_total('medicino_diagnosis_cache_misses_total', (), cache.misses)
+        registry.set_total('medicino_diagnosis_cache_evictions_total', (), cache.evictions)
+
+    writer = app.extensions.get('history_writer')
+    if writer is not None:
+        registry.set_gauge('medicino_history_queue_depth', (), writer.depth)
+
+
+def init_prometheus_metrics(app, engine):
+    """Record request, scoring and pool metrics for ``app`` and serve them at ``/metrics``."""
+    registry = app.extensions['metrics_registry'] = get_registry(app.config.get('METRICS_DIR'))
+    app.extensions['diagnosis_score_observer'] = (
+        lambda scorer, seconds: registry.observe('medicino_diagnosis_scoring_seconds', (scorer,), seconds)
+    )
+    if isinstance(engine.pool, TimedQueuePool):
+        engine.pool.observe_wait = (
+            lambda seconds: registry.observe('medicino_db_pool_checkout_wait_seconds', (), seconds)
+        )
+
+    @app.before_request
+    def start_metrics_timer():
+        g.metrics_started = time.perf_counter()
+
+    @app.after_request
+    def record_request_metrics(response):
+        started = g.get('metrics_started')
+        if started is None:
+            return response
+        route = request.url_rule.rule if request.url_rule is not None else UNMATCHED_ROUTE
+        blueprint = request.blueprint or ''
+        registry.observe('medicino_http_request_duration_seconds', (blueprint, route, request.method),
+                         time.perf_counter() - started)
+        registry.inc('medicino_http_requests_total', (blueprint, route, request.method, response.status_code))
+
+        # Query and row counts from the request metrics, when they are enabled
+        stats = g.get('request_stats')
+        if stats is not None:
+            registry.inc('medicino_db_queries_total', (blueprint, route), stats.queries)
+            registry.inc('medicino_db_rows_fetched_total', (blueprint, route), stats.rows)
+
+        publish_worker_metrics(app, registry, request.environ.get('SERVER_SOFTWARE', 'unknown'))
+        return response
+
+    def metrics():
+        """Prometheus scrape endpoint."""
+        publish_worker_metrics(app, registry, request.environ.get('SERVER_SOFTWARE', 'unknown'))
+        return Response(registry.render(), content_type=CONTENT_TYPE)
+
+    app.add_url_rule('/metrics', 'metrics', metrics, methods=['GET'])
+    return registry
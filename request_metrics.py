@@ -0,0 +1,193 @@
+"""
+Request metrics for Medicino.
+Records wall time, database time, query count and rows fetched for every
+request, reports them in a ``Server-Timing`` header and aggregates them per
+endpoint.
+"""
+
+import sqlite3
+import threading
+import time
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+from flask import g, request
+from sqlalchemy import event
+
+UNMATCHED_ENDPOINT = '<unmatched>'
+
+
+class RequestStats:
+    """Counters for one request; database time includes fetching rows."""
+
+    __slots__ = ('started', 'db_time', 'queries', 'rows')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.db_time = 0.0
+        self.queries = 0
+        self.rows = 0
+
+    def server_timing(self, wall_time: float) -> str:
+        """Format the counters as a ``Server-Timing`` header value."""
+        return (f'app;dur={wall_time * 1000:.2f}, '
+                f'db;dur={self.db_time * 1000:.2f};desc="{self.queries} queries, {self.rows} rows"')
+
+
+# Stats of the request being handled in the current thread (or context), if any
+_current_stats: ContextVar[Optional[RequestStats]] = ContextVar('medicino_request_stats', default=None)
+
+
+class CountingCursor(sqlite3.Cursor):
+    """SQLite cursor that charges fetched rows and fetch time to the current request."""
+
+    def fetchone(self):
+        stats = _current_stats.get()
+        if stats is None:
+            return super().fetchone()
+        started = time.perf_counter()
+        row = super().fetchone()
+        stats.db_time += time.perf_counter() - started
+        if row is not None:
+            stats.rows += 1
+        return row
+
+    def fetchmany(self, size=None):
+        stats = _current_stats.get()
+        if stats is None:
+            return super().fetchmany(self.arraysize if size is None else size)
+        started = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        stats.db_time += time.perf_counter() - started
+        stats.rows += len(rows)
+        return rows
+
+    def fetchall(self):
+        stats = _current_stats.get()
+        if stats is None:
+            return super().fetchall()
+        started = time.perf_counter()
+        rows = super().fetchall()
+        stats.db_time += time.perf_counter() - started
+        stats.rows += len(rows)
+        return rows
+
+
+class CountingConnection(sqlite3.Connection):
+    """SQLite connection whose cursors count fetched rows (``sqlite3.connect(factory=...)``)."""
+
+    def cursor(self, factory=CountingCursor):
+        return super().cursor(factory)
+
+
+class RequestMetrics:
+    """Thread-safe per-endpoint totals of request timings and database work."""
+
+    def __init__(self):
+        self._endpoints: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+    def record(self, endpoint: str, status_code: int, wall_time: float, stats: RequestStats):
+        """Add one finished request to its endpoint's totals."""
+        with self._lock:
+            totals = self._endpoints.get(endpoint)
+            if totals is None:
+                totals = self._endpoints[endpoint] = {
+                    'requests': 0, 'errors': 0, 'wall_time': 0.0, 'max_wall_time': 0.0,
+                    'db_time': 0.0, 'queries': 0, 'rows': 0
+                }
+            totals['requests'] += 1
+            if status_code >= 500:
+                totals['errors'] += 1
+            totals['wall_time'] += wall_time
+            totals['max_wall_time'] = max(totals['max_wall_time'], wall_time)
+            totals['db_time'] += stats.db_time
+            totals['queries'] += stats.queries
+            totals['rows'] += stats.rows
+
+    def totals(self) -> Dict[str, Dict]:
+        """Copy of the raw totals per endpoint (times in seconds)."""
+        with self._lock:
+            return {endpoint: dict(totals) for endpoint, totals in self._endpoints.items()}
+
+    def summary(self) -> Dict[str, Dict]:
+        """Per-endpoint request counts with mean and max timings in milliseconds."""
+        summary = {}
+        for endpoint, totals in sorted(self.totals().items()):
+            requests = totals['requests']
+            summary[endpoint] = {
+                'requests': requests,
+                'errors': totals['errors'],
+                'mean_ms': round(totals['wall_time'] / requests * 1000, 3),
+                'max_ms': round(totals['max_wall_time'] * 1000, 3),
+                'db_mean_ms': round(totals['db_time'] / requests * 1000, 3),
+                'db_share': round(totals['db_time'] / totals['wall_time'], 3) if totals['wall_time'] else 0.0,
+                'queries_per_request': round(totals['queries'] / requests, 2),
+                'rows_per_request': round(totals['rows'] / requests, 2)
+            }
+        return summary
+
+    def reset(self):
+        """Forget every endpoint's totals."""
+        with self._lock:
+            self._endpoints.clear()
+
+
+def count_fetched_rows(app):
+    """Make the app's SQLite connections count fetched rows; call before ``db.init_app``.
+
+    Other databases still get query counts and execute time, but report no rows.
+    """
+    if not app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
+        return
+    engine_options = app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', {})
+    engine_options.setdefault('connect_args', {}).setdefault('factory', CountingConnection)
+
+
+def install_query_listeners(engine):
+    """Charge every statement the engine executes to the current request."""
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def start_query_timer(conn, cursor, statement, parameters, context, executemany):
+        if _current_stats.get() is not None:
+            conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def stop_query_timer(conn, cursor, statement, parameters, context, executemany):
+        stats = _current_stats.get()
+        started = conn.info.get('query_started')
+        if stats is None or not started:
+            return
+        stats.db_time += time.perf_counter() - started.pop()
+        stats.queries += 1
+
+
+def init_request_metrics(app, engine):
+    """Time every request of ``app`` and aggregate the results per endpoint."""
+    metrics = app.extensions['request_metrics'] = RequestMetrics()
+    install_query_listeners(engine)
+
+    @app.before_request
+    def start_request_timer():
+        stats = RequestStats()
+        g.request_stats = stats
+        g.request_stats_token = _current_stats.set(stats)
+
+    @app.after_request
+    def record_request_timing(response):
+        stats = g.get('request_stats')
+        if stats is None:
+            return response
+        wall_time = time.perf_counter() - stats.started
+        if app.config.get('SERVER_TIMING_HEADER'):
+            response.headers['Server-Timing'] = stats.server_timing(wall_time)
+        metrics.record(request.endpoint or UNMATCHED_ENDPOINT, response.status_code, wall_time, stats)
+        return response
+
+    @app.teardown_request
+    def stop_request_timer(exc=None):
+        token = g.pop('request_stats_token', None)
+        if token is not None:
+            _current_stats.reset(token)
+
+    return metrics
@@ -3,7 +3,7 @@ API routes for Medicino application.
 RESTful API endpoints for diagnosis, medicines, and user data.
 """
 
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, request, jsonify, current_app, Response, stream_with_context
 from flask_login import login_required, current_user
 from functools import wraps
 import logging
@@ -11,9 +11,10 @@ from datetime import datetime
 
 from services import (
     DiagnosisService, MedicineService, ConditionService, 
-    UserService, ValidationService
+    UserService, ValidationService, SuggestionService
 )
 from models import db
+from config import read_sqlite_pragmas
 
 api_bp = Blueprint('api', __name__)
 
@@ -34,6 +35,32 @@ def api_success_response(data=None, message="Success", status_code=200):
         response['data'] = data
     return jsonify(response), status_code
 
+def get_pagination_args():
+    """Read page, per_page, cursor and with_total query parameters within configured limits.
+    
+    The total is counted for the first page, or for any page with ``with_total=true``.
+    """
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = request.args.get('per_page', current_app.config['ITEMS_PER_PAGE'], type=int)
+    
+    # Limit per_page to prevent abuse
+    per_page = max(min(per_page, current_app.config['MAX_ITEMS_PER_PAGE']), 1)
+    
+    cursor = request.args.get('cursor', '').strip() or None
+    with_total = True if request.args.get('with_total', 'false').lower() == 'true' else None
+    return page, per_page, cursor, with_total
+
+def paginated_data(key, result):
+    """Serialize a service Page into the API response payload."""
+    return {
+        key: [item.to_dict() for item in result.items],
+        'page': result.page,
+        'per_page': result.per_page,
+        'pages': result.pages,
+        'total': result.total,
+        'next_cursor': result.next_cursor
+    }
+
 def validate_json_request(f):
     """Decorator to validate JSON request data."""
     @wraps(f)
@@ -43,6 +70,15 @@ def validate_json_request(f):
         return f(*args, **kwargs)
     return decorated_function
 
+def admin_required(f):
+    """Decorator restricting an endpoint to admin users."""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if not current_user.is_authenticated or not current_user.is_admin:
+            return api_error_response("Admin access required", 403)
+        return f(*args, **kwargs)
+    return decorated_function
+
 # Diagnosis API endpoints
 @api_bp.route('/diagnose', methods=['POST'])
 @login_required
@@ -59,11 +95,18 @@ def diagnose():
         if not symptoms:
             return api_error_response("Symptoms cannot be empty", 400)
         
+        # Scoring strategy: per request, or the configured default
+        scorer = data.get('scorer') or DiagnosisService.get_default_scorer()
+        if scorer not in DiagnosisService.get_scorer_names():
+            return api_error_response(
+                f"Unknown scorer. Choose from: {', '.join(DiagnosisService.get_scorer_names())}", 400
+            )
+        
         # Sanitize input
         symptoms = ValidationService.sanitize_input(symptoms)
         
         # Perform diagnosis
-        diagnosis_result = DiagnosisService.diagnose_symptoms(symptoms)
+        diagnosis_result = DiagnosisService.diagnose_symptoms(symptoms, scorer=scorer)
         
         # Save to history
         diagnosis_record = DiagnosisService.save_diagnosis(
@@ -72,8 +115,9 @@ def diagnose():
             diagnosis_result=diagnosis_result
         )
         
-        # Add diagnosis ID to response
+        # Add diagnosis ID and scorer to response
         diagnosis_result['diagnosis_id'] = diagnosis_record.id
+        diagnosis_result['scorer'] = scorer
         
         return api_success_response(
             data=diagnosis_result,
@@ -84,36 +128,84 @@ def diagnose():
         current_app.logger.error(f"Diagnosis error: {str(e)}")
         return api_error_response("An error occurred during diagnosis", 500)
 
-@api_bp.route('/diagnose/history', methods=['GET'])
+@api_bp.route('/diagnose/batch', methods=['POST'])
 @login_required
-def get_diagnosis_history():
-    """Get user's diagnosis history."""
+@validate_json_request
+def diagnose_batch():
+    """Diagnose a list of symptom strings in one request."""
     try:
-        page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 20, type=int)
+        data = request.get_json()
+        
+        if not data or 'symptoms' not in data:
+            return api_error_response("Symptoms are required", 400)
         
-        # Limit per_page to prevent abuse
-        per_page = min(per_page, 100)
+        symptom_texts = data['symptoms']
+        if not isinstance(symptom_texts, list) or not symptom_texts:
+            return api_error_response("Symptoms must be a non-empty list", 400)
         
-        # Get diagnosis history
-        history = DiagnosisService.get_user_diagnosis_history(
+        max_size = current_app.config['MAX_BATCH_DIAGNOSIS_SIZE']
+        if len(symptom_texts) > max_size:
+            return api_error_response(f"A batch can contain at most {max_size} symptom lists", 400)
+        
+        cleaned = []
+        for position, symptoms in enumerate(symptom_texts):
+            if not isinstance(symptoms, str) or not symptoms.strip():
+                return api_error_response(f"Symptoms at index {position} cannot be empty", 400)
+            cleaned.append(ValidationService.sanitize_input(symptoms.strip()))
+        
+        scorer = data.get('scorer') or DiagnosisService.get_default_scorer()
+        if scorer not in DiagnosisService.get_scorer_names():
+            return api_error_response(
+                f"Unknown scorer. Choose from: {', '.join(DiagnosisService.get_scorer_names())}", 400
+            )
+        
+        # Score everything against one catalog snapshot (sharded across the
+        # worker pool for large batches), then save in one insert
+        results = DiagnosisService.diagnose_batch(cleaned, scorer=scorer)
+        diagnosis_ids = DiagnosisService.save_diagnoses(
             user_id=current_user.id,
-            limit=per_page
+            diagnoses=list(zip(cleaned, results))
         )
         
-        # Convert to list of dictionaries
-        history_data = [record.to_dict() for record in history]
+        for diagnosis_result, diagnosis_id in zip(results, diagnosis_ids):
+            diagnosis_result['diagnosis_id'] = diagnosis_id
         
         return api_success_response(
             data={
-                'history': history_data,
-                'page': page,
-                'per_page': per_page,
-                'total': len(history_data)
+                'results': results,
+                'count': len(results)
             },
+            message="Batch diagnosis completed successfully"
+        )
+        
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Batch diagnosis error: {str(e)}")
+        return api_error_response("An error occurred during batch diagnosis", 500)
+
+@api_bp.route('/diagnose/history', methods=['GET'])
+@login_required
+def get_diagnosis_history():
+    """Get user's diagnosis history."""
+    try:
+        page, per_page, cursor, with_total = get_pagination_args()
+        
+        # Get one page of diagnosis history
+        history = DiagnosisService.get_user_diagnosis_history_page(
+            user_id=current_user.id,
+            page=page,
+            per_page=per_page,
+            cursor=cursor,
+            with_total=with_total
+        )
+        
+        return api_success_response(
+            data=paginated_data('history', history),
             message="Diagnosis history retrieved successfully"
         )
         
+    except ValueError as e:
+        return api_error_response(str(e), 400)
     except Exception as e:
         current_app.logger.error(f"Error retrieving diagnosis history: {str(e)}")
         return api_error_response("An error occurred while retrieving history", 500)
@@ -163,34 +255,25 @@ def get_medicines():
         # Get query parameters
         search = request.args.get('search', '').strip()
         category = request.args.get('category', '').strip()
-        page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 20, type=int)
-        
-        # Limit per_page to prevent abuse
-        per_page = min(per_page, 100)
-        
-        # Get medicines based on filters
-        if search or category:
-            medicines = MedicineService.search_medicines(
-                query=search,
-                category=category
-            )
-        else:
-            medicines = MedicineService.get_all_medicines()
-        
-        # Convert to list of dictionaries
-        medicines_data = [medicine.to_dict() for medicine in medicines]
+        page, per_page, cursor, with_total = get_pagination_args()
+        
+        # Filtering, ordering and paging all happen in SQL
+        medicines = MedicineService.get_medicines_page(
+            query=search,
+            category=category,
+            page=page,
+            per_page=per_page,
+            cursor=cursor,
+            with_total=with_total
+        )
         
         return api_success_response(
-            data={
-                'medicines': medicines_data,
-                'page': page,
-                'per_page': per_page,
-                'total': len(medicines_data)
-            },
+            data=paginated_data('medicines', medicines),
             message="Medicines retrieved successfully"
         )
         
+    except ValueError as e:
+        return api_error_response(str(e), 400)
     except Exception as e:
         current_app.logger.error(f"Error retrieving medicines: {str(e)}")
         return api_error_response("An error occurred while retrieving medicines", 500)
@@ -257,34 +340,25 @@ def get_conditions():
         # Get query parameters
         search = request.args.get('search', '').strip()
         category = request.args.get('category', '').strip()
-        page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 20, type=int)
-        
-        # Limit per_page to prevent abuse
-        per_page = min(per_page, 100)
-        
-        # Get conditions based on filters
-        if search or category:
-            conditions = ConditionService.search_conditions(
-                query=search,
-                category=category
-            )
-        else:
-            conditions = ConditionService.get_all_conditions()
-        
-        # Convert to list of dictionaries
-        conditions_data = [condition.to_dict() for condition in conditions]
+        page, per_page, cursor, with_total = get_pagination_args()
+        
+        # Filtering, ordering and paging all happen in SQL
+        conditions = ConditionService.get_conditions_page(
+            query=search,
+            category=category,
+            page=page,
+            per_page=per_page,
+            cursor=cursor,
+            with_total=with_total
+        )
         
         return api_success_response(
-            data={
-                'conditions': conditions_data,
-                'page': page,
-                'per_page': per_page,
-                'total': len(conditions_data)
-            },
+            data=paginated_data('conditions', conditions),
             message="Conditions retrieved successfully"
         )
         
+    except ValueError as e:
+        return api_error_response(str(e), 400)
     except Exception as e:
         current_app.logger.error(f"Error retrieving conditions: {str(e)}")
         return api_error_response("An error occurred while retrieving conditions", 500)
@@ -322,6 +396,37 @@ def get_condition_categories():
         current_app.logger.error(f"Error retrieving condition categories: {str(e)}")
         return api_error_response("An error occurred while retrieving categories", 500)
 
+# Typeahead endpoint
+@api_bp.route('/suggest', methods=['GET'])
+def suggest():
+    """Autocomplete symptoms, medicines or conditions from an in-memory prefix index."""
+    try:
+        kind = request.args.get('kind', 'symptom').strip().lower()
+        prefix = request.args.get('prefix', '')
+        limit = request.args.get('limit', current_app.config['SUGGEST_DEFAULT_LIMIT'], type=int)
+        
+        suggestions = SuggestionService.suggest(
+            kind=kind,
+            prefix=prefix,
+            limit=limit,
+            max_age=current_app.config['CATALOG_RECHECK_SECONDS']
+        )
+        
+        return api_success_response(
+            data={
+                'kind': kind,
+                'prefix': prefix,
+                'suggestions': suggestions
+            },
+            message=f"Found {len(suggestions)} suggestions"
+        )
+        
+    except ValueError as e:
+        return api_error_response(str(e), 400)
+    except Exception as e:
+        current_app.logger.error(f"Error retrieving suggestions: {str(e)}")
+        return api_error_response("An error occurred while retrieving suggestions", 500)
+
 # User API endpoints
 @api_bp.route('/user/profile', methods=['GET'])
 @login_required
@@ -370,20 +475,66 @@ def update_user_profile():
         current_app.logger.error(f"Error updating user profile: {str(e)}")
         return api_error_response("An error occurred while updating profile", 500)
 
+# Admin API endpoints
+@api_bp.route('/admin/export/diagnosis-history', methods=['GET'])
+@login_required
+@admin_required
+def export_diagnosis_history():
+    """Stream the full diagnosis history as NDJSON (default) or CSV."""
+    export_format = request.args.get('format', 'ndjson').strip().lower()
+    if export_format not in ('ndjson', 'csv'):
+        return api_error_response("Export format must be 'ndjson' or 'csv'", 400)
+    
+    mimetype = 'application/x-ndjson' if export_format == 'ndjson' else 'text/csv'
+    filename = f"diagnosis_history_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.{export_format}"
+    
+    return Response(
+        stream_with_context(DiagnosisService.export_diagnosis_history(export_format)),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
+
+@api_bp.route('/admin/request-metrics', methods=['GET'])
+@login_required
+@admin_required
+def get_request_metrics():
+    """Per-endpoint request timings and database work for this process."""
+    metrics = current_app.extensions.get('request_metrics')
+    if metrics is None:
+        return api_error_response("Request metrics are disabled", 404)
+    
+    summary = metrics.summary()
+    if request.args.get('reset', 'false').lower() == 'true':
+        metrics.reset()
+    
+    return api_success_response(data={'endpoints': summary})
+
 # Health check endpoint
 @api_bp.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint for monitoring."""
     try:
         # Basic health check
-        db.session.execute('SELECT 1')
+        db.session.execute(db.text('SELECT 1'))
+        
+        data = {
+            'status': 'healthy',
+            'database': 'connected',
+            'timestamp': str(datetime.utcnow())
+        }
+        
+        # Report the SQLite settings actually in effect on this connection
+        if db.engine.dialect.name == 'sqlite':
+            data['sqlite'] = read_sqlite_pragmas(
+                db.session.connection(), current_app.config.get('SQLITE_PRAGMAS', {})
+            )
+        
+        cache = DiagnosisService.get_result_cache()
+        if cache is not None:
+            data['diagnosis_cache'] = cache.stats()
         
         return api_success_response(
-            data={
-                'status': 'healthy',
-                'database': 'connected',
-                'timestamp': str(datetime.utcnow())
-            },
+            data=data,
             message="Service is healthy"
         )
         
@@ -401,7 +552,8 @@ def api_docs():
         'description': 'RESTful API for Medicino medical assistant application',
         'endpoints': {
             'diagnosis': {
-                'POST /api/diagnose': 'Diagnose symptoms',
+                'POST /api/diagnose': 'Diagnose symptoms (optional scorer: substring, jaccard, idf, matrix)',
+                'POST /api/diagnose/batch': 'Diagnose a list of symptom strings',
                 'GET /api/diagnose/history': 'Get diagnosis history',
                 'POST /api/diagnose/{id}/feedback': 'Update diagnosis feedback'
             },
@@ -416,10 +568,17 @@ def api_docs():
                 'GET /api/conditions/{id}': 'Get specific condition',
                 'GET /api/conditions/categories': 'Get condition categories'
             },
+            'suggest': {
+                'GET /api/suggest?kind=symptom|medicine|condition&prefix=': 'Typeahead suggestions'
+            },
             'user': {
                 'GET /api/user/profile': 'Get user profile',
                 'PUT /api/user/profile': 'Update user profile'
             },
+            'admin': {
+                'GET /api/admin/export/diagnosis-history': 'Stream diagnosis history as NDJSON or CSV',
+                'GET /api/admin/request-metrics': 'Per-endpoint request timings, query and row counts'
+            },
             'system': {
                 'GET /api/health': 'Health check',
                 'GET /api/docs': 'API documentation'
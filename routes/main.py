@@ -50,8 +50,8 @@ def medicines():
 def conditions():
     """Medical conditions page."""
     try:
-        # Get conditions for display
-        conditions_list = ConditionService.get_all_conditions()
+        # Get conditions for display from the shared catalog snapshot
+        conditions_list = ConditionService.get_catalog_snapshot().conditions
         categories = ConditionService.get_condition_categories()
         
         return render_template('conditions.html', 
@@ -134,18 +134,8 @@ def search():
 def symptoms():
     """Symptoms reference page."""
     try:
-        # Get all conditions to extract symptoms
-        conditions = ConditionService.get_all_conditions()
-        
-        # Extract unique symptoms
-        all_symptoms = set()
-        for condition in conditions:
-            if condition.symptoms:
-                symptoms_list = [s.strip().lower() for s in condition.symptoms.split(',')]
-                all_symptoms.update(symptoms_list)
-        
-        # Sort symptoms alphabetically
-        symptoms_list = sorted(list(all_symptoms))
+        # Unique symptoms are precomputed on the catalog snapshot
+        symptoms_list = list(ConditionService.get_catalog_snapshot().symptoms)
         
         return render_template('symptoms.html', symptoms=symptoms_list)
     except Exception as e:
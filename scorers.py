@@ -0,0 +1,139 @@
+"""
+Diagnosis scoring strategies for Medicino.
+Registry of interchangeable scorers ranking catalog conditions against the
+input symptoms; every score is between 0 and 1.
+"""
+
+import logging
+import math
+from typing import Dict, List, Sequence, Tuple
+
+from catalog import CatalogSnapshot
+from symptom_index import SymptomIndex
+
+logger = logging.getLogger(__name__)
+
+Ranking = Tuple[List[Tuple[int, float]], int]
+
+
+def input_hits(index: SymptomIndex, input_symptoms: Sequence[str]) -> Dict[int, int]:
+    """For every condition hit by an input, a bitmask of the inputs (by position) that hit it."""
+    hits: Dict[int, int] = {}
+    for bit, input_symptom in enumerate(input_symptoms):
+        flag = 1 << bit
+        for symptom in index.resolve(input_symptom):
+            for position, _offset in index.postings[symptom]:
+                hits[position] = hits.get(position, 0) | flag
+    return hits
+
+
+def top_ranked(scores: Dict[int, float], limit: int) -> Ranking:
+    """Highest scores first, catalog order within ties."""
+    ranked = sorted(scores.items(), key=lambda entry: (-entry[1], entry[0]))
+    return ranked[:limit], len(ranked)
+
+
+class Scorer:
+    """Ranks conditions; subclasses implement ``rank``."""
+
+    name = ''
+
+    def rank(self, catalog: CatalogSnapshot, input_symptoms: Sequence[str], limit: int) -> Ranking:
+        """Top ``limit`` ``(position, score)`` pairs and the number of conditions scoring above 0."""
+        raise NotImplementedError
+
+
+class SubstringScorer(Scorer):
+    """Share of input symptoms matched (the original matcher), via the symptom index."""
+
+    name = 'substring'
+
+    def rank(self, catalog, input_symptoms, limit):
+        ranked, total = catalog.symptom_index.rank(input_symptoms, limit)
+        return [(position, matches / len(input_symptoms)) for position, matches in ranked], total
+
+
+class MatrixScorer(SubstringScorer):
+    """Same scores as ``substring``, computed on the NumPy incidence matrix when available.
+
+    Without NumPy it falls back to the symptom index, with a warning logged
+    once per process.
+    """
+
+    name = 'matrix'
+    _warned = False
+
+    def rank(self, catalog, input_symptoms, limit):
+        matrix = catalog.incidence_matrix
+        if matrix is None:
+            if not MatrixScorer._warned:
+                MatrixScorer._warned = True
+                logger.warning("The 'matrix' scorer needs NumPy, which is not installed; "
+                               "scoring with the symptom index instead")
+            return super().rank(catalog, input_symptoms, limit)
+        ranked, total = matrix.rank(input_symptoms, limit)
+        return [(position, matches / len(input_symptoms)) for position, matches in ranked], total
+
+
+class JaccardScorer(Scorer):
+    """Jaccard similarity between the input symptoms and a condition's symptom set.
+
+    Matched inputs count as shared elements, so conditions listing many
+    symptoms the user did not mention score lower.
+    """
+
+    name = 'jaccard'
+
+    def rank(self, catalog, input_symptoms, limit):
+        index = catalog.symptom_index
+        input_masks = [index.input_mask(input_symptom) for input_symptom in input_symptoms]
+        scores = {}
+        for position in index.candidates(input_symptoms):
+            shared = index.count_matches(position, input_masks)
+            union = len(input_symptoms) + index.symptom_count(position) - shared
+            scores[position] = shared / max(union, shared)
+        return top_ranked(scores, limit)
+
+
+class IdfScorer(Scorer):
+    """Share of input symptoms matched, weighting each input by its rarity.
+
+    An input hitting few conditions (high inverse document frequency) is
+    worth more than one, like "fatigue", that nearly every condition lists.
+    """
+
+    name = 'idf'
+
+    def rank(self, catalog, input_symptoms, limit):
+        index = catalog.symptom_index
+        hits = input_hits(index, input_symptoms)
+
+        frequencies = [0] * len(input_symptoms)
+        for mask in hits.values():
+            for bit in range(len(input_symptoms)):
+                if mask >> bit & 1:
+                    frequencies[bit] += 1
+        conditions = len(index)
+        weights = [math.log((conditions + 1) / (frequency + 1)) + 1 for frequency in frequencies]
+        total_weight = sum(weights)
+
+        scores = {
+            position: sum(weight for bit, weight in enumerate(weights) if mask >> bit & 1) / total_weight
+            for position, mask in hits.items()
+        }
+        return top_ranked(scores, limit)
+
+
+SCORERS: Dict[str, Scorer] = {
+    scorer.name: scorer
+    for scorer in (SubstringScorer(), JaccardScorer(), IdfScorer(), MatrixScorer())
+}
+DEFAULT_SCORER = SubstringScorer.name
+
+
+def get_scorer(name: str) -> Scorer:
+    """Look up a scorer by name; raises ValueError for unknown names."""
+    scorer = SCORERS.get(name)
+    if scorer is None:
+        raise ValueError(f"Unknown scorer '{name}'. Choose from: {', '.join(SCORERS)}")
+    return scorer
@@ -0,0 +1,157 @@
+"""
+Full-text search for Medicino.
+SQLite FTS5 indexes over the medicine and condition catalogs, kept in sync by
+triggers and ranked with BM25.
+"""
+
+import re
+import time
+import weakref
+from typing import List, Optional, Sequence
+
+import sqlalchemy as sa
+
+# Words shorter than this are matched as plain terms, longer ones as prefixes
+PREFIX_MIN_LENGTH = 2
+# Seconds before a missing index is looked for again, e.g. after another process creates it
+MISSING_INDEX_RECHECK_SECONDS = 30
+
+
+def build_match_expression(text: str) -> Optional[str]:
+    """Turn free user input into a safe FTS5 prefix query.
+
+    Every word becomes a quoted prefix term and all terms must match, so
+    ``"para tab"`` finds "Paracetamol Tablet". Returns ``None`` when the input
+    has no searchable words.
+    """
+    words = re.findall(r'\w+', (text or '').lower())
+    if not words:
+        return None
+    return ' '.join(
+        f'"{word}"*' if len(word) >= PREFIX_MIN_LENGTH else f'"{word}"'
+        for word in words
+    )
+
+
+class FullTextIndex:
+    """External-content FTS5 index over selected columns of a catalog table."""
+
+    def __init__(self, content_table: str, columns: Sequence[str], weights: Sequence[float]):
+        self.content_table = content_table
+        self.columns = tuple(columns)
+        self.weights = tuple(weights)
+        self.name = f'{content_table}_fts'
+        self.table = sa.table(self.name, sa.column('rowid'), sa.column('rank'))
+        self._available = weakref.WeakKeyDictionary()
+
+    def create_statements(self) -> List[str]:
+        """DDL creating the index and the triggers that keep it in sync."""
+        column_list = ', '.join(self.columns)
+        new_values = ', '.join(f'new.{column}' for column in self.columns)
+        old_values = ', '.join(f'old.{column}' for column in self.columns)
+        weights = ', '.join(str(weight) for weight in self.weights)
+        return [
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {self.name} USING fts5("
+            f"{column_list}, content='{self.content_table}', content_rowid='id', "
+            f"tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+            f"CREATE TRIGGER IF NOT EXISTS {self.name}_ai AFTER INSERT ON {self.content_table} BEGIN "
+            f"INSERT INTO {self.name}(rowid, {column_list}) VALUES (new.id, {new_values}); END",
+            f"CREATE TRIGGER IF NOT EXISTS {self.name}_ad AFTER DELETE ON {self.content_table} BEGIN "
+            f"INSERT INTO {self.name}({self.name}, rowid, {column_list}) "
+            f"VALUES ('delete', old.id, {old_values}); END",
+            f"CREATE TRIGGER IF NOT EXISTS {self.name}_au AFTER UPDATE ON {self.content_table} BEGIN "
+            f"INSERT INTO {self.name}({self.name}, rowid, {column_list}) "
+            f"VALUES ('delete', old.id, {old_values}); "
+            f"INSERT INTO {self.name}(rowid, {column_list}) VALUES (new.id, {new_values}); END",
+            f"INSERT INTO {self.name}({self.name}, rank) VALUES ('rank', 'bm25({weights})')",
+            f"INSERT INTO {self.name}({self.name}) VALUES ('rebuild')",
+        ]
+
+    def drop_statements(self) -> List[str]:
+        """DDL removing the index and its triggers."""
+        return [f'DROP TRIGGER IF EXISTS {self.name}_{suffix}' for suffix in ('ai', 'ad', 'au')] + [
+            f'DROP TABLE IF EXISTS {self.name}'
+        ]
+
+    def create(self, connection):
+        """Create (or rebuild) the index on a SQLAlchemy connection."""
+        for statement in self.create_statements():
+            connection.exec_driver_sql(statement)
+        self._available.pop(connection.engine, None)
+
+    def drop(self, connection):
+        """Drop the index on a SQLAlchemy connection."""
+        for statement in self.drop_statements():
+            connection.exec_driver_sql(statement)
+        self._available.pop(connection.engine, None)
+
+    def is_available(self, engine) -> bool:
+        """Whether this index exists on the engine's database.
+
+        Cached per engine: an index once found is assumed to stay, while a
+        missing one on SQLite is looked for again after
+        ``MISSING_INDEX_RECHECK_SECONDS``.
+        """
+        cached = self._available.get(engine)
+        if cached is not None and (cached[1] is None or time.monotonic() < cached[1]):
+            return cached[0]
+        available = False
+        recheck_at = None
+        if engine.dialect.name == 'sqlite':
+            with engine.connect() as connection:
+                available = connection.execute(
+                    sa.text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                    {'name': self.name}
+                ).first() is not None
+            if not available:
+                recheck_at = time.monotonic() + MISSING_INDEX_RECHECK_SECONDS
+        self._available[engine] = (available, recheck_at)
+        return available
+
+    def match_clause(self, match_expression: str):
+        """WHERE clause restricting the index to rows matching an FTS5 query."""
+        return sa.text(f'{self.name} MATCH :fts_match').bindparams(fts_match=match_expression)
+
+    def matching_ids(self, match_expression: str):
+        """Subquery of content row ids matching an FTS5 query."""
+        return sa.select(self.table.c.rowid).where(self.match_clause(match_expression))
+
+
+MEDICINES_SEARCH = FullTextIndex(
+    'medicines', ['name', 'category', 'description'], weights=[10.0, 4.0, 1.0]
+)
+CONDITIONS_SEARCH = FullTextIndex(
+    'conditions', ['name', 'symptoms', 'description', 'category'], weights=[10.0, 5.0, 1.0, 2.0]
+)
+SEARCH_INDEXES = {
+    'medicines': MEDICINES_SEARCH,
+    'conditions': CONDITIONS_SEARCH,
+}
+
+
+def attach_search_indexes(metadata_tables):
+    """Create/drop each search index together with its content table."""
+    for table in metadata_tables:
+        index = SEARCH_INDEXES.get(table.name)
+        if index is None:
+            continue
+
+        def after_create(target, connection, index=index, **kw):
+            if connection.dialect.name == 'sqlite':
+                index.create(connection)
+
+        def before_drop(target, connection, index=index, **kw):
+            if connection.dialect.name == 'sqlite':
+                index.drop(connection)
+
+        sa.event.listen(table, 'after_create', after_create)
+        sa.event.listen(table, 'before_drop', before_drop)
+
+
+def ensure_search_indexes(engine):
+    """Create and rebuild every search index, e.g. for a database created before FTS."""
+    if engine.dialect.name != 'sqlite':
+        return
+    with engine.begin() as connection:
+        for index in SEARCH_INDEXES.values():
+            index.create(connection)
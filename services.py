@@ -4,12 +4,107 @@ Separates business logic from controllers for better maintainability.
 """
 
 import re
-from typing import List, Dict, Optional, Tuple
+import io
+import csv
+import json
+import base64
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
 from datetime import datetime
-from models import db, User, Medicine, Condition, DiagnosisHistory
+from flask import current_app, has_app_context
+from models import db, User, Medicine, Condition, DiagnosisHistory, CatalogVersion
+from catalog import CONDITIONS_CATALOG, MEDICINES_CATALOG, CatalogCache, CatalogSnapshot, ConditionRecord
+from compiled_catalog import CONDITIONS_SOURCE, CompiledCatalog, compile_catalog, open_compiled_catalog
+from diagnosis_engine import CatalogLoader, DiagnosisEngine
+from scorers import DEFAULT_SCORER, SCORERS
+from search_index import MEDICINES_SEARCH, CONDITIONS_SEARCH, build_match_expression
+from suggest import SuggestionIndex
+from result_cache import ResultCache
 from werkzeug.security import generate_password_hash, check_password_hash
 
 
+class Page(NamedTuple):
+    """One page of query results plus what a client needs to fetch the next one."""
+    items: List
+    total: Optional[int]
+    page: int
+    per_page: int
+    next_cursor: Optional[str]
+    
+    @property
+    def pages(self) -> Optional[int]:
+        """Total number of pages, or None when the total was not counted."""
+        if self.total is None:
+            return None
+        return (self.total + self.per_page - 1) // self.per_page if self.per_page else 0
+
+
+def encode_cursor(values: Sequence) -> str:
+    """Encode keyset values as an opaque, URL-safe cursor."""
+    payload = json.dumps([v.isoformat() if isinstance(v, datetime) else v for v in values])
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str, keyset: Sequence[Tuple]) -> List:
+    """Decode a cursor produced by encode_cursor for the given keyset."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+    
+    if not isinstance(values, list) or len(values) != len(keyset):
+        raise ValueError("Invalid cursor")
+    
+    decoded = []
+    for value, (column, _descending) in zip(values, keyset):
+        if isinstance(column.type, db.DateTime) and value is not None:
+            value = datetime.fromisoformat(value)
+        decoded.append(value)
+    return decoded
+
+
+def keyset_after(keyset: Sequence[Tuple], values: Sequence):
+    """Build the WHERE clause selecting rows that sort after ``values`` in ``keyset`` order."""
+    clauses = []
+    for position, (column, descending) in enumerate(keyset):
+        equal = [c == v for (c, _d), v in zip(keyset[:position], values[:position])]
+        beyond = column < values[position] if descending else column > values[position]
+        clauses.append(db.and_(*equal, beyond))
+    return db.or_(*clauses)
+
+
+def paginate_query(query, keyset: Sequence[Tuple], page: int = 1, per_page: int = 20,
+                   cursor: str = None, with_total: bool = None) -> Page:
+    """Paginate a query in SQL with LIMIT/OFFSET, or by keyset when a cursor is given.
+    
+    ``keyset`` is a sequence of ``(column, descending)`` pairs that uniquely
+    orders the rows; it must end with the primary key. Counting every
+    matching row costs a scan, so by default the total is only counted for
+    the first page; ``with_total`` forces it on or off.
+    """
+    page = max(page, 1)
+    if with_total is None:
+        with_total = cursor is None and page == 1
+    total = query.order_by(None).count() if with_total else None
+    
+    ordered = query.order_by(*[column.desc() if descending else column.asc()
+                               for column, descending in keyset])
+    
+    if cursor:
+        ordered = ordered.filter(keyset_after(keyset, decode_cursor(cursor, keyset)))
+    else:
+        ordered = ordered.offset((page - 1) * per_page)
+    
+    # Fetch one extra row to know whether another page follows
+    rows = ordered.limit(per_page + 1).all()
+    items = rows[:per_page]
+    next_cursor = None
+    if len(rows) > per_page:
+        next_cursor = encode_cursor([getattr(items[-1], column.key) for column, _d in keyset])
+    
+    return Page(items, total, page, per_page, next_cursor)
+
+
 class UserService:
     """Service class for user-related operations."""
     
@@ -109,21 +204,58 @@ class MedicineService:
         ).first()
     
     @staticmethod
-    def search_medicines(query: str, category: str = None) -> List[Medicine]:
-        """Search medicines by name or category."""
+    def full_text_match(query: str) -> Optional[str]:
+        """Get the FTS5 match expression for a query, or None if full-text search can't serve it."""
+        match = build_match_expression(query)
+        if match and MEDICINES_SEARCH.is_available(db.engine):
+            return match
+        return None
+    
+    @staticmethod
+    def build_search_query(query: str = None, category: str = None):
+        """Build the filtered query for active medicines."""
         search_query = Medicine.query.filter(Medicine.is_active == True)
         
         if query:
-            search_query = search_query.filter(
-                Medicine.name.ilike(f'%{query}%')
-            )
+            match = MedicineService.full_text_match(query)
+            if match:
+                search_query = search_query.filter(
+                    Medicine.id.in_(MEDICINES_SEARCH.matching_ids(match))
+                )
+            else:
+                search_query = search_query.filter(
+                    Medicine.name.ilike(f'%{query}%')
+                )
         
         if category:
             search_query = search_query.filter(
                 Medicine.category.ilike(f'%{category}%')
             )
         
-        return search_query.order_by(Medicine.name).all()
+        return search_query
+    
+    @staticmethod
+    def search_medicines(query: str, category: str = None) -> List[Medicine]:
+        """Search medicines by name, category or description, best matches first."""
+        match = MedicineService.full_text_match(query) if query else None
+        if not match:
+            return MedicineService.build_search_query(query, category).order_by(Medicine.name).all()
+        
+        fts = MEDICINES_SEARCH.table
+        return MedicineService.build_search_query(category=category)\
+            .join(fts, fts.c.rowid == Medicine.id)\
+            .filter(MEDICINES_SEARCH.match_clause(match))\
+            .order_by(fts.c.rank, Medicine.name).all()
+    
+    @staticmethod
+    def get_medicines_page(query: str = None, category: str = None, page: int = 1,
+                           per_page: int = 20, cursor: str = None, with_total: bool = None) -> Page:
+        """Get one page of active medicines ordered by name."""
+        return paginate_query(
+            MedicineService.build_search_query(query, category),
+            keyset=[(Medicine.name, False), (Medicine.id, False)],
+            page=page, per_page=per_page, cursor=cursor, with_total=with_total
+        )
     
     @staticmethod
     def get_medicines_by_category(category: str) -> List[Medicine]:
@@ -133,6 +265,21 @@ class MedicineService:
             Medicine.is_active == True
         ).order_by(Medicine.name).all()
     
+    @staticmethod
+    def get_catalog_version() -> Optional[str]:
+        """Get the stored version stamp of the medicine catalog."""
+        return db.session.query(CatalogVersion.version).filter_by(name=MEDICINES_CATALOG).scalar()
+    
+    @staticmethod
+    def load_name_suggestions(version: Optional[str] = None) -> SuggestionIndex:
+        """Build the typeahead index over active medicine names."""
+        compiled = ConditionService.get_compiled_catalog()
+        if compiled is not None and compiled.has_medicines(CONDITIONS_SOURCE, version):
+            names = compiled.medicine_names()
+        else:
+            names = [name for (name,) in db.session.query(Medicine.name).filter(Medicine.is_active == True)]
+        return SuggestionIndex(((name, 1) for name in names), version=version)
+    
     @staticmethod
     def get_medicine_categories() -> List[str]:
         """Get all unique medicine categories."""
@@ -146,6 +293,36 @@ class MedicineService:
 class ConditionService:
     """Service class for condition-related operations."""
     
+    @staticmethod
+    def get_catalog_version() -> Optional[str]:
+        """Get the stored version stamp of the condition catalog."""
+        return db.session.query(CatalogVersion.version).filter_by(name=CONDITIONS_CATALOG).scalar()
+    
+    @staticmethod
+    def load_catalog_snapshot(version: Optional[str] = None) -> CatalogSnapshot:
+        """Load a snapshot of the active conditions, ordered by name."""
+        return condition_engine.load_snapshot(version)
+    
+    @staticmethod
+    def get_catalog_snapshot() -> CatalogSnapshot:
+        """Get the shared condition catalog snapshot, reloading it only if the catalog changed."""
+        return condition_engine.get_snapshot()
+    
+    @staticmethod
+    def get_compiled_catalog() -> Optional[CompiledCatalog]:
+        """Map the configured compiled catalog file, if there is one."""
+        path = current_app.config.get('COMPILED_CATALOG_PATH') if has_app_context() else None
+        return open_compiled_catalog(path) if path else None
+    
+    @staticmethod
+    def compile_catalog(path: str) -> str:
+        """Write the current condition and medicine catalogs to a compiled catalog file."""
+        names = db.session.query(Medicine.name).filter(Medicine.is_active == True).order_by(Medicine.name)
+        return compile_catalog(
+            path, CONDITIONS_SOURCE, ConditionCatalogLoader(), MedicineService.get_catalog_version,
+            lambda: [name for (name,) in names]
+        )
+    
     @staticmethod
     def get_all_conditions(active_only: bool = True) -> List[Condition]:
         """Get all conditions, optionally filtered by active status."""
@@ -167,25 +344,62 @@ class ConditionService:
         ).first()
     
     @staticmethod
-    def search_conditions(query: str, category: str = None) -> List[Condition]:
-        """Search conditions by name, symptoms, or category."""
+    def full_text_match(query: str) -> Optional[str]:
+        """Get the FTS5 match expression for a query, or None if full-text search can't serve it."""
+        match = build_match_expression(query)
+        if match and CONDITIONS_SEARCH.is_available(db.engine):
+            return match
+        return None
+    
+    @staticmethod
+    def build_search_query(query: str = None, category: str = None):
+        """Build the filtered query for active conditions."""
         search_query = Condition.query.filter(Condition.is_active == True)
         
         if query:
-            search_query = search_query.filter(
-                db.or_(
-                    Condition.name.ilike(f'%{query}%'),
-                    Condition.symptoms.ilike(f'%{query}%'),
-                    Condition.description.ilike(f'%{query}%')
+            match = ConditionService.full_text_match(query)
+            if match:
+                search_query = search_query.filter(
+                    Condition.id.in_(CONDITIONS_SEARCH.matching_ids(match))
+                )
+            else:
+                search_query = search_query.filter(
+                    db.or_(
+                        Condition.name.ilike(f'%{query}%'),
+                        Condition.symptoms.ilike(f'%{query}%'),
+                        Condition.description.ilike(f'%{query}%')
+                    )
                 )
-            )
         
         if category:
             search_query = search_query.filter(
                 Condition.category.ilike(f'%{category}%')
             )
         
-        return search_query.order_by(Condition.name).all()
+        return search_query
+    
+    @staticmethod
+    def search_conditions(query: str, category: str = None) -> List[Condition]:
+        """Search conditions by name, symptoms, or category, best matches first."""
+        match = ConditionService.full_text_match(query) if query else None
+        if not match:
+            return ConditionService.build_search_query(query, category).order_by(Condition.name).all()
+        
+        fts = CONDITIONS_SEARCH.table
+        return ConditionService.build_search_query(category=category)\
+            .join(fts, fts.c.rowid == Condition.id)\
+            .filter(CONDITIONS_SEARCH.match_clause(match))\
+            .order_by(fts.c.rank, Condition.name).all()
+    
+    @staticmethod
+    def get_conditions_page(query: str = None, category: str = None, page: int = 1,
+                            per_page: int = 20, cursor: str = None, with_total: bool = None) -> Page:
+        """Get one page of active conditions ordered by name."""
+        return paginate_query(
+            ConditionService.build_search_query(query, category),
+            keyset=[(Condition.name, False), (Condition.id, False)],
+            page=page, per_page=per_page, cursor=cursor, with_total=with_total
+        )
     
     @staticmethod
     def get_condition_categories() -> List[str]:
@@ -197,149 +411,228 @@ class ConditionService:
         return [cat[0] for cat in categories if cat[0]]
 
 
+class ConditionCatalogLoader(CatalogLoader):
+    """Diagnosis engine loader for the active rows of the ``conditions`` table."""
+    
+    def read_version(self) -> Optional[str]:
+        return ConditionService.get_catalog_version()
+    
+    def load_conditions(self) -> List[ConditionRecord]:
+        rows = db.session.query(
+            Condition.id, Condition.name, Condition.description, Condition.symptoms,
+            Condition.ayurvedic_remedy, Condition.modern_treatment, Condition.severity_level,
+            Condition.category, Condition.created_at
+        ).filter(Condition.is_active == True).order_by(Condition.name).all()
+        return [ConditionRecord(*row) for row in rows]
+    
+    def load_snapshot(self, version: Optional[str] = None) -> CatalogSnapshot:
+        # Map the compiled catalog file while it holds the current version
+        compiled = ConditionService.get_compiled_catalog()
+        if compiled is not None and compiled.has_conditions(CONDITIONS_SOURCE, version):
+            return compiled.snapshot()
+        return super().load_snapshot(version)
+
+
+# Shared by every request in this process
+condition_engine = DiagnosisEngine(ConditionCatalogLoader())
+
+
+medicine_names = CatalogCache(
+    read_version=lambda: MedicineService.get_catalog_version(),
+    load=lambda version: MedicineService.load_name_suggestions(version)
+)
+
+
+class SuggestionService:
+    """Service class for typeahead suggestions served from memory."""
+    
+    KINDS = ('symptom', 'medicine', 'condition')
+    
+    # (catalog snapshot, symptom suggestions, condition suggestions)
+    _condition_suggestions = None
+    
+    @staticmethod
+    def get_condition_suggestions(max_age: float = 0) -> Tuple[SuggestionIndex, SuggestionIndex]:
+        """Get symptom and condition-name indexes for the current catalog snapshot."""
+        snapshot = condition_engine.get_snapshot(max_age=max_age)
+        cached = SuggestionService._condition_suggestions
+        if cached is None or cached[0] is not snapshot:
+            index = snapshot.symptom_index
+            symptoms = SuggestionIndex(
+                ((symptom, len(index.postings[symptom])) for symptom in snapshot.symptoms),
+                version=snapshot.version
+            )
+            names = SuggestionIndex(
+                ((condition.name, 1) for condition in snapshot.conditions),
+                version=snapshot.version
+            )
+            cached = (snapshot, symptoms, names)
+            SuggestionService._condition_suggestions = cached
+        return cached[1], cached[2]
+    
+    @staticmethod
+    def suggest(kind: str, prefix: str, limit: int = 10, max_age: float = 0) -> List[str]:
+        """Suggest catalog entries of ``kind`` starting with ``prefix``.
+        
+        ``max_age`` lets callers skip the catalog version check for that many
+        seconds, so steady-state lookups do not touch the database.
+        """
+        if kind not in SuggestionService.KINDS:
+            raise ValueError(f"Kind must be one of: {', '.join(SuggestionService.KINDS)}")
+        
+        if kind == 'medicine':
+            index = medicine_names.get(max_age=max_age)
+        else:
+            symptoms, names = SuggestionService.get_condition_suggestions(max_age=max_age)
+            index = symptoms if kind == 'symptom' else names
+        
+        return index.suggest(prefix, limit)
+
+
 class DiagnosisService:
     """Service class for diagnosis-related operations."""
     
     @staticmethod
-    def diagnose_symptoms(symptoms_text: str) -> Dict:
-        """Enhanced symptom diagnosis logic that returns all possible diseases for minimal symptoms."""
-        if not symptoms_text or not symptoms_text.strip():
-            return {
-                'disease': 'No symptoms provided',
-                'ayurvedic': 'Please enter your symptoms to get a diagnosis.',
-                'medicine': 'Please enter your symptoms to get medicine suggestions.',
-                'confidence': 0,
-                'severity': 'unknown',
-                'description': 'Please describe your symptoms in simple terms like: fever, headache, cough, stomach pain, etc.',
-                'precautions': 'Always seek professional medical advice for an accurate diagnosis.'
-            }
-        
-        # Process input symptoms
-        input_symptoms = [s.strip().lower() for s in symptoms_text.split(',') if s.strip()]
-        
-        # Get all conditions
-        conditions = ConditionService.get_all_conditions()
-        
-        # Find all conditions that match ANY of the input symptoms
-        all_matches = []
-        best_match = None
-        best_score = 0
-        
-        for condition in conditions:
-            condition_symptoms = [s.strip().lower() for s in condition.symptoms.split(',')]
-            
-            # Count how many input symptoms match condition symptoms
-            matches = 0
-            matched_symptoms = []
-            
-            for input_symptom in input_symptoms:
-                for condition_symptom in condition_symptoms:
-                    # Simple contains check
-                    if input_symptom in condition_symptom or condition_symptom in input_symptom:
-                        matches += 1
-                        matched_symptoms.append(condition_symptom)
-                        break
-            
-            # Calculate score: percentage of input symptoms that matched
-            if input_symptoms:
-                score = matches / len(input_symptoms)
-            else:
-                score = 0
-            
-            # Include ALL conditions that have at least one matching symptom
-            if matches > 0:
-                all_matches.append({
-                    'condition': condition.name,
-                    'score': score,
-                    'matches': matches,
-                    'matched_symptoms': matched_symptoms,
-                    'severity': condition.severity_level,
-                    'ayurvedic': condition.ayurvedic_remedy,
-                    'medicine': condition.modern_treatment,
-                    'description': condition.description,
-                    'precautions': 'Always seek professional medical advice for an accurate diagnosis.'
-                })
-                
-                if score > best_score:
-                    best_score = score
-                    best_match = condition
-        
-        # Sort matches by score (highest first)
-        all_matches.sort(key=lambda x: x['score'], reverse=True)
-        
-        # If we have a very strong match (80% or more symptoms match), show it as primary
-        if best_match and best_score >= 0.8:
-            return {
-                'disease': best_match.name,
-                'ayurvedic': best_match.ayurvedic_remedy,
-                'medicine': best_match.modern_treatment,
-                'confidence': round(best_score * 100, 0),
-                'severity': best_match.severity_level,
-                'description': best_match.description,
-                'precautions': 'Always seek professional medical advice for an accurate diagnosis.'
-            }
-        else:
-            # Return ALL possible conditions that match the symptoms
-            if all_matches:
-                # Create a comprehensive list of all matching conditions
-                condition_list = []
-                for match in all_matches:
-                    severity_emoji = {
-                        'mild': '🟢',
-                        'moderate': '🟡', 
-                        'severe': '🔴',
-                        'unknown': '❓'
-                    }.get(match['severity'], '❓')
-                    
-                    confidence_text = f" ({round(match['score'] * 100, 0)}% match)"
-                    condition_list.append(f"{severity_emoji} {match['condition']}{confidence_text}")
-                
-                # Limit to top 10 to avoid overwhelming the user
-                top_conditions = condition_list[:10]
-                condition_text = "\n• " + "\n• ".join(top_conditions)
-                
-                # If there are more than 10 matches, add a note
-                if len(all_matches) > 10:
-                    condition_text += f"\n\n... and {len(all_matches) - 10} more possible conditions"
-                
-                return {
-                    'disease': f'Found {len(all_matches)} possible conditions',
-                    'ayurvedic': 'Please consult an Ayurvedic practitioner for personalized treatment.',
-                    'medicine': 'Please consult a healthcare professional for proper diagnosis.',
-                    'confidence': round(best_score * 100, 0) if best_score > 0 else 0,
-                    'severity': 'unknown',
-                    'description': f'Your symptoms could indicate these conditions:\n{condition_text}\n\nAdd more symptoms for more accurate results.',
-                    'precautions': 'Always seek professional medical advice for an accurate diagnosis. This is not a substitute for medical consultation.'
-                }
-            else:
-                return {
-                    'disease': 'No matching conditions found',
-                    'ayurvedic': 'Please consult an Ayurvedic practitioner for personalized treatment.',
-                    'medicine': 'Please consult a healthcare professional for proper diagnosis.',
-                    'confidence': 0,
-                    'severity': 'unknown',
-                    'description': 'Try describing your symptoms in simple terms like: fever, headache, cough, stomach pain, etc.',
-                    'precautions': 'Always seek professional medical advice for an accurate diagnosis.'
-                }
+    def get_result_cache() -> Optional[ResultCache]:
+        """Get the app's diagnosis result cache, or None when caching is disabled."""
+        if not has_app_context():
+            return None
+        return current_app.extensions.get('diagnosis_cache')
     
     @staticmethod
-    def save_diagnosis(user_id: int, symptoms: str, diagnosis_result: Dict) -> DiagnosisHistory:
-        """Save diagnosis to history."""
-        diagnosis = DiagnosisHistory(
-            user_id=user_id,
-            symptoms=symptoms,
-            diagnosed_condition=diagnosis_result.get('disease'),
-            ayurvedic_remedy=diagnosis_result.get('ayurvedic'),
-            medicine_suggestion=diagnosis_result.get('medicine'),
-            confidence_score=diagnosis_result.get('confidence', 0) / 100,  # Convert percentage to decimal
-            severity_level=diagnosis_result.get('severity', 'unknown')
+    def get_score_observer() -> Optional[Callable[[str, float], None]]:
+        """Get the callback recording scoring time, or None when metrics are disabled."""
+        if not has_app_context():
+            return None
+        return current_app.extensions.get('diagnosis_score_observer')
+    
+    @staticmethod
+    def get_scorer_names() -> List[str]:
+        """Get the names of the available scoring strategies."""
+        return list(SCORERS)
+    
+    @staticmethod
+    def get_default_scorer() -> str:
+        """Get the configured default scoring strategy."""
+        return current_app.config.get('DIAGNOSIS_SCORER', DEFAULT_SCORER) if has_app_context() else DEFAULT_SCORER
+    
+    @staticmethod
+    def diagnose_symptoms(symptoms_text: str, catalog: CatalogSnapshot = None, scorer: str = None) -> Dict:
+        """Enhanced symptom diagnosis logic that returns all possible diseases for minimal symptoms.
+        
+        ``scorer`` overrides the configured scoring strategy; unknown names raise ValueError.
+        """
+        return condition_engine.diagnose(
+            symptoms_text,
+            catalog,
+            scorer=scorer or DiagnosisService.get_default_scorer(),
+            result_cache=DiagnosisService.get_result_cache(),
+            observe_score=DiagnosisService.get_score_observer()
         )
+    
+    @staticmethod
+    def get_diagnosis_pool():
+        """Get the app's diagnosis worker pool, or None when scoring stays in-process."""
+        if not has_app_context():
+            return None
+        return current_app.extensions.get('diagnosis_pool')
+    
+    @staticmethod
+    def diagnose_batch(symptom_texts: List[str], scorer: str = None) -> List[Dict]:
+        """Diagnose many symptom lists against a single catalog snapshot.
+        
+        Batches of at least DIAGNOSIS_POOL_MIN_BATCH are sharded across the
+        worker pool when one is configured.
+        """
+        catalog = ConditionService.get_catalog_snapshot()
+        scorer = scorer or DiagnosisService.get_default_scorer()
+        
+        pool = DiagnosisService.get_diagnosis_pool()
+        if (pool is not None and catalog.version is not None
+                and len(symptom_texts) >= current_app.config['DIAGNOSIS_POOL_MIN_BATCH']):
+            return pool.diagnose_batch(
+                symptom_texts, catalog, scorer,
+                result_cache=DiagnosisService.get_result_cache(),
+                observe_score=DiagnosisService.get_score_observer()
+            )
+        
+        return [DiagnosisService.diagnose_symptoms(text, catalog, scorer) for text in symptom_texts]
+    
+    @staticmethod
+    def history_values(user_id: int, symptoms: str, diagnosis_result: Dict) -> Dict:
+        """Build the diagnosis history column values for a diagnosis result."""
+        return {
+            'user_id': user_id,
+            'symptoms': symptoms,
+            'diagnosed_condition': diagnosis_result.get('disease'),
+            'ayurvedic_remedy': diagnosis_result.get('ayurvedic'),
+            'medicine_suggestion': diagnosis_result.get('medicine'),
+            'confidence_score': diagnosis_result.get('confidence', 0) / 100,  # Convert percentage to decimal
+            'severity_level': diagnosis_result.get('severity', 'unknown')
+        }
+    
+    @staticmethod
+    def get_history_writer():
+        """Get the app's write-behind history writer, or None when writes are synchronous."""
+        if not has_app_context():
+            return None
+        return current_app.extensions.get('history_writer')
+    
+    @staticmethod
+    def save_diagnosis(user_id: int, symptoms: str, diagnosis_result: Dict) -> DiagnosisHistory:
+        """Save diagnosis to history.
+        
+        In write-behind mode the returned record already has its ID but is
+        written by the background writer shortly afterwards.
+        """
+        values = DiagnosisService.history_values(user_id, symptoms, diagnosis_result)
+        
+        writer = DiagnosisService.get_history_writer()
+        if writer is not None:
+            values['id'] = writer.ids.allocate()[0]
+            values['created_at'] = datetime.utcnow()
+            writer.submit([values])
+            return DiagnosisHistory(**values)
+        
+        diagnosis = DiagnosisHistory(**values)
         
         db.session.add(diagnosis)
         db.session.commit()
         
         return diagnosis
     
+    @staticmethod
+    def save_diagnoses(user_id: int, diagnoses: List[Tuple[str, Dict]]) -> List[int]:
+        """Save many (symptoms, diagnosis result) pairs with one bulk insert.
+        
+        Returns the new history IDs in the same order as ``diagnoses``.
+        """
+        if not diagnoses:
+            return []
+        
+        rows = [
+            DiagnosisService.history_values(user_id, symptoms, diagnosis_result)
+            for symptoms, diagnosis_result in diagnoses
+        ]
+        
+        writer = DiagnosisService.get_history_writer()
+        if writer is not None:
+            ids = writer.ids.allocate(len(rows))
+            created_at = datetime.utcnow()
+            for row, diagnosis_id in zip(rows, ids):
+                row['id'] = diagnosis_id
+                row['created_at'] = created_at
+            writer.submit(rows)
+            return ids
+        
+        statement = db.insert(DiagnosisHistory).returning(
+            DiagnosisHistory.id, sort_by_parameter_order=True
+        )
+        ids = db.session.scalars(statement, rows).all()
+        db.session.commit()
+        
+        return ids
+    
     @staticmethod
     def get_user_diagnosis_history(user_id: int, limit: int = 50) -> List[DiagnosisHistory]:
         """Get diagnosis history for a user."""
@@ -347,6 +640,82 @@ class DiagnosisService:
             .order_by(DiagnosisHistory.created_at.desc())\
             .limit(limit).all()
     
+    @staticmethod
+    def get_user_diagnosis_history_page(user_id: int, page: int = 1, per_page: int = 20,
+                                        cursor: str = None, with_total: bool = None) -> Page:
+        """Get one page of a user's diagnosis history, newest first."""
+        return paginate_query(
+            DiagnosisHistory.query.filter_by(user_id=user_id),
+            keyset=[(DiagnosisHistory.created_at, True), (DiagnosisHistory.id, True)],
+            page=page, per_page=per_page, cursor=cursor, with_total=with_total
+        )
+    
+    EXPORT_COLUMNS = (
+        'id', 'user_id', 'condition_id', 'symptoms', 'diagnosed_condition',
+        'ayurvedic_remedy', 'medicine_suggestion', 'confidence_score',
+        'severity_level', 'user_feedback', 'created_at'
+    )
+    
+    @staticmethod
+    def iter_diagnosis_history(batch_size: int = 1000) -> Iterator[Dict]:
+        """Iterate over every diagnosis history row ordered by (created_at, id).
+        
+        Rows are read in keyset-paginated batches of plain column tuples, so
+        memory use does not grow with the size of the table.
+        """
+        columns = [getattr(DiagnosisHistory, name) for name in DiagnosisService.EXPORT_COLUMNS]
+        
+        def rows_after(keyset, base_filter):
+            values = None
+            while True:
+                statement = db.select(*columns).where(base_filter)
+                if values is not None:
+                    statement = statement.where(keyset_after(keyset, values))
+                statement = statement.order_by(*[column for column, _d in keyset]).limit(batch_size)
+                
+                batch = db.session.execute(statement).all()
+                for row in batch:
+                    yield dict(zip(DiagnosisService.EXPORT_COLUMNS, row))
+                if len(batch) < batch_size:
+                    return
+                values = [getattr(batch[-1], column.key) for column, _d in keyset]
+        
+        # Rows without a timestamp cannot be compared on created_at; emit them first by id
+        yield from rows_after([(DiagnosisHistory.id, False)], DiagnosisHistory.created_at.is_(None))
+        yield from rows_after(
+            [(DiagnosisHistory.created_at, False), (DiagnosisHistory.id, False)],
+            DiagnosisHistory.created_at.isnot(None)
+        )
+    
+    @staticmethod
+    def export_diagnosis_history(export_format: str = 'ndjson', batch_size: int = 1000) -> Iterator[str]:
+        """Stream the whole diagnosis history as NDJSON or CSV text chunks."""
+        if export_format not in ('ndjson', 'csv'):
+            raise ValueError("Export format must be 'ndjson' or 'csv'")
+        
+        rows = DiagnosisService.iter_diagnosis_history(batch_size=batch_size)
+        
+        if export_format == 'ndjson':
+            for row in rows:
+                if row['created_at'] is not None:
+                    row['created_at'] = row['created_at'].isoformat()
+                yield json.dumps(row) + '\n'
+            return
+        
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(DiagnosisService.EXPORT_COLUMNS)
+        for count, row in enumerate(rows, start=1):
+            writer.writerow([
+                value.isoformat() if isinstance(value, datetime) else value
+                for value in row.values()
+            ])
+            if count % batch_size == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+    
     @staticmethod
     def update_diagnosis_feedback(diagnosis_id: int, user_id: int, feedback: str, is_accurate: bool = None) -> Optional[DiagnosisHistory]:
         """Update diagnosis with user feedback."""
@@ -355,6 +724,14 @@ class DiagnosisService:
             user_id=user_id
         ).first()
         
+        # The row may still be waiting in the write-behind queue
+        writer = DiagnosisService.get_history_writer()
+        if not diagnosis and writer is not None and writer.flush(timeout=5):
+            diagnosis = DiagnosisHistory.query.filter_by(
+                id=diagnosis_id,
+                user_id=user_id
+            ).first()
+        
         if not diagnosis:
             return None
         
@@ -0,0 +1,104 @@
+"""
+Typo-tolerant symptom lookup for Medicino.
+SymSpell-style delete dictionary over the words of the symptom vocabulary, so a
+misspelled word is corrected with a bounded number of dictionary lookups
+instead of an edit-distance scan over every known word.
+"""
+
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+# Words shorter than this are never corrected; too many real words are one edit apart
+MIN_WORD_LENGTH = 3
+# Words up to this length may be one edit off, longer words two
+SHORT_WORD_LENGTH = 4
+MAX_EDIT_DISTANCE = 2
+
+
+def max_distance_for(word: str) -> int:
+    """Largest edit distance tolerated for a word of this length."""
+    if len(word) < MIN_WORD_LENGTH:
+        return 0
+    return 1 if len(word) <= SHORT_WORD_LENGTH else MAX_EDIT_DISTANCE
+
+
+def deletes(word: str, distance: int) -> Set[str]:
+    """Every string obtained by deleting up to ``distance`` characters from ``word``."""
+    variants = {word}
+    frontier = {word}
+    for _ in range(distance):
+        frontier = {
+            variant[:i] + variant[i + 1:]
+            for variant in frontier if len(variant) > 1
+            for i in range(len(variant))
+        }
+        variants |= frontier
+    return variants
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """Optimal string alignment distance between ``a`` and ``b``, or ``limit + 1`` if above ``limit``."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2: List[int] = []
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        previous2, previous = previous, current
+    return min(previous[-1], limit + 1)
+
+
+class SpellingCorrector:
+    """Corrects words against a weighted dictionary of known words.
+
+    Candidates are found through shared deletes (the SymSpell method): a word
+    and its correction within distance ``d`` always share a string reachable
+    by at most ``d`` deletions from each. Ties prefer the smaller distance,
+    then the heavier word, then alphabetical order.
+    """
+
+    def __init__(self, words: Iterable[Tuple[str, int]]):
+        self.weights: Dict[str, int] = {}
+        for word, weight in words:
+            if len(word) >= MIN_WORD_LENGTH:
+                self.weights[word] = self.weights.get(word, 0) + weight
+
+        self.deletes: Dict[str, List[str]] = {}
+        for word in self.weights:
+            for variant in deletes(word, max_distance_for(word)):
+                self.deletes.setdefault(variant, []).append(word)
+
+    def __len__(self) -> int:
+        return len(self.weights)
+
+    def correct_word(self, word: str) -> Optional[str]:
+        """Closest known word to ``word``, or None when nothing is close enough."""
+        if word in self.weights:
+            return word
+        limit = max_distance_for(word)
+        if not limit:
+            return None
+
+        best = None
+        seen = set()
+        for variant in deletes(word, limit):
+            for candidate in self.deletes.get(variant, ()):
+                if candidate in seen:
+                    continue
+                seen.add(candidate)
+                candidate_limit = min(limit, max_distance_for(candidate))
+                distance = edit_distance(word, candidate, candidate_limit)
+                if distance > candidate_limit:
+                    continue
+                key = (distance, -self.weights[candidate], candidate)
+                if best is None or key < best:
+                    best = key
+        return best[2] if best else None
+
+    def correct(self, text: str) -> str:
+        """Correct every word of a phrase, leaving words with no close match as they are."""
+        return ' '.join(self.correct_word(word) or word for word in text.split())
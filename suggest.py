@@ -0,0 +1,72 @@
+"""
+Typeahead suggestions for Medicino.
+Sorted-array prefix index answering autocomplete queries with bisect.
+"""
+
+import heapq
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+# Prefixes this short match too many entries to rank on every keystroke;
+# their top results are computed once when the index is built.
+PRECOMPUTED_PREFIX_LENGTH = 2
+MAX_SUGGESTIONS = 20
+
+
+class SuggestionIndex:
+    """Prefix index over catalog phrases, ranked by weight then alphabetically.
+
+    Every phrase is reachable from the start of any of its words, so "pain"
+    suggests "stomach pain" as well as "pain in joints".
+    """
+
+    __slots__ = ('version', 'phrases', 'weights', 'keys', 'targets', 'top')
+
+    def __init__(self, phrases: Iterable[Tuple[str, int]], version: Optional[str] = None):
+        self.version = version
+
+        weights: Dict[str, int] = {}
+        for phrase, weight in phrases:
+            phrase = phrase.strip()
+            if phrase:
+                weights[phrase] = weights.get(phrase, 0) + weight
+
+        # Rank order: heavier first, then alphabetical
+        self.phrases: Tuple[str, ...] = tuple(sorted(weights, key=lambda p: (-weights[p], p.lower())))
+        self.weights: Tuple[int, ...] = tuple(weights[p] for p in self.phrases)
+
+        entries = []
+        for rank, phrase in enumerate(self.phrases):
+            words = phrase.lower().split()
+            for start in range(len(words)):
+                entries.append((' '.join(words[start:]), rank))
+        entries.sort()
+        self.keys: Tuple[str, ...] = tuple(key for key, _rank in entries)
+        self.targets: Tuple[int, ...] = tuple(rank for _key, rank in entries)
+
+        top: Dict[str, Set[int]] = {}
+        for key, rank in entries:
+            for length in range(1, min(PRECOMPUTED_PREFIX_LENGTH, len(key)) + 1):
+                top.setdefault(key[:length], set()).add(rank)
+        self.top: Dict[str, Tuple[int, ...]] = {
+            prefix: tuple(heapq.nsmallest(MAX_SUGGESTIONS, ranks)) for prefix, ranks in top.items()
+        }
+
+    def __len__(self) -> int:
+        return len(self.phrases)
+
+    def suggest(self, prefix: str, limit: int = 10) -> List[str]:
+        """Return up to ``limit`` phrases with a word starting with ``prefix``."""
+        prefix = ' '.join(prefix.lower().split())
+        limit = max(0, min(limit, MAX_SUGGESTIONS))
+        if not prefix or not limit:
+            return []
+
+        if len(prefix) <= PRECOMPUTED_PREFIX_LENGTH:
+            ranks = self.top.get(prefix, ())[:limit]
+        else:
+            lo = bisect_left(self.keys, prefix)
+            hi = bisect_left(self.keys, prefix + '\uffff', lo)
+            ranks = heapq.nsmallest(limit, set(self.targets[lo:hi]))
+
+        return [self.phrases[rank] for rank in ranks]
@@ -0,0 +1,223 @@
+"""
+Symptom index for Medicino diagnosis.
+Inverted index from normalized condition symptoms to the conditions listing them.
+"""
+
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from phrase_extraction import PhraseExtractor, build_phrase_extractor
+from spelling import SpellingCorrector
+
+
+def normalize_symptom(symptom: str) -> str:
+    """Normalize a single symptom the way the diagnosis matcher compares them."""
+    return symptom.strip().lower()
+
+
+def split_condition_symptoms(symptoms_text: str) -> Tuple[str, ...]:
+    """Split a condition's comma-separated symptoms, keeping their order."""
+    return tuple(normalize_symptom(s) for s in symptoms_text.split(','))
+
+
+def parse_input_symptoms(symptoms_text: str) -> List[str]:
+    """Split user input into normalized symptoms, dropping empty entries."""
+    return [normalize_symptom(s) for s in symptoms_text.split(',') if s.strip()]
+
+
+class SymptomIndex:
+    """Inverted index from normalized symptom to the conditions that list it.
+
+    Conditions are addressed by their position in the sequence the index was
+    built from, so matches come back in catalog order. An input symptom hits
+    an indexed symptom when either one contains the other, exactly like the
+    original per-condition substring loop.
+
+    Input symptoms with no substring match at all are spell-corrected word by
+    word against the vocabulary and resolved again, so "hedache" still finds
+    "headache".
+
+    Free-text input ("a headache and a runny nose") is split into the known
+    phrases it mentions by ``expand`` before matching.
+
+    The vocabulary is also interned to integer ids (positions in
+    ``vocabulary``) and each condition's symptom set kept as an int bitmask in
+    ``condition_masks``: postings find the candidate conditions, and overlaps
+    with them are counted by ANDing masks and taking ``int.bit_count``.
+    """
+
+    MAX_RESOLVED_TERMS = 4096
+
+    def __init__(self, condition_symptoms: Iterable[Sequence[str]]):
+        self.condition_symptoms: List[Tuple[str, ...]] = []
+        self.condition_masks: List[int] = []
+        # symptom -> [(condition position, first offset of symptom in condition)]
+        self.postings: Dict[str, List[Tuple[int, int]]] = {}
+        self.symptom_ids: Dict[str, int] = {}
+
+        for position, symptoms in enumerate(condition_symptoms):
+            symptoms = tuple(symptoms)
+            self.condition_symptoms.append(symptoms)
+            mask = 0
+            for offset, symptom in enumerate(symptoms):
+                symptom_id = self.symptom_ids.setdefault(symptom, len(self.symptom_ids))
+                mask |= 1 << symptom_id
+                entries = self.postings.setdefault(symptom, [])
+                if entries and entries[-1][0] == position:
+                    continue
+                entries.append((position, offset))
+            self.condition_masks.append(mask)
+
+        self.vocabulary: Tuple[str, ...] = tuple(self.postings)
+        self._resolved: Dict[str, Tuple[str, ...]] = {}
+        self._resolved_masks: Dict[str, int] = {}
+        self._corrector: Optional[SpellingCorrector] = None
+        self._extractor: Optional[PhraseExtractor] = None
+
+    def __len__(self) -> int:
+        return len(self.condition_symptoms)
+
+    @property
+    def corrector(self) -> SpellingCorrector:
+        """Spelling corrector over the vocabulary's words, built on first use."""
+        if self._corrector is None:
+            self._corrector = SpellingCorrector(
+                (word, len(self.postings[symptom]))
+                for symptom in self.vocabulary for word in symptom.split()
+            )
+        return self._corrector
+
+    @property
+    def extractor(self) -> PhraseExtractor:
+        """Phrase extractor over the vocabulary and common synonyms, built on first use."""
+        if self._extractor is None:
+            self._extractor = build_phrase_extractor(self.vocabulary)
+        return self._extractor
+
+    def expand(self, input_symptoms: Sequence[str]) -> List[str]:
+        """Replace free-text inputs by the known symptoms they mention.
+
+        An input is split when it mentions two or more different symptoms,
+        or mentions one (e.g. through a synonym) but matches nothing as typed.
+        Anything else is left for ``resolve`` to match as typed.
+        """
+        expanded = []
+        for input_symptom in input_symptoms:
+            mentioned = self.extractor.extract(input_symptom)
+            if len(mentioned) >= 2 or (mentioned and not self.resolve(input_symptom)):
+                expanded.extend(mentioned)
+            else:
+                expanded.append(input_symptom)
+        return expanded
+
+    def _substring_matches(self, input_symptom: str) -> Tuple[str, ...]:
+        return tuple(
+            symptom for symptom in self.vocabulary
+            if input_symptom in symptom or symptom in input_symptom
+        )
+
+    def resolve(self, input_symptom: str) -> Tuple[str, ...]:
+        """Return the indexed symptoms that substring-match an input symptom.
+
+        Falls back to the spell-corrected input when nothing matches as typed.
+        """
+        resolved = self._resolved.get(input_symptom)
+        if resolved is None:
+            resolved = self._substring_matches(input_symptom)
+            if not resolved:
+                corrected = self.corrector.correct(input_symptom)
+                if corrected != input_symptom:
+                    resolved = self._substring_matches(corrected)
+            if len(self._resolved) >= self.MAX_RESOLVED_TERMS:
+                self._resolved.clear()
+            self._resolved[input_symptom] = resolved
+        return resolved
+
+    def symptom_mask(self, symptoms: Iterable[str]) -> int:
+        """Bitmask of the given indexed symptoms; unknown symptoms are ignored."""
+        mask = 0
+        for symptom in symptoms:
+            symptom_id = self.symptom_ids.get(symptom)
+            if symptom_id is not None:
+                mask |= 1 << symptom_id
+        return mask
+
+    def input_mask(self, input_symptom: str) -> int:
+        """Bitmask of the indexed symptoms that substring-match an input symptom."""
+        mask = self._resolved_masks.get(input_symptom)
+        if mask is None:
+            mask = self.symptom_mask(self.resolve(input_symptom))
+            if len(self._resolved_masks) >= self.MAX_RESOLVED_TERMS:
+                self._resolved_masks.clear()
+            self._resolved_masks[input_symptom] = mask
+        return mask
+
+    def candidates(self, input_symptoms: Sequence[str]) -> List[int]:
+        """Positions, in catalog order, of the conditions any input symptom hits."""
+        positions = set()
+        for input_symptom in input_symptoms:
+            for symptom in self.resolve(input_symptom):
+                positions.update(position for position, _offset in self.postings[symptom])
+        return sorted(positions)
+
+    def count_matches(self, position: int, input_masks: Sequence[int]) -> int:
+        """Number of input symptoms (given as ``input_mask`` values) a condition matches."""
+        condition_mask = self.condition_masks[position]
+        return sum(1 for mask in input_masks if condition_mask & mask)
+
+    def overlap(self, position: int, mask: int) -> int:
+        """Number of distinct symptoms a condition shares with a symptom bitmask."""
+        return (self.condition_masks[position] & mask).bit_count()
+
+    def symptom_count(self, position: int) -> int:
+        """Number of distinct symptoms a condition lists."""
+        return self.condition_masks[position].bit_count()
+
+    def matched_symptoms(self, position: int, input_masks: Sequence[int]) -> List[str]:
+        """First condition symptom hit by each matching input, like ``match``."""
+        matched = []
+        for mask in input_masks:
+            for symptom in self.condition_symptoms[position]:
+                if mask >> self.symptom_ids[symptom] & 1:
+                    matched.append(symptom)
+                    break
+        return matched
+
+    def match(self, input_symptoms: Sequence[str]) -> List[Tuple[int, List[str]]]:
+        """Match input symptoms against the indexed conditions.
+
+        Returns ``(position, matched_symptoms)`` pairs in catalog order for every
+        condition with at least one match. ``matched_symptoms`` holds, for each
+        matching input symptom in input order, the first condition symptom it
+        hit.
+        """
+        matched: Dict[int, List[str]] = {}
+
+        for input_symptom in input_symptoms:
+            first_offsets: Dict[int, int] = {}
+            for symptom in self.resolve(input_symptom):
+                for position, offset in self.postings[symptom]:
+                    current = first_offsets.get(position)
+                    if current is None or offset < current:
+                        first_offsets[position] = offset
+
+            for position, offset in first_offsets.items():
+                matched.setdefault(position, []).append(
+                    self.condition_symptoms[position][offset]
+                )
+
+        return sorted(matched.items())
+
+    def rank(self, input_symptoms: Sequence[str], limit: int) -> Tuple[List[Tuple[int, int]], int]:
+        """Rank conditions by how many input symptoms they match.
+
+        Returns the top ``limit`` ``(position, match_count)`` pairs - most
+        matches first, catalog order within ties - and the total number of
+        conditions with at least one match.
+        """
+        input_masks = [self.input_mask(input_symptom) for input_symptom in input_symptoms]
+        counts = [
+            (position, self.count_matches(position, input_masks))
+            for position in self.candidates(input_symptoms)
+        ]
+        counts.sort(key=lambda entry: entry[1], reverse=True)
+        return counts[:limit], len(counts)
@@ -0,0 +1,182 @@
+"""
+Micro-benchmarks for Medicino's diagnosis and search hot paths.
+Not collected by pytest; run from the repository root with
+``python -m tests.benchmarks`` and compare the JSON it prints between changes.
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Callable, Dict, List, Sequence
+
+from app_enhanced import create_app
+from config import TestingConfig, config
+from generate_data import BODY_SYSTEMS, generate_catalog
+from models import db, Condition, Medicine
+from services import ConditionService, DiagnosisService, MedicineService
+
+DEFAULT_SIZES = (100, 10_000, 100_000)
+# Symptoms per diagnosis input
+INPUT_LENGTHS = (1, 3, 8)
+
+
+class BenchmarkConfig(TestingConfig):
+    """Testing configuration without the diagnosis cache, so every call is scored."""
+    DIAGNOSIS_CACHE_SIZE = 0
+
+
+def populate_catalog(conditions: int, seed: int) -> List[str]:
+    """Bulk-load a synthetic catalog with ``generate_data``; returns the symptom vocabulary."""
+    conn = db.engine.raw_connection()
+    try:
+        generate_catalog(conn.driver_connection, conditions, max(50, conditions // 2), seed)
+    finally:
+        conn.close()
+    return list(ConditionService.get_catalog_snapshot().symptoms)
+
+
+def percentile(timings: Sequence[float], q: float) -> float:
+    """Nearest-rank percentile of sorted ``timings``."""
+    return timings[min(len(timings) - 1, int(q * len(timings)))]
+
+
+def measure(name: str, catalog_size: int, params: Dict, call: Callable, inputs: Sequence,
+            iterations: int) -> Dict:
+    """Time ``call`` over ``inputs`` (cycled) and trace its peak memory separately."""
+    for argument in inputs[:5]:
+        call(argument)
+
+    gc.collect()
+    timings = []
+    for i in range(iterations):
+        argument = inputs[i % len(inputs)]
+        started = time.perf_counter()
+        call(argument)
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+
+    # Tracing slows every allocation, so memory gets its own shorter pass
+    tracemalloc.start()
+    for argument in inputs[:min(len(inputs), 20)]:
+        call(argument)
+    _current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    total = sum(timings)
+    return {
+        'name': name,
+        'catalog_size': catalog_size,
+        'params': params,
+        'iterations': iterations,
+        'ops_per_sec': round(iterations / total, 1) if total else None,
+        'mean_ms': round(total / iterations * 1000, 4),
+        'p50_ms': round(percentile(timings, 0.50) * 1000, 4),
+        'p99_ms': round(percentile(timings, 0.99) * 1000, 4),
+        'peak_memory_kb': round(peak / 1024, 1)
+    }
+
+
+def run_catalog(size: int, iterations: int, seed: int) -> List[Dict]:
+    """Run every benchmark against a fresh synthetic catalog of ``size`` conditions."""
+    fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    config['benchmark'] = type('BenchmarkConfig', (BenchmarkConfig,), {
+        'DATABASE': path,
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}'
+    })
+    app = create_app('benchmark')
+    results = []
+    try:
+        with app.app_context():
+            db.create_all()
+            vocabulary = populate_catalog(size, seed)
+            rng = random.Random(seed)
+
+            # Building the snapshot is what every worker pays after a catalog change
+            results.append(measure(
+                'catalog_snapshot', size, {}, ConditionService.load_catalog_snapshot,
+                [None], max(3, iterations // 100)
+            ))
+            ConditionService.get_catalog_snapshot()
+
+            for length in INPUT_LENGTHS:
+                inputs = [', '.join(rng.sample(vocabulary, length)) for _ in range(100)]
+                results.append(measure(
+                    'diagnose_symptoms', size, {'symptoms': length},
+                    DiagnosisService.diagnose_symptoms, inputs, iterations
+                ))
+            inputs = [f'I have {rng.choice(vocabulary)} and some {rng.choice(vocabulary)} since yesterday'
+                      for _ in range(100)]
+            results.append(measure(
+                'diagnose_symptoms', size, {'symptoms': 'free_text'},
+                DiagnosisService.diagnose_symptoms, inputs, iterations
+            ))
+
+            search_words = sorted({word for sites, findings in BODY_SYSTEMS.values() for word in sites + findings})
+            for words in (1, 2):
+                queries = [' '.join(rng.sample(search_words, words)) for _ in range(50)]
+                results.append(measure(
+                    'search_medicines', size, {'words': words},
+                    MedicineService.search_medicines, queries, iterations
+                ))
+                results.append(measure(
+                    'search_conditions', size, {'words': words},
+                    ConditionService.search_conditions, queries, iterations
+                ))
+                db.session.expunge_all()
+
+            for model in (Condition, Medicine):
+                rows = model.query.order_by(model.id).limit(50).all()
+                results.append(measure(
+                    f'{model.__tablename__}_to_dict', size, {'rows': len(rows)},
+                    lambda rows: [row.to_dict() for row in rows], [rows], iterations
+                ))
+
+            db.session.remove()
+    finally:
+        with app.app_context():
+            db.engine.dispose()
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(path + suffix):
+                os.unlink(path + suffix)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default=','.join(str(size) for size in DEFAULT_SIZES),
+                        help='Comma-separated catalog sizes (conditions).')
+    parser.add_argument('--iterations', type=int, default=500, help='Timed calls per benchmark.')
+    parser.add_argument('--seed', type=int, default=42, help='Seed for the synthetic catalogs and inputs.')
+    parser.add_argument('--output', default=None, help='File to write the JSON report to (defaults to stdout).')
+    args = parser.parse_args(argv)
+
+    results = []
+    for size in (int(size) for size in args.sizes.split(',')):
+        print(f'Benchmarking {size} conditions...', file=sys.stderr)
+        results.extend(run_catalog(size, args.iterations, args.seed))
+
+    report = json.dumps({
+        'generated_at': datetime.utcnow().isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'seed': args.seed,
+        'results': results
+    }, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(report + '\n')
+    else:
+        print(report)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,22 @@
+"""
+Shared pytest fixtures for Medicino tests.
+"""
+
+import pytest
+
+from models import db
+from tests.query_budget import DEFAULT_MAX_REPEATS, QueryBudget
+
+
+@pytest.fixture
+def query_budget():
+    """Build a QueryBudget on the current app's engine.
+
+    Use inside an app context::
+
+        with query_budget(max_queries=2):
+            DiagnosisService.get_user_diagnosis_history(user_id)
+    """
+    def budget(max_queries=None, max_repeats=DEFAULT_MAX_REPEATS):
+        return QueryBudget(db.engine, max_queries=max_queries, max_repeats=max_repeats)
+    return budget
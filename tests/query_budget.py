@@ -0,0 +1,85 @@
+"""
+Query budgets for Medicino tests.
+Counts the SQL statements a block of code sends to the database and fails
+when there are more than allowed, or when one statement shape repeats often
+enough to suggest an N+1 pattern (a lazy load per row).
+"""
+
+import re
+from collections import Counter
+from typing import List, Optional, Tuple
+
+from sqlalchemy import event
+
+# The same statement shape this many times in one block is reported as N+1
+DEFAULT_MAX_REPEATS = 2
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PARAMETER_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+_WHITESPACE = re.compile(r'\s+')
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised when a block issues more statements than its budget allows."""
+
+
+def statement_shape(statement: str) -> str:
+    """Normalize a statement so queries differing only in values or IN-list length compare equal."""
+    shape = _STRING_LITERAL.sub('?', statement)
+    shape = _NUMBER_LITERAL.sub('?', shape)
+    shape = _PARAMETER_LIST.sub('(?)', shape)
+    return _WHITESPACE.sub(' ', shape).strip()
+
+
+class QueryBudget:
+    """Context manager that records the statements ``engine`` executes inside it.
+
+    On a clean exit it raises QueryBudgetExceeded if more than ``max_queries``
+    statements ran, or if any statement shape ran more than ``max_repeats``
+    times. Either limit can be None to disable it. An ``executemany`` counts
+    as one statement.
+    """
+
+    def __init__(self, engine, max_queries: Optional[int] = None,
+                 max_repeats: Optional[int] = DEFAULT_MAX_REPEATS):
+        self.engine = engine
+        self.max_queries = max_queries
+        self.max_repeats = max_repeats
+        self.statements: List[str] = []
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def __enter__(self) -> 'QueryBudget':
+        self.statements = []
+        event.listen(self.engine, 'before_cursor_execute', self._record)
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        event.remove(self.engine, 'before_cursor_execute', self._record)
+        if exc_type is None:
+            self.check()
+        return False
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    def repeated(self) -> List[Tuple[str, int]]:
+        """Statement shapes that ran more than ``max_repeats`` times, most frequent first."""
+        if self.max_repeats is None:
+            return []
+        shapes = Counter(statement_shape(statement) for statement in self.statements)
+        return [(shape, count) for shape, count in shapes.most_common() if count > self.max_repeats]
+
+    def check(self):
+        """Raise QueryBudgetExceeded if either limit was broken."""
+        problems = []
+        if self.max_queries is not None and self.count > self.max_queries:
+            problems.append(f'{self.count} statements exceed the budget of {self.max_queries}')
+        for shape, count in self.repeated():
+            problems.append(f'possible N+1: {count}x {shape}')
+        if problems:
+            executed = '\n'.join(f'  {i}. {statement}' for i, statement in enumerate(self.statements, 1))
+            raise QueryBudgetExceeded('\n'.join(problems) + '\nStatements executed:\n' + executed)
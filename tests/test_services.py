@@ -6,14 +6,32 @@ Comprehensive testing of business logic and data operations.
 import pytest
 import tempfile
 import os
+import csv
+import json
+import multiprocessing
+import sqlite3
+import time
 from datetime import datetime
 from unittest.mock import patch, MagicMock
 
+from sqlalchemy import event
+
 from app_enhanced import create_app
-from models import db, User, Medicine, Condition, DiagnosisHistory
+from config import TestingConfig, config
+from history_writer import HistoryWriter, IdAllocator
+from diagnosis_engine import DiagnosisEngine, SQLiteSymptomsLoader
+from diagnosis_pool import DiagnosisPool, _score_shard
+from catalog import CONDITIONS_CATALOG, CatalogSnapshot, ConditionRecord, stamp_catalog_version
+from compiled_catalog import CompiledConditions, CompiledSymptomIndex
+from scorers import SCORERS
+from search_index import CONDITIONS_SEARCH, MISSING_INDEX_RECHECK_SECONDS
+from prometheus_metrics import get_registry
+from tests.query_budget import QueryBudgetExceeded, statement_shape
+from generate_data import DEFAULT_PASSWORD, condition_rows, generate_catalog, generate_history
+from models import db, ensure_indexes, User, Medicine, Condition, DiagnosisHistory, IdBlock
 from services import (
     UserService, MedicineService, ConditionService, 
-    DiagnosisService, ValidationService
+    DiagnosisService, ValidationService, SuggestionService, keyset_after
 )
 
 
@@ -208,6 +226,39 @@ class TestMedicineService:
             assert len(medicines) == 1
             assert 'pain' in medicines[0].description.lower()
     
+    def test_get_medicines_page(self, app):
+        """Test SQL-level offset and cursor pagination of medicines."""
+        with app.app_context():
+            for number in range(5):
+                db.session.add(Medicine(name=f'Medicine {number}', category='Test'))
+            db.session.commit()
+            
+            second = MedicineService.get_medicines_page(page=2, per_page=2)
+            assert [m.name for m in second.items] == ['Medicine 2', 'Medicine 3']
+            assert second.total is None and second.pages is None
+            
+            # Only the first page counts the matching rows unless asked to
+            assert MedicineService.get_medicines_page(per_page=2).total == 5
+            counted = MedicineService.get_medicines_page(page=2, per_page=2, with_total=True)
+            assert counted.total == 5
+            assert counted.pages == 3
+            
+            names = []
+            cursor = None
+            while True:
+                result = MedicineService.get_medicines_page(per_page=2, cursor=cursor)
+                names.extend(m.name for m in result.items)
+                cursor = result.next_cursor
+                if cursor is None:
+                    break
+            assert names == [f'Medicine {number}' for number in range(5)]
+    
+    def test_get_medicines_page_invalid_cursor(self, app):
+        """Test a malformed cursor is rejected."""
+        with app.app_context():
+            with pytest.raises(ValueError, match='Invalid cursor'):
+                MedicineService.get_medicines_page(cursor='not-a-cursor')
+    
     def test_get_medicines_by_category(self, app, sample_medicine):
         """Test getting medicines by category."""
         with app.app_context():
@@ -253,6 +304,112 @@ class TestConditionService:
             assert len(conditions) == 1
             assert 'cold' in conditions[0].name.lower()
     
+    def test_catalog_snapshot_reused_until_catalog_changes(self, app, sample_condition):
+        """Test the catalog snapshot is shared until the version stamp changes."""
+        with app.app_context():
+            snapshot = ConditionService.get_catalog_snapshot()
+            assert snapshot.version is not None
+            assert [c.name for c in snapshot.conditions] == ['Common Cold']
+            assert ConditionService.get_catalog_snapshot() is snapshot
+            
+            condition = Condition.query.filter_by(name='Common Cold').first()
+            condition.symptoms = 'runny nose, sneezing'
+            db.session.commit()
+            
+            reloaded = ConditionService.get_catalog_snapshot()
+            assert reloaded is not snapshot
+            assert reloaded.version != snapshot.version
+            assert 'sneezing' in reloaded.symptoms
+            assert 'fever' not in reloaded.symptoms
+    
+    def test_stamp_catalog_version_upserts(self):
+        """Test restamping a catalog replaces its version row."""
+        conn = sqlite3.connect(':memory:')
+        stamp_catalog_version(conn, CONDITIONS_CATALOG)
+        version = stamp_catalog_version(conn, CONDITIONS_CATALOG)
+        assert conn.execute('SELECT name, version FROM catalog_versions').fetchall() == [
+            (CONDITIONS_CATALOG, version)
+        ]
+        conn.close()
+    
+    def test_compiled_catalog_file(self, app, sample_condition, sample_medicine):
+        """Test snapshots are mapped from the compiled catalog while it is current."""
+        with app.app_context():
+            fd, path = tempfile.mkstemp(suffix='.catalog')
+            os.close(fd)
+            app.config['COMPILED_CATALOG_PATH'] = path
+            try:
+                ConditionService.compile_catalog(path)
+                db.session.add(Condition(name='Flu', symptoms='fever, cough, body ache'))
+                db.session.commit()
+                ConditionService.compile_catalog(path)
+                
+                snapshot = ConditionService.get_catalog_snapshot()
+                assert isinstance(snapshot.conditions, CompiledConditions)
+                assert [c.name for c in snapshot.conditions] == ['Common Cold', 'Flu']
+                assert snapshot.conditions[1].symptoms == 'fever, cough, body ache'
+                assert isinstance(snapshot.symptom_index, CompiledSymptomIndex)
+                built = CatalogSnapshot(snapshot.version, tuple(snapshot.conditions))
+                assert dict(snapshot.symptom_index.postings) == built.symptom_index.postings
+                for scorer in SCORERS.values():
+                    inputs = ['fever', 'cough', 'headache']
+                    assert scorer.rank(snapshot, inputs, 5) == scorer.rank(built, inputs, 5)
+                assert DiagnosisService.diagnose_symptoms('body ache')['disease'] == 'Flu'
+                assert SuggestionService.suggest('medicine', 'para') == ['Paracetamol']
+                
+                # Once the catalog changes the stale file is ignored until recompiled
+                db.session.add(Condition(name='Measles', symptoms='fever, rash'))
+                db.session.commit()
+                snapshot = ConditionService.get_catalog_snapshot()
+                assert not isinstance(snapshot.conditions, CompiledConditions)
+                assert DiagnosisService.diagnose_symptoms('rash')['disease'] == 'Measles'
+            finally:
+                app.config['COMPILED_CATALOG_PATH'] = None
+                os.unlink(path)
+    
+    def test_search_conditions_ranked_prefix_match(self, app):
+        """Test full-text search ranks name hits first and matches word prefixes."""
+        with app.app_context():
+            db.session.add(Condition(name='Migraine', symptoms='headache, nausea',
+                                     description='Recurring headaches'))
+            db.session.add(Condition(name='Tension Headache', symptoms='dull pain, tight neck'))
+            db.session.add(Condition(name='Gastritis', symptoms='stomach pain'))
+            db.session.commit()
+            
+            conditions = ConditionService.search_conditions(query='headac')
+            assert [c.name for c in conditions] == ['Tension Headache', 'Migraine']
+    
+    def test_search_index_follows_updates(self, app, sample_condition):
+        """Test triggers keep the full-text index in sync with the table."""
+        with app.app_context():
+            condition = Condition.query.filter_by(name='Common Cold').first()
+            condition.symptoms = 'sneezing'
+            db.session.commit()
+            
+            assert ConditionService.search_conditions(query='throat') == []
+            assert [c.name for c in ConditionService.search_conditions(query='sneez')] == ['Common Cold']
+            
+            db.session.delete(condition)
+            db.session.commit()
+            assert ConditionService.search_conditions(query='sneez') == []
+    
+    def test_search_index_rechecks_missing_index(self, app):
+        """Test a missing full-text index is looked for again after a while."""
+        with app.app_context():
+            with db.engine.begin() as connection:
+                CONDITIONS_SEARCH.drop(connection)
+            assert not CONDITIONS_SEARCH.is_available(db.engine)
+            
+            # Created behind the cache's back, as another process would
+            with db.engine.begin() as connection:
+                for statement in CONDITIONS_SEARCH.create_statements():
+                    connection.exec_driver_sql(statement)
+            assert not CONDITIONS_SEARCH.is_available(db.engine)
+            later = time.monotonic() + MISSING_INDEX_RECHECK_SECONDS + 1
+            with patch('search_index.time.monotonic', return_value=later):
+                assert CONDITIONS_SEARCH.is_available(db.engine)
+            assert CONDITIONS_SEARCH.is_available(db.engine)
+    
     def test_get_condition_categories(self, app, sample_condition):
         """Test getting condition categories."""
         with app.app_context():
@@ -284,6 +441,205 @@ class TestDiagnosisService:
             assert result['disease'] == 'No matching conditions found'
             assert result['confidence'] == 0
     
+    def test_diagnose_symptoms_index_matches_substring_scan(self, app):
+        """Test the symptom index ranks conditions exactly like the substring scan."""
+        with app.app_context():
+            for name, symptoms in [
+                ('Migraine', 'headache, nausea, sensitivity to light'),
+                ('Flu', 'fever, headache, body ache, cough'),
+                ('Gastritis', 'stomach pain, nausea, bloating'),
+                ('Sinusitis', 'facial pain, headache, runny nose, fever'),
+            ]:
+                db.session.add(Condition(name=name, symptoms=symptoms))
+            db.session.commit()
+            
+            conditions = ConditionService.get_all_conditions()
+            for text in ['headache', 'ache, nausea', 'fever, runny nose', 'pain', 'severe headache, cough']:
+                inputs = [s.strip().lower() for s in text.split(',') if s.strip()]
+                expected = []
+                for condition in conditions:
+                    condition_symptoms = [s.strip().lower() for s in condition.symptoms.split(',')]
+                    matched = [next(c for c in condition_symptoms if i in c or c in i)
+                               for i in inputs if any(i in c or c in i for c in condition_symptoms)]
+                    if matched:
+                        expected.append((condition.name, matched))
+                
+                catalog = ConditionService.get_catalog_snapshot()
+                actual = [(catalog.conditions[position].name, matched)
+                          for position, matched in catalog.symptom_index.match(inputs)]
+                assert actual == expected
+    
+    def test_diagnose_symptoms_tolerates_typos(self, app, sample_condition):
+        """Test misspelled symptoms are corrected when nothing matches as typed."""
+        with app.app_context():
+            index = ConditionService.get_catalog_snapshot().symptom_index
+            assert index.resolve('feaver') == ('fever',)
+            assert index.resolve('sore thraot') == ('sore throat',)
+            assert index.resolve('xyz') == ()
+            
+            result = DiagnosisService.diagnose_symptoms('feaver, cuogh, runy nose')
+            assert result['disease'] == 'Common Cold'
+    
+    def test_diagnose_symptoms_free_text(self, app, sample_condition):
+        """Test free-text input is split into the symptoms it mentions."""
+        with app.app_context():
+            index = ConditionService.get_catalog_snapshot().symptom_index
+            assert index.expand(['i have a sore throat and a runny nose since yesterday']) == [
+                'sore throat', 'runny nose'
+            ]
+            assert index.expand(['high temperature']) == ['fever']
+            assert index.expand(['sore throat']) == ['sore throat']
+            
+            result = DiagnosisService.diagnose_symptoms('I have a high temperature, a cough and a runny nose')
+            assert result['disease'] == 'Common Cold'
+    
+    def test_symptom_bitsets(self, app, sample_condition):
+        """Test interned symptom bitmasks agree with the symptom index."""
+        with app.app_context():
+            index = ConditionService.get_catalog_snapshot().symptom_index
+            inputs = ['fever', 'throat', 'rash', 'cough']
+            masks = [index.input_mask(symptom) for symptom in inputs]
+            
+            assert masks[2] == 0
+            assert index.count_matches(0, masks) == 3
+            assert index.matched_symptoms(0, masks) == index.match(inputs)[0][1]
+            assert index.symptom_count(0) == 4
+            assert index.overlap(0, index.symptom_mask(['cough', 'fever', 'headache'])) == 2
+    
+    def test_bitset_scores_match_substring_matching(self, app):
+        """Test mask-based match counts and Jaccard scores equal those from substring matching."""
+        with app.app_context():
+            for name, symptoms in [
+                ('Migraine', 'headache, nausea, sensitivity to light'),
+                ('Flu', 'fever, headache, body ache, cough'),
+                ('Gastritis', 'stomach pain, nausea, bloating, nausea'),
+                ('Sinusitis', 'facial pain, headache, runny nose, fever'),
+            ]:
+                db.session.add(Condition(name=name, symptoms=symptoms))
+            db.session.commit()
+            
+            catalog = ConditionService.get_catalog_snapshot()
+            index = catalog.symptom_index
+            for text in ['headache', 'ache, nausea', 'fever, runny nose', 'pain', 'xyz', 'fever, fever']:
+                inputs = [s.strip() for s in text.split(',')]
+                matched = index.match(inputs)
+                counts = sorted(((p, len(m)) for p, m in matched), key=lambda e: e[1], reverse=True)
+                assert index.rank(inputs, 10) == (counts, len(counts))
+                
+                jaccard = {
+                    p: len(m) / (len(inputs) + len(set(index.condition_symptoms[p])) - len(m)) for p, m in matched
+                }
+                expected = sorted(jaccard.items(), key=lambda e: (-e[1], e[0]))
+                assert SCORERS['jaccard'].rank(catalog, inputs, 10) == (expected, len(expected))
+    
+    def test_matrix_engine_matches_symptom_index(self, app):
+        """Test the incidence matrix engine gives the same diagnoses as the symptom index."""
+        with app.app_context():
+            for name, symptoms in [
+                ('Migraine', 'headache, nausea, sensitivity to light'),
+                ('Flu', 'fever, headache, body ache, cough'),
+                ('Gastritis', 'stomach pain, nausea, bloating'),
+                ('Sinusitis', 'facial pain, headache, runny nose, fever'),
+            ]:
+                db.session.add(Condition(name=name, symptoms=symptoms))
+            db.session.commit()
+            
+            texts = ['headache', 'ache, nausea', 'fever, runny nose', 'pain', 'xyz', 'fever, fever']
+            expected = [DiagnosisService.diagnose_symptoms(text) for text in texts]
+            
+            app.config['DIAGNOSIS_SCORER'] = 'matrix'
+            assert [DiagnosisService.diagnose_symptoms(text) for text in texts] == expected
+            
+            pytest.importorskip('numpy')
+            catalog = ConditionService.get_catalog_snapshot()
+            for text in texts:
+                inputs = [s.strip().lower() for s in text.split(',')]
+                assert catalog.incidence_matrix.match(inputs) == catalog.symptom_index.match(inputs)
+                assert catalog.incidence_matrix.rank(inputs, 2) == catalog.symptom_index.rank(inputs, 2)
+    
+    def test_matrix_scorer_warns_without_numpy(self, caplog):
+        """Test the matrix scorer says so when it falls back to the symptom index."""
+        catalog = CatalogSnapshot(None, [ConditionRecord(1, 'Flu', None, 'fever, cough', None, None, None, None, None)])
+        scorer = SCORERS['matrix']
+        with patch('catalog.NUMPY_AVAILABLE', False), patch.object(type(scorer), '_warned', False):
+            with caplog.at_level('WARNING', logger='scorers'):
+                assert scorer.rank(catalog, ['fever'], 5) == SCORERS['substring'].rank(catalog, ['fever'], 5)
+                scorer.rank(catalog, ['cough'], 5)
+        assert [record.message for record in caplog.records].count(
+            "The 'matrix' scorer needs NumPy, which is not installed; scoring with the symptom index instead"
+        ) == 1
+    
+    def test_diagnose_symptoms_cached_per_symptom_set(self, app, sample_condition):
+        """Test repeated symptom sets are served from the result cache."""
+        with app.app_context():
+            cache = DiagnosisService.get_result_cache()
+            first = DiagnosisService.diagnose_symptoms('fever, cough')
+            first['diagnosis_id'] = 1
+            second = DiagnosisService.diagnose_symptoms(' Cough ,FEVER')
+            
+            assert 'diagnosis_id' not in second
+            assert cache.stats()['hits'] == 1
+            assert cache.stats()['misses'] == 1
+            
+            # A catalog change gives a new version and so a fresh result
+            db.session.add(Condition(name='Flu', symptoms='fever, cough, body ache'))
+            db.session.commit()
+            DiagnosisService.diagnose_symptoms('fever, cough')
+            assert cache.stats()['misses'] == 2
+    
+    def test_legacy_symptoms_loader_shares_engine(self, app, sample_condition):
+        """Test the legacy symptoms_database loader diagnoses like the ORM catalog."""
+        import sqlite3
+        conn = sqlite3.connect(':memory:')
+        conn.row_factory = sqlite3.Row
+        conn.execute(
+            'CREATE TABLE symptoms_database (id INTEGER PRIMARY KEY, condition_name TEXT, symptoms TEXT, '
+            'ayurvedic_remedy TEXT, medicine_suggestion TEXT, severity_level TEXT, description TEXT, precautions TEXT)'
+        )
+        conn.execute(
+            'INSERT INTO symptoms_database VALUES (1, ?, ?, ?, ?, ?, ?, ?)',
+            ('Common Cold', 'runny nose, sore throat, cough, fever', 'Tulsi tea, ginger honey',
+             'Rest, fluids, over-the-counter medications', 'mild',
+             'Viral infection of the upper respiratory tract', 'Stay hydrated')
+        )
+        legacy = DiagnosisEngine(SQLiteSymptomsLoader(lambda: conn))
+        
+        with app.app_context():
+            for text in ['fever, cough', 'cough, headache, rash', 'rash']:
+                expected = DiagnosisService.diagnose_symptoms(text)
+                actual = legacy.diagnose(text)
+                if expected['disease'] == 'Common Cold':
+                    assert actual.pop('precautions') == 'Stay hydrated'
+                    expected.pop('precautions')
+                assert actual == expected
+    
+    def test_diagnose_symptoms_with_each_scorer(self, app):
+        """Test every registered scorer ranks conditions and unknown scorers are rejected."""
+        with app.app_context():
+            db.session.add(Condition(name='Allergy', symptoms='sneezing, itching'))
+            db.session.add(Condition(name='Flu', symptoms='fever, cough, fatigue, body ache, chills, sneezing'))
+            db.session.add(Condition(name='Measles', symptoms='fever, rash'))
+            db.session.commit()
+            
+            names = DiagnosisService.get_scorer_names()
+            assert names == ['substring', 'jaccard', 'idf', 'matrix']
+            
+            # Substring: both symptoms match Flu only
+            assert DiagnosisService.diagnose_symptoms('fever, sneezing')['disease'] == 'Flu'
+            # Jaccard penalizes Flu's many unmatched symptoms
+            result = DiagnosisService.diagnose_symptoms('fever, sneezing', scorer='jaccard')
+            assert result['description'].index('Allergy') < result['description'].index('Flu')
+            # Flu and Measles both match two inputs, but rash is rarer than sneezing
+            result = DiagnosisService.diagnose_symptoms('fever, sneezing, rash')
+            assert result['description'].index('Flu') < result['description'].index('Measles')
+            result = DiagnosisService.diagnose_symptoms('fever, sneezing, rash', scorer='idf')
+            assert result['description'].index('Measles') < result['description'].index('Flu')
+            
+            assert DiagnosisService.diagnose_symptoms('fever', scorer='matrix') == \
+                DiagnosisService.diagnose_symptoms('fever', scorer='substring')
+            with pytest.raises(ValueError):
+                DiagnosisService.diagnose_symptoms('fever', scorer='random')
+    
     def test_save_diagnosis(self, app, sample_user):
         """Test saving diagnosis to history."""
         with app.app_context():
@@ -305,6 +661,256 @@ class TestDiagnosisService:
             assert diagnosis.symptoms == 'test symptoms'
             assert diagnosis.diagnosed_condition == 'Test Condition'
     
+    def test_diagnose_batch_matches_single_diagnosis(self, app, sample_condition):
+        """Test batch diagnosis returns the same results as one-by-one diagnosis."""
+        with app.app_context():
+            texts = ['runny nose, sore throat', 'unknown symptom', 'cough']
+            results = DiagnosisService.diagnose_batch(texts)
+            assert results == [DiagnosisService.diagnose_symptoms(text) for text in texts]
+    
+    def test_diagnose_batch_in_worker_pool(self, app, sample_condition):
+        """Test large batches sharded across worker processes match in-process scoring."""
+        with app.app_context():
+            db.session.add(Condition(name='Flu', symptoms='fever, cough, body ache'))
+            db.session.commit()
+            texts = ['fever', 'cough, runny nose', 'rash', 'body ache, fever', 'sore throat'] * 3
+            expected = DiagnosisService.diagnose_batch(texts)
+            cache = DiagnosisService.get_result_cache()
+            cache.clear()
+            observed = []
+            
+            pool = DiagnosisPool(max_workers=2, shard_size=4)
+            app.extensions['diagnosis_pool'] = pool
+            observer = app.extensions.get('diagnosis_score_observer')
+            app.extensions['diagnosis_score_observer'] = lambda scorer, seconds: observed.append(scorer)
+            app.config['DIAGNOSIS_POOL_MIN_BATCH'] = 10
+            try:
+                assert DiagnosisService.diagnose_batch(texts) == expected
+                
+                # Each distinct symptom set is scored once; repeats come from the cache
+                assert len(observed) == 5 and len(cache) == 5
+                assert DiagnosisService.diagnose_batch(texts) == expected
+                assert len(observed) == 5
+                
+                # A catalog change restarts the workers with the new snapshot, while
+                # a batch still holding the old workers can keep submitting to them
+                old_catalog = ConditionService.get_catalog_snapshot()
+                held = pool._acquire_executor(old_catalog)
+                db.session.add(Condition(name='Measles', symptoms='fever, rash'))
+                db.session.commit()
+                assert DiagnosisService.diagnose_batch(texts)[2]['disease'] == 'Measles'
+                shard = held.submit(_score_shard, old_catalog.version, [['rash']], 'substring')
+                assert shard.result()[0][0]['disease'] == 'No matching conditions found'
+                pool._release_executor(held)
+            finally:
+                del app.extensions['diagnosis_pool']
+                app.extensions['diagnosis_score_observer'] = observer
+                pool.shutdown()
+    
+    def test_save_diagnoses_bulk(self, app):
+        """Test saving several diagnoses in one bulk insert."""
+        with app.app_context():
+            user = UserService.create_user('batchuser', 'batch@example.com', 'password123')
+            diagnoses = [
+                ('fever', {'disease': 'Flu', 'confidence': 50, 'severity': 'moderate'}),
+                ('cough', {'disease': 'Common Cold', 'confidence': 100, 'severity': 'mild'}),
+            ]
+            
+            ids = DiagnosisService.save_diagnoses(user.id, diagnoses)
+            
+            assert len(ids) == 2
+            saved = [db.session.get(DiagnosisHistory, diagnosis_id) for diagnosis_id in ids]
+            assert [record.symptoms for record in saved] == ['fever', 'cough']
+            assert [record.diagnosed_condition for record in saved] == ['Flu', 'Common Cold']
+            assert saved[1].confidence_score == 1.0
+    
+    def test_write_behind_history(self, app):
+        """Test write-behind saves get IDs up front and are written in batches."""
+        with app.app_context():
+            user = UserService.create_user('queueuser', 'queue@example.com', 'password123')
+            writer = HistoryWriter(db.engine, batch_size=3, flush_interval=0.01, id_block_size=4).start()
+            app.extensions['history_writer'] = writer
+            try:
+                single = DiagnosisService.save_diagnosis(
+                    user.id, 'fever', {'disease': 'Flu', 'confidence': 50, 'severity': 'moderate'}
+                )
+                ids = DiagnosisService.save_diagnoses(
+                    user.id, [(f'symptom {n}', {'disease': 'Flu', 'confidence': 10}) for n in range(6)]
+                )
+                assert len(set(ids + [single.id])) == 7
+                
+                updated = DiagnosisService.update_diagnosis_feedback(single.id, user.id, 'helpful', True)
+                assert updated.user_feedback == 'helpful'
+                
+                writer.shutdown()
+            finally:
+                del app.extensions['history_writer']
+            
+            assert writer.written == 7
+            saved = DiagnosisHistory.query.filter_by(user_id=user.id).order_by(DiagnosisHistory.id).all()
+            assert [record.id for record in saved] == sorted([single.id] + ids)
+            assert saved[0].created_at is not None
+    
+    def test_write_behind_rejects_bad_rows(self, app):
+        """Test a batch with a conflicting row still writes the others and dead-letters it."""
+        with app.app_context():
+            user = UserService.create_user('badrowuser', 'badrow@example.com', 'password123')
+            existing = DiagnosisHistory(user_id=user.id, symptoms='existing')
+            db.session.add(existing)
+            db.session.commit()
+            
+            writer = HistoryWriter(db.engine, batch_size=10, flush_interval=0.01, max_retries=1).start()
+            rows = [{'id': existing.id + n, 'user_id': user.id, 'symptoms': f'queued {n}',
+                     'created_at': datetime.utcnow()} for n in range(3)]
+            writer.submit(rows)
+            assert writer.flush(timeout=5)
+            writer.shutdown()
+            
+            assert writer.written == 2
+            assert writer.rejected == 1
+            assert writer.dead_letters[0][0]['id'] == existing.id
+            assert DiagnosisHistory.query.filter_by(user_id=user.id).count() == 3
+    
+    def test_write_behind_after_shutdown(self, app):
+        """Test rows submitted after shutdown are written rather than left in the queue."""
+        with app.app_context():
+            user = UserService.create_user('lateuser', 'late@example.com', 'password123')
+            writer = HistoryWriter(db.engine, flush_interval=0.01).start()
+            writer.shutdown()
+            
+            [history_id] = writer.ids.allocate(1)
+            writer.submit([{'id': history_id, 'user_id': user.id, 'symptoms': 'late',
+                            'created_at': datetime.utcnow()}])
+            assert writer.depth == 0
+            assert db.session.get(DiagnosisHistory, history_id).symptoms == 'late'
+    
+    @pytest.mark.skipif(not hasattr(os, 'fork'), reason='needs os.fork')
+    def test_write_behind_in_forked_child(self, app):
+        """Test a forked child restarts the writer thread and reserves its own IDs."""
+        with app.app_context():
+            user = UserService.create_user('forkuser', 'fork@example.com', 'password123')
+            writer = HistoryWriter(db.engine, flush_interval=0.01, id_block_size=10).start()
+            parent_ids = writer.ids.allocate(2)
+            
+            pid = os.fork()
+            if pid == 0:
+                status = 1
+                try:
+                    db.engine.dispose(close=False)
+                    ids = writer.ids.allocate(2)
+                    writer.submit([{'id': history_id, 'user_id': user.id, 'symptoms': 'child',
+                                    'created_at': datetime.utcnow()} for history_id in ids])
+                    if writer.flush(timeout=5) and writer.written == 2:
+                        status = 0
+                finally:
+                    os._exit(status)
+            
+            _, status = os.waitpid(pid, 0)
+            writer.shutdown()
+            assert os.waitstatus_to_exitcode(status) == 0
+            child_ids = [h.id for h in DiagnosisHistory.query.filter_by(symptoms='child')]
+            assert len(child_ids) == 2
+            assert not set(child_ids) & set(parent_ids)
+    
+    def test_id_allocator_first_insert_race(self, app):
+        """Test losing the race to create the sequence row falls back to claiming a block."""
+        with app.app_context():
+            allocator = IdAllocator(db.engine, block_size=10)
+            database = db.engine.url.database
+            raced = []
+            
+            def create_row_first(conn, cursor, statement, parameters, context, executemany):
+                if statement.startswith('INSERT INTO id_blocks') and not raced:
+                    raced.append(True)
+                    other = sqlite3.connect(database)
+                    other.execute("INSERT INTO id_blocks (name, next_value) VALUES ('diagnosis_history', 500)")
+                    other.commit()
+                    other.close()
+            
+            event.listen(db.engine, 'before_cursor_execute', create_row_first)
+            try:
+                ids = allocator.allocate(3)
+            finally:
+                event.remove(db.engine, 'before_cursor_execute', create_row_first)
+            
+            assert raced
+            assert ids == [500, 501, 502]
+            assert db.session.get(IdBlock, 'diagnosis_history').next_value == 510
+    
+    def test_get_user_diagnosis_history_page(self, app):
+        """Test history pages are newest first and cursors continue where they stopped."""
+        with app.app_context():
+            user = UserService.create_user('pageuser', 'page@example.com', 'password123')
+            for number in range(3):
+                db.session.add(DiagnosisHistory(
+                    user_id=user.id,
+                    symptoms=f'symptom {number}',
+                    created_at=datetime(2024, 1, 1 + number)
+                ))
+            db.session.commit()
+            
+            first = DiagnosisService.get_user_diagnosis_history_page(user.id, per_page=2)
+            assert [h.symptoms for h in first.items] == ['symptom 2', 'symptom 1']
+            assert first.total == 3
+            
+            rest = DiagnosisService.get_user_diagnosis_history_page(
+                user.id, per_page=2, cursor=first.next_cursor
+            )
+            assert [h.symptoms for h in rest.items] == ['symptom 0']
+            assert rest.next_cursor is None
+    
+    def test_history_page_uses_index(self, app):
+        """Test a user's history pages are read from the composite index, even on an older database."""
+        with app.app_context():
+            with db.engine.begin() as connection:
+                connection.exec_driver_sql('DROP INDEX ix_diagnosis_history_user_created_id')
+            ensure_indexes(db.engine)
+            
+            query = DiagnosisHistory.query.filter_by(user_id=1)\
+                .order_by(DiagnosisHistory.created_at.desc(), DiagnosisHistory.id.desc()).limit(21)
+            sql = str(query.statement.compile(db.engine, compile_kwargs={'literal_binds': True}))
+            plan = ' '.join(row[-1] for row in db.session.execute(db.text(f'EXPLAIN QUERY PLAN {sql}')))
+            assert 'ix_diagnosis_history_user_created_id' in plan
+            assert 'TEMP B-TREE' not in plan
+    
+    def test_export_batches_use_index(self, app):
+        """Test each export batch seeks the (created_at, id) index instead of sorting the table."""
+        with app.app_context():
+            keyset = [(DiagnosisHistory.created_at, False), (DiagnosisHistory.id, False)]
+            statement = db.select(DiagnosisHistory.id)\
+                .where(DiagnosisHistory.created_at.isnot(None))\
+                .where(keyset_after(keyset, [datetime(2024, 1, 1), 10]))\
+                .order_by(DiagnosisHistory.created_at, DiagnosisHistory.id).limit(1000)
+            sql = str(statement.compile(db.engine, compile_kwargs={'literal_binds': True}))
+            plan = ' '.join(row[-1] for row in db.session.execute(db.text(f'EXPLAIN QUERY PLAN {sql}')))
+            assert 'ix_diagnosis_history_created_at_id' in plan
+            assert 'TEMP B-TREE' not in plan
+    
+    def test_export_diagnosis_history(self, app):
+        """Test the export streams every row in (created_at, id) order across batches."""
+        with app.app_context():
+            user = UserService.create_user('exportuser', 'export@example.com', 'password123')
+            for number in [3, 1, 2, 1, 4]:
+                db.session.add(DiagnosisHistory(
+                    user_id=user.id,
+                    symptoms=f'day {number}',
+                    created_at=datetime(2024, 1, number)
+                ))
+            db.session.commit()
+            
+            lines = ''.join(DiagnosisService.export_diagnosis_history('ndjson', batch_size=2)).splitlines()
+            rows = [json.loads(line) for line in lines]
+            assert [row['symptoms'] for row in rows] == ['day 1', 'day 1', 'day 2', 'day 3', 'day 4']
+            assert rows[0]['id'] < rows[1]['id']
+            
+            text = ''.join(DiagnosisService.export_diagnosis_history('csv', batch_size=2))
+            records = list(csv.DictReader(text.splitlines()))
+            assert len(records) == 5
+            assert records[-1]['symptoms'] == 'day 4'
+            
+            with pytest.raises(ValueError):
+                list(DiagnosisService.export_diagnosis_history('xml'))
+    
     def test_get_user_diagnosis_history(self, app, sample_user):
         """Test getting user diagnosis history."""
         with app.app_context():
@@ -326,6 +932,257 @@ class TestDiagnosisService:
             assert history[0].diagnosed_condition == 'Test Condition'
 
 
+class TestDataGenerator:
+    """Test the synthetic data generator."""
+    
+    def test_generated_data_loads_into_schema(self, app):
+        """Test generated data is deterministic and usable by the services."""
+        with app.app_context():
+            conn = db.engine.raw_connection()
+            try:
+                generate_catalog(conn.driver_connection, conditions=200, medicines=100, seed=7)
+                generate_history(conn.driver_connection, users=20, history=500, seed=7)
+            finally:
+                conn.close()
+            
+            assert Condition.query.count() == 200
+            assert Medicine.query.count() == 100
+            assert DiagnosisHistory.query.count() == 500
+            assert [row[0] for row in condition_rows(5, seed=7)] == [
+                c.name for c in Condition.query.order_by(Condition.id).limit(5)
+            ]
+            
+            user = UserService.authenticate_user('user0000001', DEFAULT_PASSWORD)
+            assert user is not None
+            symptoms = Condition.query.first().symptoms
+            assert DiagnosisService.diagnose_symptoms(symptoms)['confidence'] > 0
+            assert DiagnosisService.get_user_diagnosis_history_page(user.id).total == user.diagnosis_history.count()
+
+
+class TestSuggestionService:
+    """Test SuggestionService functionality."""
+    
+    def test_suggest_symptoms_by_word_prefix(self, app, sample_condition):
+        """Test symptom suggestions match the start of any word."""
+        with app.app_context():
+            db.session.add(Condition(name='Strep Throat', symptoms='sore throat, fever, swollen glands'))
+            db.session.commit()
+            
+            # Listed by two conditions, so ranked first
+            assert SuggestionService.suggest('symptom', 'f') == ['fever']
+            assert SuggestionService.suggest('symptom', 'thr') == ['sore throat']
+            assert SuggestionService.suggest('condition', 'str') == ['Strep Throat']
+    
+    def test_suggest_medicines_follow_catalog_changes(self, app, sample_medicine):
+        """Test medicine suggestions reload when the medicine catalog changes."""
+        with app.app_context():
+            assert SuggestionService.suggest('medicine', 'para') == ['Paracetamol']
+            
+            db.session.add(Medicine(name='Paracetamol Syrup'))
+            db.session.commit()
+            assert SuggestionService.suggest('medicine', 'para', limit=5) == ['Paracetamol', 'Paracetamol Syrup']
+    
+    def test_suggest_unknown_kind(self, app):
+        """Test an unsupported suggestion kind is rejected."""
+        with app.app_context():
+            with pytest.raises(ValueError):
+                SuggestionService.suggest('dosage', 'a')
+
+
+class TestQueryBudget:
+    """Test query budgets and N+1 detection on history and serialization paths."""
+    
+    def create_history(self, users=3, rows_per_user=4):
+        """Create users with a few diagnosis history rows each; returns their IDs."""
+        user_ids = []
+        for i in range(users):
+            user = User(username=f'budget{i}', email=f'budget{i}@example.com')
+            user.password = 'testpass123'
+            db.session.add(user)
+            db.session.flush()
+            for j in range(rows_per_user):
+                db.session.add(DiagnosisHistory(user_id=user.id, symptoms=f'fever {j}', diagnosed_condition='Flu'))
+            user_ids.append(user.id)
+        db.session.commit()
+        return user_ids
+    
+    def test_statement_shape(self):
+        """Test statements differing only in values or IN-list length share a shape."""
+        assert statement_shape("SELECT * FROM users WHERE id IN (?, ?, ?) AND name = 'a'") == \
+            statement_shape('SELECT * FROM users\nWHERE id IN (?) AND name = ?')
+        assert statement_shape('SELECT * FROM users LIMIT 10') == 'SELECT * FROM users LIMIT ?'
+    
+    def test_user_diagnosis_history_budget(self, app, query_budget):
+        """Test loading and serializing a user's history is a single statement."""
+        with app.app_context():
+            user_id = self.create_history()[0]
+            db.session.expire_all()
+            
+            with query_budget(max_queries=1):
+                history = DiagnosisService.get_user_diagnosis_history(user_id)
+                data = [entry.to_dict() for entry in history]
+            
+            assert len(data) == 4
+    
+    def test_dynamic_relationship_n_plus_one_detected(self, app, query_budget):
+        """Test counting User.diagnosis_history per user is reported as N+1."""
+        with app.app_context():
+            self.create_history()
+            users = User.query.all()
+            
+            with pytest.raises(QueryBudgetExceeded, match='possible N\\+1'):
+                with query_budget():
+                    [user.diagnosis_history.count() for user in users]
+            
+            # One grouped query gives the same counts
+            with query_budget(max_queries=1):
+                counts = dict(db.session.query(DiagnosisHistory.user_id, db.func.count(DiagnosisHistory.id))
+                              .group_by(DiagnosisHistory.user_id).all())
+            assert sorted(counts.values()) == [4, 4, 4]
+    
+    def test_api_list_endpoints_budget(self, app, client, query_budget, sample_medicine, sample_condition):
+        """Test list endpoints use a fixed number of statements however many rows they serialize."""
+        with app.app_context():
+            self.create_history()
+            response = client.post('/api/login', json={'username': 'budget0', 'password': 'testpass123'})
+            assert response.status_code == 200
+            
+            for url in ('/api/medicines', '/api/conditions', '/api/diagnose/history'):
+                with query_budget(max_queries=3):
+                    response = client.get(url)
+                assert response.status_code == 200
+
+
+class TestRequestMetrics:
+    """Test per-request timing and query accounting."""
+    
+    @pytest.mark.skipif(any(name in os.environ for name in ('REQUEST_METRICS_ENABLED', 'SERVER_TIMING_HEADER')),
+                        reason='metrics settings overridden in the environment')
+    def test_request_metrics_opt_in(self):
+        """Test request metrics and the Server-Timing header are off unless a config turns them on."""
+        assert not config['production'].REQUEST_METRICS_ENABLED
+        assert not config['production'].SERVER_TIMING_HEADER
+        assert config['development'].REQUEST_METRICS_ENABLED
+        assert config['development'].SERVER_TIMING_HEADER
+    
+    def test_server_timing_and_endpoint_totals(self, app, client, sample_condition):
+        """Test each request reports its queries and rows and is aggregated per endpoint."""
+        response = client.get('/api/conditions')
+        assert response.status_code == 200
+        
+        server_timing = response.headers['Server-Timing']
+        assert server_timing.startswith('app;dur=')
+        assert 'db;dur=' in server_timing
+        
+        client.get('/api/conditions')
+        client.get('/api/no-such-endpoint')
+        
+        totals = app.extensions['request_metrics'].totals()
+        assert totals['api.get_conditions']['requests'] == 2
+        assert totals['api.get_conditions']['queries'] >= 2
+        assert totals['api.get_conditions']['rows'] >= 2
+        assert totals['<unmatched>']['queries'] == 0
+        
+        summary = app.extensions['request_metrics'].summary()
+        assert summary['api.get_conditions']['queries_per_request'] >= 1
+        
+        # Queries outside a request are not charged to anything
+        ConditionService.get_all_conditions()
+        assert app.extensions['request_metrics'].totals()['api.get_conditions'] == totals['api.get_conditions']
+
+
+def record_metrics_in_worker(directory):
+    """Record metrics from another process sharing the metrics directory."""
+    registry = get_registry(directory)
+    registry.inc('medicino_diagnosis_cache_hits_total', (), 3)
+    registry.set_gauge('medicino_history_queue_depth', (), 7)
+    registry.observe('medicino_diagnosis_scoring_seconds', ('substring',), 0.002)
+
+
+class TestPrometheusMetrics:
+    """Test the /metrics endpoint and multi-process aggregation."""
+    
+    @pytest.mark.skipif('METRICS_ENABLED' in os.environ, reason='METRICS_ENABLED overridden in the environment')
+    def test_metrics_opt_in(self):
+        """Test Prometheus metrics are off unless a config turns them on."""
+        assert not config['production'].METRICS_ENABLED
+        assert config['development'].METRICS_ENABLED
+        assert config['testing'].METRICS_ENABLED
+    
+    def test_metrics_endpoint(self, app, client, sample_condition):
+        """Test request latency histograms are served in the text exposition format."""
+        client.get('/api/conditions')
+        
+        response = client.get('/metrics')
+        assert response.status_code == 200
+        assert response.headers['Content-Type'].startswith('text/plain; version=0.0.4')
+        
+        text = response.get_data(as_text=True)
+        assert '# TYPE medicino_http_request_duration_seconds histogram' in text
+        assert ('medicino_http_request_duration_seconds_bucket{blueprint="api",'
+                'route="/api/conditions",method="GET",le="+Inf"} 1.0') in text
+        assert 'medicino_http_requests_total{blueprint="api",route="/api/conditions",method="GET",status="200"} 1.0' in text
+        assert f'medicino_worker_info{{worker="{os.getpid()}"' in text
+    
+    def test_metrics_with_write_behind(self):
+        """Test requests and scrapes report the write-behind queue depth."""
+        config['testing_write_behind'] = type('WriteBehindConfig', (TestingConfig,), {'HISTORY_WRITE_BEHIND': True})
+        try:
+            app = create_app('testing_write_behind')
+        finally:
+            del config['testing_write_behind']
+        
+        with app.app_context():
+            db.create_all()
+            try:
+                client = app.test_client()
+                assert client.get('/api/health').status_code == 200
+                
+                response = client.get('/metrics')
+                assert response.status_code == 200
+                assert f'medicino_history_queue_depth{{worker="{os.getpid()}"}} 0.0' in response.get_data(as_text=True)
+            finally:
+                app.extensions['history_writer'].shutdown()
+                db.session.remove()
+                db.drop_all()
+    
+    def test_metrics_directory_aggregates_processes(self, tmp_path):
+        """Test counters and histograms add up across workers while gauges stay per live worker."""
+        directory = str(tmp_path)
+        registry = get_registry(directory)
+        registry.inc('medicino_diagnosis_cache_hits_total', (), 1)
+        registry.set_gauge('medicino_history_queue_depth', (), 2)
+        registry.observe('medicino_diagnosis_scoring_seconds', ('substring',), 0.2)
+        
+        worker = multiprocessing.get_context('fork').Process(target=record_metrics_in_worker, args=(directory,))
+        worker.start()
+        worker.join()
+        assert worker.exitcode == 0
+        
+        text = registry.render()
+        assert 'medicino_diagnosis_cache_hits_total 4.0' in text
+        assert 'medicino_diagnosis_scoring_seconds_bucket{scorer="substring",le="0.0025"} 1.0' in text
+        assert 'medicino_diagnosis_scoring_seconds_bucket{scorer="substring",le="+Inf"} 2.0' in text
+        assert 'medicino_diagnosis_scoring_seconds_count{scorer="substring"} 2.0' in text
+        # The exited worker's gauge is dropped; this process's remains
+        assert f'medicino_history_queue_depth{{worker="{os.getpid()}"}} 2.0' in text
+        assert f'worker="{worker.pid}"' not in text
+
+
+class TestDatabaseConfiguration:
+    """Test database engine configuration."""
+    
+    def test_sqlite_pragmas_applied(self, app):
+        """Test every new connection runs the configured SQLite profile."""
+        with app.app_context():
+            with db.engine.connect() as connection:
+                journal_mode = connection.execute(db.text('PRAGMA journal_mode')).scalar()
+                busy_timeout = connection.execute(db.text('PRAGMA busy_timeout')).scalar()
+            
+            assert journal_mode.lower() == app.config['SQLITE_PRAGMAS']['journal_mode'].lower()
+            assert busy_timeout == app.config['SQLITE_PRAGMAS']['busy_timeout']
+
+
 class TestValidationService:
     """Test ValidationService functionality."""
     